@@ -2,20 +2,29 @@
 #Created for the 2026 VCU 24HR Hackathon
 
 import os, re, time, random
+from concurrent.futures                                      import ThreadPoolExecutor
 from flask_cors                                                    import CORS
 from components.genclient                                     import Genclient
 from components.public                                        import public_bp
 from components.account                                      import account_bp
 from components.serverdata                                   import ServerData
-from sqlalchemy                                              import case, text
 from components.account                                      import account_bp
 from components.serverdata                                   import ServerData
 from dotenv                                                 import load_dotenv
 from sqlalchemy.orm.attributes                            import flag_modified
-from flask_socketio                                      import SocketIO, emit
-from components.dbmodel                      import db, Character, User, Match
+from flask_socketio                                      import SocketIO, emit, join_room
+from components.dbmodel                      import db, Character, User, Match, THUMB_LARGE, serialize_characters_display
 from components.debug                     import debug_bp, is_admin_authorized
-from flask                     import Flask, render_template, jsonify, request
+from components.imagestore                import store_image, character_snapshot
+from components.dbsetup                   import apply_sqlite_profile, setup_database
+from components.betting                   import BetBook
+from components.arenastate                import make_arena_backend, LeaseLost, LEASE_RENEW
+from components.matchmaking               import MATCH_POOL
+from components.rostercache               import ROSTER_CACHE
+from components.thumbnails                import THUMBNAILS
+from components.odds                      import price_match, update_ratings
+from components                           import metrics
+from flask                     import Flask, Response, render_template, jsonify, request
 
 
 #################################
@@ -30,48 +39,108 @@ app = Flask(__name__,                                                   #launch
     static_url_path="/assets")
 app.config['SECRET_KEYS'] = os.getenv('SECRET_KEY')                     #secret key for CORS prevention, taken from .env file
 CORS(app)                                                               #Apply the CORS prevention onto the flask app
-socketio = SocketIO(app, cors_allowed_origins=["http://localhost:5173", f"{API_URL}"]) #begin sockets for listening and sending out info
+#begin sockets for listening and sending out info.
+#with more than one worker, SOCKETIO_MESSAGE_QUEUE (ex. redis://localhost:6379) relays emits so every worker's clients get them.
+socketio = SocketIO(app, cors_allowed_origins=["http://localhost:5173", f"{API_URL}"], message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
 
 #SQLite database initialitzation
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///doodlebrawl.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///doodlebrawl.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 #Initialize our flask blueprints for API decomposition
 app.register_blueprint(account_bp, url_prefix='/api/account')
 app.register_blueprint(debug_bp, url_prefix='/api/debug')
 app.register_blueprint(public_bp, url_prefix='/api')
 db.init_app(app)
+metrics.init_app(app)                                                   #route timings for /metrics
+THUMBNAILS.init_app(app)                                                #thumbnail workers open their own app context
 
-#this is to add a new column to the user table.
-#this is used for safe migration of rows into the updated database.
+#bring the database up to date and tune SQLite before anything else touches it.
+#NOTE - schema changes go in components/dbsetup.py as a new migration, not here.
 with app.app_context():
-    db.create_all()
-    try:
-        #NOTE - Whenever a new column is added make sure it GOES ON TOP! Otherwise it'll throw a normally harmless "duplicate column" error and never add the next ones.
-        db.session.execute(text("ALTER TABLE character ADD COLUMN status VARCHAR(16) DEFAULT 'active'"))
-        db.session.execute(text("ALTER TABLE user ADD COLUMN last_login_bonus FLOAT DEFAULT 0.0"))
-        db.session.execute(text("ALTER TABLE user ADD COLUMN last_submission FLOAT DEFAULT 0.0"))
-        db.session.commit()
-        print("!-- ADDED COLUMNS TO TABLES --!")
-    except Exception:
-        db.session.rollback()
-    try:
-        db.session.execute(text("UPDATE character SET manager_id = creator_id WHERE manager_id = 'None' OR manager_id IS NULL"))
-        db.session.commit()
-        print("!-- BACKFILLED MANAGER IDs FOR EXISTING CHARACTERS --!")
-    except Exception as e:
-        db.session.rollback()
-        print(f"!-- ERROR BACKFILLING MANAGERS: {e} --!")
+    apply_sqlite_profile(db.engine)
+    metrics.install_db_timing(db.engine)
+    setup_database()
+    MATCH_POOL.rebuild()
 
 #Global variables
 BATTLE_TIMER=180                            #3 minutes in seconds
-CURRENT_TIMER = BATTLE_TIMER                #global time tracker
-NEXT_MATCH = None                           #holds the [char1, char2] for upcoming fight.
+ARENA, LEASE = make_arena_backend()         #phase, deadline, freeze and the upcoming card, plus who runs the loop. See components/arenastate.py
 CLIENT = Genclient(os.getenv('GEMINI_API')) #genclient class for API calling
 DATA = ServerData(CLIENT)                   #Data handling class
-FROZEN = False                              #For freezing the timer
-CURRENT_BETS = []                           #List of dicts like so: {'user_id': id, 'fighter_id': id, 'amount': int}
-MATCH_ODDS = {}                             #dict: {fighter_id: float_odds}
-CURRENT_POOL = 0                            #the betting pool for this match
+BETS = BetBook(shared=ARENA.shared)         #wagers, odds and the betting pool for the upcoming match
+BATTLE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="battle") #runs gemini battle generation off the game loop
+PENDING_BATTLE = None                       #(fighter ids, future) for the battle being generated for the upcoming card
+BATTLE_WAIT_LIMIT = 120                     #how long the fight can wait on a late generation before it's called off
+
+##################################
+#          ARENA TIMER           #
+##################################
+
+#the arena runs on deadlines. Clients get the wall clock time the phase ends at and count down on their own,
+#so the server only has to emit when something changes (schedule, result, skip, freeze).
+#deadlines are wall clock times, so every worker sharing the arena agrees on them.
+def arena_state(state=None):
+    if state is None: state = ARENA.load()
+    deadline = state['deadline']
+    time_left = state['frozen_left'] if state['frozen'] else (max(0, deadline - time.time()) if deadline is not None else None)
+    return {
+        'phase': state['phase'],
+        'deadline': time.time() + time_left if time_left is not None else None, #wall clock, in seconds
+        'time_left': time_left,
+        'server_time': time.time(),                                               #lets clients correct for clock skew
+        'frozen': state['frozen'],
+        'next_match': state['card_names']
+    }
+
+#sends an event to every client (or the room in to=), timing the fan out for /metrics
+def broadcast(event, data, **kwargs):
+    with metrics.EMIT_SECONDS.time(event=event):
+        socketio.emit(event, data, **kwargs)
+
+def emit_arena_state(state=None):
+    broadcast('arena_state', arena_state(state))
+
+#saves changes to the arena state and returns the updated state
+def update_arena(**changes):
+    ARENA.save(**changes)
+    return ARENA.load()
+
+#moves the arena to a new phase that ends in duration seconds (None if it ends whenever the loop says so)
+def set_phase(phase, duration, announce=True):
+    changes = {'phase': phase, 'deadline': time.time() + duration if duration is not None else None}
+    if ARENA.load()['frozen']: changes['frozen_left'] = duration
+    state = update_arena(**changes)
+    if announce: emit_arena_state(state)
+    return state
+
+def set_frozen(frozen):
+    state = ARENA.load()
+    if frozen == state['frozen']: return state
+    changes = {'frozen': frozen}
+    if frozen:
+        changes['frozen_left'] = max(0, state['deadline'] - time.time()) if state['deadline'] is not None else None
+    elif state['frozen_left'] is not None:
+        changes['deadline'] = time.time() + state['frozen_left']
+    state = update_arena(**changes)
+    emit_arena_state(state)
+    return state
+
+#the fighters on the upcoming card, or None if there isn't one
+def card_fighters(state=None):
+    if state is None: state = ARENA.load()
+    if not state['card']: return None
+    fighters = [DATA.get_character(char_id) for char_id in state['card']]
+    return fighters if all(fighters) else None
+
+#cheap resync for clients that were asleep or just connected
+@app.route('/api/arena')
+def return_arena_state():
+    return jsonify(arena_state())
+
+#latency histograms and counters in the Prometheus text format, see components/metrics.py
+@app.route('/metrics')
+def return_metrics():
+    return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4")
 
 ##################################
 #         DEBUG HANDLERS         #
@@ -80,33 +149,40 @@ CURRENT_POOL = 0                            #the betting pool for this match
 @app.route('/api/debug/skip', methods=['POST'])
 def debug_skip_timer():
     if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
-    global CURRENT_TIMER
-    #set the timer for the next battle to start to 5 seconds
-    CURRENT_TIMER = 5
+    #end the current phase in 5 seconds
+    changes = {'deadline': time.time() + 5}
+    if ARENA.load()['frozen']: changes['frozen_left'] = 5
+    emit_arena_state(update_arena(**changes))
     print("!-- DEBUG: SKIPPING TIMER TO 5s --!")
-    return jsonify({"status": "skipped", "time_left": CURRENT_TIMER})
+    return jsonify({"status": "skipped", "time_left": 5})
 
 @app.route('/api/debug/freeze', methods=['POST'])
 def debug_freeze_timer():
     if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
-    global FROZEN
-    FROZEN = not FROZEN
-    print(f"!-- FROZEN TIMER : {FROZEN} --!")
-    return jsonify({"status": "frozen", "is_frozen": FROZEN})
+    state = set_frozen(not ARENA.load()['frozen'])
+    print(f"!-- FROZEN TIMER : {state['frozen']} --!")
+    return jsonify({"status": "frozen", "is_frozen": state['frozen']})
 
 @app.route('/api/debug/rematch', methods=['POST'])
 def debug_new_matchup():
     if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
     #schedule a new match, instantly
     schedule_next_match()
-    return jsonify({"status": "rematched", "new_match": [c.name for c in NEXT_MATCH]})
+    return jsonify({"status": "rematched", "new_match": ARENA.load()['card_names']})
 
 @app.route('/api/debug/randomize_alignments', methods=['POST'])
 def debug_randomize_alignments():
     if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
     count = DATA.randomize_alignments()
+    ROSTER_CACHE.bump("alignments randomized")
     return jsonify({"status": "success", "count": count, "message": "Alignments randomized!"})
 
+#hit/miss counters for the genclient's decoded image cache
+@app.route('/api/debug/image_cache', methods=['GET'])
+def debug_image_cache():
+    if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(CLIENT.image_cache.stats())
+
 #test all actions
 @app.route('/api/debug/test_actions', methods=['POST'])
 def debug_test_actions():
@@ -117,8 +193,7 @@ def debug_test_actions():
         return jsonify({"error": "Need at least 2 fighters in DB."}), 400
     p1, p2 = chars[0], chars[1]
     #pause the arena timer momentarily
-    global FROZEN
-    FROZEN = True
+    set_frozen(True)
     #scripted sequence to showcase all actions
     test_log = [
         { "actor": p1.name, "action": "ATTACK", "description": f"{p1.name} throws a basic <span class='action-red'>attack</span>!" },
@@ -129,8 +204,8 @@ def debug_test_actions():
         { "actor": p2.name, "action": "ULTIMATE", "description": f"{p2.name} channels raw magical energy for an <span class='action-rainbow'>ULTIMATE</span> attack!" }
     ]
     #emit to clients.
-    socketio.emit('match_result', {
-        'fighters': [p1.to_dict_display(), p2.to_dict_display()],
+    broadcast('match_result', {
+        'fighters': serialize_characters_display([p1, p2], THUMB_LARGE),
         'log': test_log,
         'winner': p2.name,
         'winner_id': p2.id,
@@ -151,8 +226,8 @@ def debug_test_actions():
 #We are using the pari-mutuel sportsbook style.
 #this means we have a starting house pool, then the pool largens as people place bets.
 @socketio.on("place_bet")
+@metrics.socket_event("place_bet")
 def handle_bet(data):
-    global CURRENT_POOL, CURRENT_BETS, MATCH_ODDS
     user_id = data.get('user_id')
     fighter_id = data.get('fighter_id')
     amount = int(data.get('amount', 0))
@@ -162,53 +237,35 @@ def handle_bet(data):
     user = User.query.get(user_id)
     if not user or user.money < amount:
         return {'status': 'error', 'message': 'Insufficient funds!'}
-    
-    odds = MATCH_ODDS.get(fighter_id, 1.1)
-
-    #liability is how much we must payout. We have to calculate this so nobody goes over the pool and loses money.
-    current_fighter_liability = sum(b['amount'] for b in CURRENT_BETS if b['fighter_id'] == fighter_id) * odds
-    new_total_liability = current_fighter_liability + (amount * odds)
-    #bets must NOT make us exceed total liability
-    if new_total_liability > (CURRENT_POOL + amount):
-        safe_divisor = max(0.1, odds - 1.0) #prevent division by zero
-        max_add = int((CURRENT_POOL - current_fighter_liability) / safe_divisor)
-        return {
-            'status': 'error', 
-            'message': f'The prize pool is too small to cover that payout! Maximum additional wager: ${max(0, max_add)}'
-        }
 
-    #apply bet
-    existing_bet = next((b for b in CURRENT_BETS if b['user_id'] == user_id), None)
-    
-    if existing_bet:
-        # prevent "hedging" the bet
-        if existing_bet['fighter_id'] != fighter_id:
-            return {'status': 'error', 'message': 'You cannot bet on both fighters!'}
-        user.money -= amount
-        existing_bet['amount'] += amount
-        total_bet_amount = existing_bet['amount']
-    else:
-        user.money -= amount
-        CURRENT_BETS.append({
-            'user_id': user.id,
-            'fighter_id': fighter_id,
-            'amount': amount
-        })
-        total_bet_amount = amount
+    #the bet book checks the card, liability and hedging, then saves the bet along with the user's money.
+    #other workers may have opened a new card or taken bets, so it's handed the shared state to reload from.
+    total_bet_amount, error = BETS.place(user, fighter_id, amount, ARENA.load() if BETS.shared else None)
+    if error:
+        return {'status': 'error', 'message': error}
 
-    CURRENT_POOL += amount
-    db.session.commit()
     print(f"$-- BET PLACED BY {user.username} OF {amount} ON {fighter_id}! --$")
-    emit('pool_update', {'pool': CURRENT_POOL}, broadcast=True)
+    broadcast('pool_update', {'pool': BETS.pool})
     return {
         'status': 'success', 
         'new_balance': user.money, 
         'total_wagered': total_bet_amount 
     }
 
+#puts a logged in client into a room named after their account, so things like payouts can be sent just to them
+@socketio.on('join_account')
+@metrics.socket_event('join_account')
+def join_account(data):
+    user_id = (data or {}).get('user_id')
+    if not user_id or not User.query.get(user_id):
+        return {'status': 'error', 'message': 'Invalid user account.'}
+    join_room(user_id)
+    return {'status': 'success'}
+
 #handles frontend submission of a new character
 #converts their information into JSON format using the character class
 @socketio.on('submit_character')
+@metrics.socket_event('submit_character')
 def accept_new_character(data):
     if not data: return
     
@@ -236,11 +293,15 @@ def accept_new_character(data):
     char_id = data.get('id')
     image_base = data.get('imageBase')
     name = data.get('name') or "???"
+    image_hash = store_image(image_base)
+    if not image_hash:
+        return {'status': 'error', 'message': 'Your drawing could not be read, please try again.'}
 
     #create new DB Object
     c = Character(
         id=char_id,
-        image_file=image_base,
+        image_file="",          #the drawing lives in the image store as raw bytes
+        image_hash=image_hash,
         name=name,
         creator_id=creator_id if creator_id else "Unknown",
         manager_id=creator_id if creator_id else "None", 
@@ -253,67 +314,142 @@ def accept_new_character(data):
 
     db.session.add(c)
     db.session.commit()
+    THUMBNAILS.request(image_hash)
+    DATA.note_submission()
     
     print(f"$-- NEW CHARACTER ADDED TO DB QUEUE {char_id} --$")
     emit('character_added', {'status': 'success', 'character': c.to_dict()})
 
 #chooses two random characters for the next match and schedules them to fight
 #prioritizes new characters
-def schedule_next_match():
-    global NEXT_MATCH, CURRENT_POOL, MATCH_ODDS, CURRENT_BETS
-    candidates = DATA.get_candidates_for_match()
+#passing candidates schedules that exact card, and resume reopens the bets saved for it before a restart.
+def schedule_next_match(candidates=None, resume=False):
+    if not resume:
+        BETS.close()
+    if candidates is None:
+        MATCH_POOL.sync() #other workers may have approved or edited fighters
+        candidates = DATA.get_candidates_for_match()
     
     if not candidates:
         print("!-- NOT ENOUGH FIGHTERS --!")
-        NEXT_MATCH = None
+        update_arena(card=None, card_names=None)
         return
 
-    NEXT_MATCH = candidates
-    print(f"!-- NEXT MATCH: {NEXT_MATCH[0].name} vs {NEXT_MATCH[1].name} --!")
-
-    p1 = DATA.get_character(NEXT_MATCH[0].id)
-    p2 = DATA.get_character(NEXT_MATCH[1].id)
-    #calculate the odds of either fighter winning
+    p1, p2 = candidates
+    print(f"!-- NEXT MATCH: {p1.name} vs {p2.name} --!")
+    #calculate the odds of either fighter winning, from their ratings and a simulation of their stats
     #this will be used in determining the *risk* of the bet
-    score1 = (p1.wins + 1.0) / (p1.losses + 1.0)
-    score2 = (p2.wins + 1.0) / (p2.losses + 1.0)
-    total_score = score1 + score2
-    odds1 = max(1.1, round(total_score / score1, 2))
-    odds2 = max(1.1, round(total_score / score2, 2))
-    MATCH_ODDS = {p1.id : odds1, p2.id : odds2}
+    match_odds = price_match(p1, p2)
     
     #initialize a starting pool of money
     #we're going to create the starting pool by summing their popularities, then multiplying it by 10.
     p1_popularity = p1.popularity if p1.popularity else 1
     p2_popularity = p2.popularity if p2.popularity else 1
     total_popularity = p1_popularity + p2_popularity
-    CURRENT_POOL = total_popularity * 100
-    CURRENT_BETS = []
+    if resume:
+        BETS.resume([p1.id, p2.id], match_odds, total_popularity * 100)
+    else:
+        BETS.open([p1.id, p2.id], match_odds, total_popularity * 100)
+    #publish the card, so every worker can show it and take bets on it
+    update_arena(card=[p1.id, p2.id], card_names=[p1.name, p2.name], odds=BETS.odds, base_pool=BETS.base_pool)
+
+    #start generating the fight now, so it's ready by the time the countdown ends
+    pregenerate_battle([p1, p2])
 
     #emit the card to clients
-    socketio.emit('match_scheduled', {
-        'fighters': [c.to_dict_display() for c in NEXT_MATCH],
+    broadcast('match_scheduled', {
+        'fighters': serialize_characters_display([p1, p2], THUMB_LARGE),
         'starts_in': BATTLE_TIMER,
-        'odds': MATCH_ODDS,
-        'pool': CURRENT_POOL
+        'odds': BETS.odds,
+        'pool': BETS.pool
     })
 
-#conduct the battle between the selected fighters. Uses the genclient for the api call
+#reopens the card that had bets on it when the server went down.
+#returns True if it was restored. If not, scheduling a new card refunds the saved stakes.
+#saved_ids can name the card to restore, by default it's the one the Bet table has wagers on.
+def restore_saved_card(saved_ids=None):
+    if saved_ids is None: saved_ids = BETS.saved_card()
+    if not saved_ids:
+        return False
+    fighters = [DATA.get_character(char_id) for char_id in saved_ids]
+    if len(fighters) == 2 and all(f and f.is_approved for f in fighters):
+        print("!-- RESTORING THE CARD FROM BEFORE THE RESTART --!")
+        schedule_next_match(fighters, resume=True)
+        return True
+    return False
+
+#submits the battle generation for a card to the worker pool.
+#the workers don't get DB objects, only plain copies of the fighters, since the session isn't thread safe.
+def pregenerate_battle(fighters):
+    global PENDING_BATTLE
+    if PENDING_BATTLE: PENDING_BATTLE[1].cancel() #a card that was replaced doesn't need its fight anymore
+    snapshot = [character_snapshot(c) for c in fighters]
+    PENDING_BATTLE = (tuple(c.id for c in fighters), BATTLE_POOL.submit(CLIENT.run_match, snapshot))
+
+#grabs the pregenerated result for this matchup, waiting for it without blocking other socket handlers.
+#the wait can outlast the lease, so it's renewed along the way. Raises LeaseLost if another worker took it anyway.
+def collect_battle(fighters):
+    global PENDING_BATTLE
+    if not PENDING_BATTLE or PENDING_BATTLE[0] != tuple(c.id for c in fighters):
+        print("!-- NO PREGENERATED BATTLE FOR THIS CARD, GENERATING NOW --!")
+        pregenerate_battle(fighters)
+    future = PENDING_BATTLE[1]
+    PENDING_BATTLE = None
+    started = last_renewal = time.monotonic()
+    while not future.done() and time.monotonic() - started < BATTLE_WAIT_LIMIT:
+        socketio.sleep(0.1)
+        if time.monotonic() - last_renewal >= LEASE_RENEW:
+            if not LEASE.acquire():
+                future.cancel()
+                raise LeaseLost()
+            last_renewal = time.monotonic()
+    waited = time.monotonic() - started #measured, so time spent renewing or on a busy worker counts too
+    metrics.MATCH_CYCLE_SECONDS.observe(waited, stage="battle_wait")
+    if not future.done():
+        future.cancel()
+        print("!-- BATTLE GENERATION TIMED OUT --!")
+        return None
+    if waited >= 0.1:
+        print(f"!-- BATTLE GENERATION WAS {waited:.1f}s LATE --!")
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"!-- ERROR GENERATING BATTLE: {e} --!")
+        return None
+
+#commits the loop's writes, unless another worker has taken the arena in the meantime.
+#the lease is renewed in the same transaction, so a leader that lost it can't settle bets or record results twice.
+def commit_as_leader():
+    if not LEASE.hold():
+        db.session.rollback()
+        print("!-- LEASE WAS TAKEN BY ANOTHER WORKER, DROPPING THIS RESULT --!")
+        raise LeaseLost()
+    DATA.commit()
+
+#conduct the battle between the selected fighters. The result was generated by the genclient during the countdown.
+#raises LeaseLost (with nothing written) if another worker took over the arena while the battle was generating.
 def run_scheduled_battle():
-    global NEXT_MATCH
-    if not NEXT_MATCH:
+    state = ARENA.load()
+    if not state['card']:
         return 0 
     
-    p1 = DATA.get_character(NEXT_MATCH[0].id)
-    p2 = DATA.get_character(NEXT_MATCH[1].id)
-    
-    if not p1 or not p2:
+    live_match = card_fighters(state)
+    if not live_match:
         print("!-- ERROR: Fighters not in DB? --!")
         return
-    live_match = [p1, p2]
-
-    #run API call
-    result = CLIENT.run_match(live_match)
+    p1, p2 = live_match
+    if BETS.shared:
+        BETS.refresh(state) #the card may have been scheduled by another worker
+
+    #pick up the API result
+    result = collect_battle(live_match)
+    if not result:
+        print("!-- ERROR: NO BATTLE RESULT, CALLING OFF THE MATCH --!")
+        #give everyone their stake back
+        BETS.refund()
+        commit_as_leader()
+        update_arena(card=None, card_names=None)
+        return 0
     
     #initializing a new character
     if 'new_stats' in result and result['new_stats']:
@@ -378,19 +514,22 @@ def run_scheduled_battle():
     elif winner_obj.titles:
         title_exchange_name = False 
 
+    update_ratings(winner_obj, loser_obj)
     winner_obj.wins += 1
     loser_obj.losses += 1
-
-    #Resolving wagers
-    for bet in CURRENT_BETS:
-        if bet['fighter_id'] == winner_obj.id:
-            user = User.query.get(bet['user_id'])
-            if user:
-                payout = int(bet['amount'] * MATCH_ODDS[winner_obj.id])
-                user.money += payout
-                print(f"$-- USER {user.username} HAS WON ${payout}! --$")
+    winner_obj.update_rank()
+    loser_obj.update_rank()
+    MATCH_POOL.update(winner_obj)
+    MATCH_POOL.update(loser_obj)
+    MATCH_POOL.changed()
+
+    #Resolving wagers, in the same transaction as the win/loss update
+    payouts = BETS.settle(winner_obj.id)
+    if payouts:
+        print(f"$-- PAID OUT ${sum(payouts.values())} TO {len(payouts)} WINNING BETS! --$")
     
-    DATA.commit() #save all DB changes
+    commit_as_leader() #save all DB changes
+    ROSTER_CACHE.bump("match result")
 
     #save the match to match history
     bout_teams = [[p1], [p2]]
@@ -402,8 +541,8 @@ def run_scheduled_battle():
         title_change=title_exchange_name
     )
     #emit the result to clients
-    socketio.emit('match_result', {
-        'fighters': [c.to_dict_display() for c in live_match],
+    broadcast('match_result', {
+        'fighters': serialize_characters_display(live_match, THUMB_LARGE),
         'log': result.get('battle_log', []),
         'winner': winner_obj.name,
         'winner_id': winner_obj.id,
@@ -411,8 +550,12 @@ def run_scheduled_battle():
         'introduction': result.get('introduction', '')
     })
     
+    #let each winner know what they won. Every account has its own room, see join_account.
+    for user_id, payout in payouts.items():
+        broadcast('bet_payout', {'payout': payout, 'winner_id': winner_obj.id}, to=user_id)
+
     print(f"$-- MATCH FINISHED - WINNER {winner_obj.name} --$")
-    NEXT_MATCH = None
+    update_arena(card=None, card_names=None)
     #return the number of logs to the server so we can allocate enough time for the match to play out.
     return len(result.get('battle_log', []))
 
@@ -423,8 +566,8 @@ def run_scheduled_battle():
 #Grabs the current card info
 @app.route('/api/card')
 def return_current_card():
-    global NEXT_MATCH, MATCH_ODDS, CURRENT_POOL, CURRENT_TIMER
-    current_match = NEXT_MATCH
+    state = ARENA.load()
+    current_match = card_fighters(state)
     if current_match is None:
         return jsonify({
             'fighters': [],
@@ -434,13 +577,14 @@ def return_current_card():
             'pool': 0
         })
     try:
-        fighters_data = [c.to_dict_display() for c in current_match]
+        if BETS.shared: BETS.refresh(state)
+        fighters_data = serialize_characters_display(current_match, THUMB_LARGE)
         return jsonify({
             'fighters': fighters_data,
             'starts_in': BATTLE_TIMER,
             'status': 'scheduled',
-            'odds': MATCH_ODDS,
-            'pool': CURRENT_POOL
+            'odds': BETS.odds,
+            'pool': BETS.pool
         })
     except Exception as e:
         print(f"!-- ERROR SERVING CARD: {e} --!")
@@ -451,41 +595,83 @@ def return_current_card():
 def index():
     return render_template('index.html')
 
-#Main server loop. Timer counts down, when it hits zero
-def server_loop():
-    global CURRENT_TIMER, NEXT_MATCH, FROZEN
-    with app.app_context():
+#takes over the arena when this worker becomes the loop leader.
+#if the last leader went away mid countdown, its card and deadline are kept so nobody's bets get reset.
+def start_arena():
+    state = ARENA.load()
+    deadline = state['deadline']
+    if state['phase'] == "scheduled" and state['card'] and deadline and deadline > time.time() and restore_saved_card(state['card']):
+        print("!-- PICKED UP THE ARENA MID COUNTDOWN --!")
+        emit_arena_state()
+        return
+    if not restore_saved_card():
         schedule_next_match()
+    set_phase("scheduled", BATTLE_TIMER)
 
+#Main server loop. Every worker runs this, but only the one holding the lease drives the arena.
+#the rest check back every LEASE_RENEW seconds in case the leader has gone away.
+def server_loop():
     while True:
-        socketio.sleep(1)
         with app.app_context():
-            if len(DATA.get_queue()) > 2:
-                DATA.submit_queue_for_approval()
-        if not FROZEN:
-            CURRENT_TIMER -= 1
-            #emit the timer for clients
-            socketio.emit('timer_update', {'time_left': CURRENT_TIMER,'next_match': [c.name for c in NEXT_MATCH] if NEXT_MATCH else None})
-            if CURRENT_TIMER <= 0:
-                with app.app_context():
-                    CURRENT_TIMER = 0
-                    socketio.emit('timer_update', {'time_left': CURRENT_TIMER,'next_match': [c.name for c in NEXT_MATCH] if NEXT_MATCH else None})
-                    log_count = run_scheduled_battle() #run the match
-                    if log_count is None: log_count = 0
-                    #7 is for the duration of the introduction, three seconds for each log in the match, then 30 seconds to see the result.
-                    animation_duration = 7 + (log_count * 3) + 30
-                    socketio.sleep(animation_duration)     #so we see the throbber for one minute
-                    CURRENT_TIMER = -1
-                    socketio.emit('timer_update', {'time_left': CURRENT_TIMER,'next_match': [c.name for c in NEXT_MATCH] if NEXT_MATCH else None})
-                    socketio.sleep(10)     #then scheduling announcement
-                    schedule_next_match()  #schedule the next match
-                CURRENT_TIMER = BATTLE_TIMER
+            leading = LEASE.acquire()
+        if not leading:
+            socketio.sleep(LEASE_RENEW)
+            continue
+        print(f"!-- THIS WORKER IS RUNNING THE ARENA ({LEASE.holder}) --!")
+        try:
+            run_arena()
+        except LeaseLost:
+            pass
+        print("!-- LOST THE ARENA LEASE, STANDING BY --!")
+
+#Wakes up every second to check the approval queue and whether the current phase is over.
+#the countdown itself happens on the clients, the loop only emits when the phase changes.
+#returns if another worker takes the lease.
+def run_arena():
+    with app.app_context(), metrics.track_operation("loop", "start"):
+        start_arena()
+    last_renewal = time.monotonic()
+    last_tick = time.monotonic()
+
+    while True:
+        socketio.sleep(1)
+        #drift is how far past the intended 1s this tick started, from a slow tick before it or a busy worker
+        tick_started = time.monotonic()
+        metrics.LOOP_DRIFT_SECONDS.observe(max(0, tick_started - last_tick - 1))
+        last_tick = tick_started
+        with app.app_context(), metrics.track_operation("loop", "tick"):
+            if time.monotonic() - last_renewal >= LEASE_RENEW:
+                if not LEASE.acquire():
+                    return
+                last_renewal = time.monotonic()
+            if DATA.approval_due():
+                DATA.submit_queue_for_approval()    #moderation runs on worker threads
+            DATA.collect_moderation()               #commit whatever batches came back
+            state = ARENA.load()
+            if state['frozen'] or state['deadline'] is None or time.time() < state['deadline']:
+                continue
+            if state['phase'] == "scheduled":
+                set_phase("fighting", None)         #clients show the throbber until the result arrives
+                with metrics.MATCH_CYCLE_SECONDS.time(stage="battle"):
+                    log_count = run_scheduled_battle()  #run the match
+                if log_count is None: log_count = 0
+                #7 is for the duration of the introduction, three seconds for each log in the match, then 30 seconds to see the result.
+                animation_duration = 7 + (log_count * 3) + 30
+                set_phase("fighting", animation_duration, announce=False)
+            elif state['phase'] == "fighting":
+                set_phase("announcing", 10)         #then scheduling announcement
+            else:
+                with metrics.MATCH_CYCLE_SECONDS.time(stage="schedule"):
+                    schedule_next_match()           #schedule the next match
+                set_phase("scheduled", BATTLE_TIMER)
 
 
 #Starting up server, loading players and approval queue
 print("!-- SERVER STARTING UP: LOADING CHARACTERS... --!")
-print("!-- STARTING BATTLE LOOP... --!")
-socketio.start_background_task(server_loop)
+#ARENA_LOOP=off serves the API without ever running the arena, for tools like the benchmarks in bench/
+if os.getenv('ARENA_LOOP', 'on') != 'off':
+    print("!-- STARTING BATTLE LOOP... --!")
+    socketio.start_background_task(server_loop)
 
 if __name__ == '__main__':
     socketio.run(app, debug=True, port=5000, use_reloader=False)
@@ -0,0 +1,4 @@
+#jfr, cwf, tjc
+#benchmarks for the backend's hot paths, no Gemini key needed.
+#seed.py builds a big fake database, fakeclient.py stands in for the genclient, run.py times everything and writes JSON,
+#and compare.py diffs two of those JSON files. See the backend README for how to run them.
@@ -0,0 +1,44 @@
+#jfr, cwf, tjc
+#compares two benchmark results from bench.run and flags regressions.
+#usage, from backend/:  python -m bench.compare bench/results/old.json bench/results/new.json [--threshold 0.25]
+#exits with 1 if any benchmark's p50 got slower by more than the threshold, so it can gate a CI job.
+import sys, json, argparse
+
+MIN_MS = 0.5 #benchmarks faster than this on both sides are too noisy to call a regression
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def compare(base, new, threshold):
+    regressions = []
+    print(f"{'benchmark':<26}{'base p50':>11}{'new p50':>11}{'change':>9}{'base p95':>11}{'new p95':>11}")
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old_stats, new_stats = base["results"].get(name), new["results"].get(name)
+        if not old_stats or not new_stats:
+            print(f"{name:<26}{'only in ' + ('base' if old_stats else 'new'):>31}")
+            continue
+        old_p50, new_p50 = old_stats["p50_ms"], new_stats["p50_ms"]
+        change = (new_p50 - old_p50) / old_p50 if old_p50 else 0.0
+        flag = ""
+        if change > threshold and max(old_p50, new_p50) >= MIN_MS:
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        print(f"{name:<26}{old_p50:>11.2f}{new_p50:>11.2f}{change:>+9.0%}{old_stats['p95_ms']:>11.2f}{new_stats['p95_ms']:>11.2f}{flag}")
+    if base.get("database", {}).get("counts") != new.get("database", {}).get("counts"):
+        print("!-- THE RUNS USED DIFFERENT DATABASE SIZES, TIMINGS MAY NOT BE COMPARABLE --!")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results.")
+    parser.add_argument("base", help="results to compare against")
+    parser.add_argument("new", help="results to check")
+    parser.add_argument("--threshold", type=float, default=0.25, help="p50 slowdown that counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+    regressions = compare(load_results(args.base), load_results(args.new), args.threshold)
+    if regressions:
+        print(f"!-- {len(regressions)} REGRESSIONS: {', '.join(regressions)} --!")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
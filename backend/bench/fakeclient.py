@@ -0,0 +1,41 @@
+#jfr, cwf, tjc
+#a stand-in for the genclient, for benchmarks.
+#it sleeps like an API call would, then answers the way Gemini does: moderation decisions for every fighter in the batch,
+#and fights from the local simulator. Drawings still go through the image cache, so that cost is measured too.
+import time, random
+from components.genclient import Genclient
+
+class FakeGenclient(Genclient):
+    #latency is the average seconds per call, jitter how much it varies (as a fraction of latency).
+    #reject_rate is the share of fighters moderation turns down.
+    def __init__(self, latency=0.5, jitter=0.2, reject_rate=0.05, seed=None):
+        super().__init__("bench")
+        self.latency = latency
+        self.jitter = jitter
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.calls = {"approval": 0, "battle": 0}
+
+    def wait(self):
+        if self.latency > 0:
+            time.sleep(max(0, self.rng.gauss(self.latency, self.latency * self.jitter)))
+
+    def submit_for_approval(self, queue):
+        if not queue: return {}
+        self.calls["approval"] += 1
+        results = {}
+        for char_id, char_obj in queue.items():
+            if not self.get_image_part(char_obj):
+                results[char_id] = {"approved": False, "reason": "Image data malformed"}
+            elif self.rng.random() < self.reject_rate:
+                results[char_id] = {"approved": False, "reason": "Rejected by the benchmark"}
+            else:
+                results[char_id] = {"approved": True}
+        self.wait()
+        return results
+
+    def run_match(self, matchup):
+        self.calls["battle"] += 1
+        for fighter in matchup: self.get_image_part(fighter)
+        self.wait()
+        return self.simulate_match(matchup, self.rng.randint(1, 100))
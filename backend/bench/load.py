@@ -0,0 +1,416 @@
+#jfr, cwf, tjc
+#Socket.IO load generator, for capacity planning.
+#starts the server with the fake genclient (bench.serve), opens thousands of spectators, and has the bettors among them
+#pile their bets into the last seconds of each countdown like real players do. It reports:
+#   - place_bet ack latency (p50/p90/p99) and how many bets went through
+#   - broadcast fan out: for every arena_state/match_scheduled/pool_update/match_result, how long it took between
+#     the first and the last client getting it (delivery skew), and how many clients got it at all
+#   - the server process' CPU, memory and thread count while it happened
+#the clients speak Socket.IO over websockets directly on one asyncio loop, so a single process can hold thousands of them.
+#usage, from backend/:  python -m bench.load --clients 2000 --rounds 3 [--countdown 60] [--url http://host:port]
+import os, sys, json, time, random, asyncio, argparse, platform, resource, subprocess, urllib.request
+from websockets.asyncio.client import connect
+from bench.run import BENCH_DIR, percentile, git_commit
+from bench.seed import load_info
+
+FIRST_USER_ID = 1_000_000_000_000_000 #bench.seed numbers its accounts from here
+BROADCASTS = ["arena_state", "match_scheduled", "pool_update", "match_result"]
+
+def summarize_ms(samples):
+    if not samples: return None
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": round(percentile(ordered, 0.5), 2),
+        "p90_ms": round(percentile(ordered, 0.9), 2),
+        "p99_ms": round(percentile(ordered, 0.99), 2),
+        "max_ms": round(ordered[-1], 2)
+    }
+
+#what a broadcast is recognized by, so the same emit can be matched up across every client that got it
+def broadcast_key(event, data):
+    if event == "arena_state": return data.get("server_time")
+    if event == "pool_update": return data.get("pool")
+    if event == "match_scheduled": return tuple(f.get("id") for f in data.get("fighters", []))
+    if event == "match_result": return (data.get("winner_id"), data.get("summary"))
+    return None
+
+##################################
+#            RECORDER            #
+##################################
+
+#collects everything the clients see. Broadcasts are aggregated as they arrive, so memory doesn't grow with clients x events.
+class Recorder:
+    def __init__(self):
+        self.connect_ms = []
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.connected = 0
+        self.bet_ms = []
+        self.bet_results = {}         #{outcome: count}
+        self.bets_per_second = {}     #{second since start: acks}
+        self.broadcasts = {event: {} for event in BROADCASTS}  #{event: {key: [first, last, deliveries, clients connected]}}
+        self.arena_latency_ms = []    #arena_state carries the server's clock, so its delivery latency can be measured directly
+        self.started = time.time()
+
+    def delivered(self, event, data, received):
+        key = broadcast_key(event, data)
+        seen = self.broadcasts[event].get(key)
+        if seen is None:
+            self.broadcasts[event][key] = [received, received, 1, self.connected]
+        else:
+            seen[1] = max(seen[1], received)
+            seen[2] += 1
+        if event == "arena_state" and data.get("server_time"):
+            self.arena_latency_ms.append((received - data["server_time"]) * 1000)
+
+    def bet_acked(self, latency_ms, response):
+        self.bet_ms.append(latency_ms)
+        if (response or {}).get("status") == "success":
+            outcome = "success"
+        else:
+            #numbers are dropped so the same rejection with different amounts is counted together
+            outcome = "".join(c for c in (response or {}).get("message", "no response") if not c.isdigit())
+        self.bet_results[outcome] = self.bet_results.get(outcome, 0) + 1
+        second = int(time.time() - self.started)
+        self.bets_per_second[second] = self.bets_per_second.get(second, 0) + 1
+
+    def report(self):
+        fan_out = {}
+        for event, seen in self.broadcasts.items():
+            if not seen: continue
+            skews = [(last - first) * 1000 for first, last, _, _ in seen.values()]
+            ratios = [min(1.0, count / expected) for _, _, count, expected in seen.values() if expected]
+            fan_out[event] = {
+                "broadcasts": len(seen),
+                "deliveries": sum(count for _, _, count, _ in seen.values()),
+                "delivery_ratio": round(sum(ratios) / len(ratios), 4) if ratios else None,
+                "skew": summarize_ms(skews)
+            }
+        return {
+            "connect": summarize_ms(self.connect_ms),
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "place_bet": summarize_ms(self.bet_ms),
+            "bet_outcomes": self.bet_results,
+            "peak_bets_per_second": max(self.bets_per_second.values(), default=0),
+            "arena_state_latency": summarize_ms(self.arena_latency_ms),
+            "fan_out": fan_out
+        }
+
+##################################
+#            CLIENTS             #
+##################################
+
+#one spectator, speaking Engine.IO 4 / Socket.IO 5 over a websocket
+class LoadClient:
+    def __init__(self, index, user_id, recorder, plan):
+        self.index = index
+        self.user_id = user_id
+        self.recorder = recorder
+        self.plan = plan              #the BetPlan for this run, shared by every client
+        self.ws = None
+        self.next_ack = 0
+        self.acks = {}                #{ack id: future}
+        self.fighters = []
+        self.odds = {}
+        self.bet_tasks = []
+        self.rng = random.Random(index)
+
+    async def run(self, url, ready, stop):
+        started = time.perf_counter()
+        try:
+            async with connect(url, max_size=None, open_timeout=60, ping_interval=None, close_timeout=1) as ws:
+                self.ws = ws
+                await ws.recv()           #engine.io open packet
+                await ws.send("40")       #socket.io connect
+                while True:
+                    packet = await ws.recv()
+                    if packet.startswith("40"): break
+                    if packet == "2": await ws.send("3")
+                self.recorder.connect_ms.append((time.perf_counter() - started) * 1000)
+                self.recorder.connected += 1
+                ready.set_result(True)
+                await self.emit("join_account", {"user_id": self.user_id}) #its ack is read by listen
+                await self.listen(stop)
+        except Exception:
+            if not ready.done():
+                self.recorder.connect_failures += 1
+                ready.set_result(False)
+            elif not stop.is_set():
+                self.recorder.disconnects += 1
+        finally:
+            if ready.done() and ready.result(): self.recorder.connected -= 1
+            for task in self.bet_tasks: task.cancel()
+
+    async def listen(self, stop):
+        while not stop.is_set():
+            try:
+                packet = await asyncio.wait_for(self.ws.recv(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            received = time.time()
+            if packet == "2":
+                await self.ws.send("3")
+            elif packet.startswith("42"):
+                event, data = json.loads(packet[2:])
+                self.on_event(event, data, received)
+            elif packet.startswith("43"):
+                body = packet[2:]
+                split = body.index("[")
+                future = self.acks.pop(int(body[:split]), None)
+                if future and not future.done():
+                    args = json.loads(body[split:])
+                    future.set_result(args[0] if args else None)
+
+    #sends an event, returns a future for its ack
+    async def emit(self, event, data):
+        ack_id = self.next_ack
+        self.next_ack += 1
+        future = asyncio.get_running_loop().create_future()
+        self.acks[ack_id] = future
+        await self.ws.send(f"42{ack_id}" + json.dumps([event, data]))
+        return future
+
+    def on_event(self, event, data, received):
+        if event in self.recorder.broadcasts:
+            self.recorder.delivered(event, data, received)
+        if event == "match_scheduled":
+            self.set_card(data.get("fighters", []), data.get("odds", {}))
+        elif event == "arena_state" and data.get("phase") == "scheduled" and data.get("deadline"):
+            self.schedule_bets(data["deadline"] - data["server_time"])
+
+    def set_card(self, fighters, odds):
+        self.fighters = [f["id"] for f in fighters]
+        self.odds = odds
+
+    #bettors spread a few bets over the countdown, most of them in its last seconds
+    def schedule_bets(self, time_left):
+        for task in self.bet_tasks: task.cancel()
+        self.bet_tasks = []
+        if len(self.fighters) != 2 or self.rng.random() >= self.plan.bettor_share: return
+        #everyone backs one fighter (switching sides is rejected), favorites more often
+        weights = [1 / self.odds.get(f, 2.0) for f in self.fighters]
+        fighter_id = self.rng.choices(self.fighters, weights)[0]
+        for _ in range(self.rng.randint(1, self.plan.max_bets)):
+            if self.rng.random() < self.plan.early_share:
+                delay = self.rng.uniform(0, time_left)
+            else:
+                delay = max(0, time_left - self.rng.uniform(0.2, self.plan.burst))
+            self.bet_tasks.append(asyncio.create_task(self.bet_later(delay, fighter_id)))
+
+    async def bet_later(self, delay, fighter_id):
+        await asyncio.sleep(delay)
+        amount = self.rng.randint(self.plan.min_amount, self.plan.max_amount)
+        started = time.perf_counter()
+        ack = await self.emit("place_bet", {"user_id": self.user_id, "fighter_id": fighter_id, "amount": amount})
+        response = await ack
+        self.recorder.bet_acked((time.perf_counter() - started) * 1000, response)
+
+class BetPlan:
+    def __init__(self, args):
+        self.bettor_share = args.bettors
+        self.early_share = args.early
+        self.burst = args.burst
+        self.max_bets = args.max_bets
+        self.min_amount = args.min_amount
+        self.max_amount = args.max_amount
+
+##################################
+#             SERVER             #
+##################################
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+def post(url):
+    request = urllib.request.Request(url, data=b"{}", method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+def start_server(args, log_path):
+    command = [sys.executable, "-m", "bench.serve", "--db", args.db, "--scale", str(args.scale), "--seed", str(args.seed),
+               "--port", str(args.port), "--countdown", str(args.countdown), "--latency", str(args.latency)]
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command, cwd=os.path.dirname(BENCH_DIR), stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{args.port}"
+    for _ in range(args.startup_timeout):
+        if process.poll() is not None:
+            raise RuntimeError(f"the server exited during startup, see {log_path}")
+        try:
+            get_json(url + "/api/arena")
+            return process, url
+        except OSError:
+            time.sleep(1)
+    process.terminate()
+    raise RuntimeError(f"the server didn't come up in {args.startup_timeout}s, see {log_path}")
+
+#cpu seconds, resident memory and thread count of a process, from /proc (linux only)
+def process_stats(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        return {
+            "cpu_seconds": (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+            "rss_mb": int(status["VmRSS"].split()[0]) / 1024,
+            "threads": int(status["Threads"])
+        }
+    except (OSError, KeyError, IndexError, ValueError):
+        return None
+
+async def sample_process(pid, samples, stop):
+    while not stop.is_set() and pid:
+        stats = process_stats(pid)
+        if stats: samples.append(stats)
+        await asyncio.sleep(1)
+
+##################################
+#             RUNNER             #
+##################################
+
+async def run_load(args, url, server_pid):
+    recorder = Recorder()
+    plan = BetPlan(args)
+    stop = asyncio.Event()
+    users = (load_info(args.db) or {}).get("counts", {}).get("users", args.clients)
+    ws_url = url.replace("http", "ws", 1) + "/socket.io/?EIO=4&transport=websocket"
+    server_samples = []
+    sampler = asyncio.create_task(sample_process(server_pid, server_samples, stop))
+
+    #connect everyone, args.connect_rate per second
+    clients, tasks, ready = [], [], []
+    connect_started = time.time()
+    for index in range(args.clients):
+        client = LoadClient(index, str(FIRST_USER_ID + index % users), recorder, plan)
+        future = asyncio.get_running_loop().create_future()
+        clients.append(client)
+        ready.append(future)
+        tasks.append(asyncio.create_task(client.run(ws_url, future, stop)))
+        if (index + 1) % args.connect_rate == 0:
+            await asyncio.sleep(1)
+    await asyncio.gather(*ready)
+    connect_seconds = time.time() - connect_started
+    print(f"!-- {recorder.connected} CLIENTS CONNECTED IN {connect_seconds:.1f}s, {recorder.connect_failures} FAILED --!")
+
+    #anyone who joined mid countdown picks up the current card, like the frontend does on load
+    card = get_json(url + "/api/card")
+    arena = get_json(url + "/api/arena")
+    for client in clients:
+        client.set_card(card.get("fighters", []), card.get("odds", {}))
+        if arena.get("phase") == "scheduled" and arena.get("time_left"):
+            client.schedule_bets(arena["time_left"])
+
+    #wait for the rounds to play out. After each result the fight animation is skipped (debug route), so rounds stay short.
+    load_started = time.time()
+    results_seen = 0
+    deadline = load_started + args.max_seconds
+    while results_seen < args.rounds and time.time() < deadline:
+        await asyncio.sleep(1)
+        results = len(recorder.broadcasts["match_result"])
+        if results > results_seen:
+            results_seen = results
+            print(f"!-- ROUND {results_seen} OF {args.rounds} DONE --!")
+            await asyncio.sleep(args.settle)
+            if results_seen < args.rounds and args.skip_animations:
+                try:
+                    post(url + "/api/debug/skip")
+                except OSError as e:
+                    print(f"!-- COULD NOT SKIP THE FIGHT ANIMATION: {e} --!")
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    sampler.cancel()
+
+    report = recorder.report()
+    report["clients"] = args.clients
+    report["connect_seconds"] = round(connect_seconds, 1)
+    report["rounds"] = results_seen
+    report["load_seconds"] = round(time.time() - load_started, 1)
+    if server_samples:
+        report["server"] = {
+            "cpu_seconds": round(server_samples[-1]["cpu_seconds"] - server_samples[0]["cpu_seconds"], 1),
+            "peak_rss_mb": round(max(s["rss_mb"] for s in server_samples), 1),
+            "peak_threads": max(s["threads"] for s in server_samples)
+        }
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    #if the load generator itself was pegged, the skew numbers include its own backlog
+    report["load_generator_cpu_seconds"] = round(usage.ru_utime + usage.ru_stime, 1)
+    return report
+
+def print_report(report):
+    print("\n========== LOAD TEST REPORT ==========")
+    print(f"clients: {report['clients']}  connected in {report['connect_seconds']}s  failed: {report['connect_failures']}  dropped: {report['disconnects']}")
+    print(f"rounds: {report['rounds']} over {report['load_seconds']}s")
+    if report.get("server"):
+        server = report["server"]
+        print(f"server: {server['cpu_seconds']} cpu s, peak {server['peak_rss_mb']} MB, peak {server['peak_threads']} threads")
+    print(f"load generator: {report['load_generator_cpu_seconds']} cpu s")
+    rows = [("connect", report["connect"]), ("place_bet ack", report["place_bet"]), ("arena_state latency", report["arena_state_latency"])]
+    rows += [(f"{event} skew", stats["skew"]) for event, stats in report["fan_out"].items()]
+    print(f"\n{'':<24}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in rows:
+        if stats:
+            print(f"{name:<24}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    print(f"\npeak bets/s: {report['peak_bets_per_second']}")
+    for outcome, count in sorted(report["bet_outcomes"].items(), key=lambda item: -item[1]):
+        print(f"  {count:>7}  {outcome}")
+    for event, stats in report["fan_out"].items():
+        print(f"{event}: {stats['broadcasts']} broadcasts, {stats['deliveries']} deliveries, {stats['delivery_ratio']:.1%} of clients reached")
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO load test for betting and broadcasts.")
+    parser.add_argument("--clients", type=int, default=1000, help="spectators to connect")
+    parser.add_argument("--rounds", type=int, default=2, help="fights to run before stopping")
+    parser.add_argument("--connect-rate", type=int, default=200, help="new connections per second")
+    parser.add_argument("--bettors", type=float, default=0.5, help="share of clients that bet")
+    parser.add_argument("--early", type=float, default=0.2, help="share of bets placed at a random point in the countdown, the rest go in the burst")
+    parser.add_argument("--burst", type=float, default=10, help="the last this many seconds of the countdown, when most bets come in")
+    parser.add_argument("--max-bets", type=int, default=3, help="most bets one bettor places per fight")
+    parser.add_argument("--min-amount", type=int, default=5)
+    parser.add_argument("--max-amount", type=int, default=100)
+    parser.add_argument("--settle", type=float, default=3, help="seconds to keep listening after each result before skipping ahead")
+    parser.add_argument("--no-skip", dest="skip_animations", action="store_false", help="let the fight animations play out instead of skipping them")
+    parser.add_argument("--max-seconds", type=int, default=1800, help="give up after this long")
+    parser.add_argument("--url", default=None, help="test an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="with --url, the server process to sample")
+    #used when the server is started here, see bench.serve
+    parser.add_argument("--db", default=os.path.join(BENCH_DIR, "data", "bench.db"))
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--countdown", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--startup-timeout", type=int, default=600, help="seconds to wait for the server, including seeding")
+    parser.add_argument("--out", default=None, help="where to write the JSON report (default bench/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+
+    process = None
+    if args.url:
+        url, server_pid = args.url.rstrip("/"), args.server_pid
+    else:
+        process, url = start_server(args, os.path.join(BENCH_DIR, "results", f"load-{stamp}-server.log"))
+        server_pid = process.pid
+    try:
+        report = asyncio.run(run_load(args, url, server_pid))
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report.update({"created": time.time(), "commit": git_commit(), "python": platform.python_version(), "config": vars(args)})
+    out = args.out or os.path.join(BENCH_DIR, "results", f"load-{stamp}.json")
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n!-- REPORT WRITTEN TO {out} --!")
+
+if __name__ == '__main__':
+    main()
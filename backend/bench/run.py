@@ -0,0 +1,215 @@
+#jfr, cwf, tjc
+#times the backend's hot paths against a seeded database, with FakeGenclient standing in for Gemini.
+#every run works on a fresh copy of the seeded database, so runs with the same settings can be compared.
+#results are written as JSON (see compare.py to diff two of them).
+#usage, from backend/:  python -m bench.run [--scale 0.1] [--latency 0.5] [--out results.json]
+import os, sys, json, time, shutil, random, argparse, platform, subprocess
+from bench.seed import seed, load_info
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#per call timings, in ms, grouped by name
+class Timings:
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, name, ms):
+        self.samples.setdefault(name, []).append(ms)
+
+    def time(self, name, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.record(name, (time.perf_counter() - started) * 1000)
+        return result
+
+    def summary(self):
+        return {name: summarize(samples) for name, samples in self.samples.items()}
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": round(percentile(ordered, 0.5), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "max_ms": round(ordered[-1], 3)
+    }
+
+##################################
+#           BENCHMARKS           #
+##################################
+
+#first page, then deep pages at random depths, by page number (offset) and by cursor (keyset).
+#depths are drawn without repeats, so the roster cache can't answer the deep pages and they time the database.
+def bench_roster(server, timings, rng, repeat, counts):
+    from components.dbmodel import Character, ROSTER_ORDER
+    from components.public import encode_roster_cursor
+    client = server.app.test_client()
+    ranked = counts["characters"] - counts["queue"]
+    last_page = max(1, ranked // 10)
+    for _ in range(repeat):
+        timings.time("roster_first_page", client.post, "/api/roster", json={"page": 1})
+    for page in rng.sample(range(1, last_page + 1), min(repeat, last_page)):
+        timings.time("roster_deep_page", client.post, "/api/roster", json={"page": page})
+    #the cursor for a random depth is the fighter just above it, looked up outside the timing
+    roster = Character.query.filter_by(is_approved=True).order_by(*ROSTER_ORDER)
+    for depth in rng.sample(range(1, max(2, ranked)), min(repeat, max(1, ranked - 1))):
+        cursor = encode_roster_cursor(roster.offset(depth - 1).first())
+        timings.time("roster_cursor_page", client.post, "/api/roster", json={"cursor": cursor})
+
+#logins for random accounts. About half of them are due the daily bonus, which writes.
+def bench_login(server, timings, rng, repeat, counts):
+    client = server.app.test_client()
+    for _ in range(repeat):
+        account_id = str(1_000_000_000_000_000 + rng.randrange(counts["users"]))
+        timings.time("login", client.post, "/api/account/login", json={"account_id": account_id})
+
+def bench_matchmaking(server, timings, rng, repeat, counts):
+    for _ in range(repeat):
+        timings.time("get_candidates_for_match", server.DATA.get_candidates_for_match)
+
+#schedules a card, then reads it back the way clients do
+def bench_card(server, timings, rng, repeat, counts):
+    timings.time("schedule_next_match", server.schedule_next_match)
+    client = server.app.test_client()
+    for _ in range(repeat):
+        timings.time("card", client.get, "/api/card")
+
+#bets on the card from bench_card, through a socket client like the frontend's
+def bench_bets(server, timings, rng, repeat, counts):
+    state = server.ARENA.load()
+    if not state["card"]: return
+    socket_client = server.socketio.test_client(server.app)
+    for _ in range(repeat):
+        timings.time("handle_bet", socket_client.emit, "place_bet", {
+            "user_id": str(1_000_000_000_000_000 + rng.randrange(counts["users"])),
+            "fighter_id": rng.choice(state["card"]),
+            "amount": rng.randint(1, 50)
+        }, callback=True)
+    socket_client.disconnect()
+
+#one full approval pass over the seeded queue.
+#approval_submit is the game loop's share of it, approval_pass is how long until every batch was committed.
+def bench_approval(server, timings, rng, repeat, counts):
+    started = time.perf_counter()
+    timings.time("approval_submit", server.DATA.submit_queue_for_approval)
+    while server.DATA.moderation_running():
+        time.sleep(0.02)
+        timings.time("collect_moderation", server.DATA.collect_moderation)
+    timings.record("approval_pass", (time.perf_counter() - started) * 1000)
+
+#full cards: scheduling, then the battle once its pregenerated result is ready, like after a countdown.
+#the fake API latency is waited out in between, so run_scheduled_battle is only the server's own work.
+def bench_battles(server, timings, rng, battles, counts):
+    for _ in range(battles):
+        schedule_ms = time.perf_counter()
+        server.schedule_next_match()
+        schedule_ms = (time.perf_counter() - schedule_ms) * 1000
+        if server.PENDING_BATTLE: server.PENDING_BATTLE[1].result()
+        battle_ms = time.perf_counter()
+        server.run_scheduled_battle()
+        battle_ms = (time.perf_counter() - battle_ms) * 1000
+        timings.record("schedule_next_match", schedule_ms)
+        timings.record("run_scheduled_battle", battle_ms)
+        timings.record("battle_cycle", schedule_ms + battle_ms)
+
+##################################
+#             RUNNER             #
+##################################
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+#copies the seeded database to a scratch file for this run
+def working_copy(db_path):
+    run_path = os.path.splitext(db_path)[0] + "-run.db"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(run_path + suffix): os.remove(run_path + suffix)
+    shutil.copyfile(db_path, run_path)
+    return run_path
+
+#seeds the database if it's missing or was built with different settings. Returns its seed info.
+def ensure_seeded(db_path, scale, seed_value, reseed=False):
+    info = load_info(db_path)
+    if reseed or not os.path.exists(db_path) or not info or info.get("scale") != scale or info.get("seed") != seed_value:
+        info = seed(db_path, scale, seed_value)
+    return info
+
+#imports the server against a scratch copy of the seeded database, with FakeGenclient in place of Gemini.
+#the server has to be configured before it's imported: the scratch database, local arena state and no arena loop.
+#env can add or override environment variables. Returns (app module, fake client).
+def import_server(db_path, latency, jitter, reject_rate, seed_value, env=None):
+    run_path = working_copy(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(run_path)}"
+    os.environ["ARENA_STATE"] = "memory"
+    os.environ["ARENA_LOOP"] = "off"
+    os.environ.setdefault("GEMINI_API", "bench")
+    os.environ.update(env or {})
+    import app as server
+    from bench.fakeclient import FakeGenclient
+
+    fake = FakeGenclient(latency, jitter, reject_rate, seed=seed_value)
+    server.CLIENT = fake
+    server.DATA.genclient = fake
+    return server, fake
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the backend's hot paths against a seeded database.")
+    parser.add_argument("--db", default=os.path.join(BENCH_DIR, "data", "bench.db"), help="seeded database, built if it's missing")
+    parser.add_argument("--scale", type=float, default=1.0, help="size of the database to seed, see bench.seed")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the database and the run")
+    parser.add_argument("--reseed", action="store_true", help="rebuild the database even if it exists")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per request benchmark")
+    parser.add_argument("--battles", type=int, default=5, help="full battle cycles to run")
+    parser.add_argument("--latency", type=float, default=0.5, help="average seconds per fake API call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="how much the fake latency varies, as a fraction of it")
+    parser.add_argument("--reject-rate", type=float, default=0.05, help="share of the queue the fake moderation rejects")
+    parser.add_argument("--out", default=None, help="where to write the JSON results (default bench/results/<time>.json)")
+    args = parser.parse_args()
+
+    info = ensure_seeded(args.db, args.scale, args.seed, args.reseed)
+    server, fake = import_server(args.db, args.latency, args.jitter, args.reject_rate, args.seed)
+
+    rng = random.Random(args.seed)
+    timings = Timings()
+    counts = info["counts"]
+    started = time.time()
+    with server.app.app_context():
+        for bench in (bench_roster, bench_login, bench_matchmaking, bench_card, bench_bets, bench_approval):
+            print(f"!-- BENCHMARK: {bench.__name__} --!")
+            bench(server, timings, rng, args.repeat, counts)
+        print("!-- BENCHMARK: bench_battles --!")
+        bench_battles(server, timings, rng, args.battles, counts)
+
+    results = {
+        "created": time.time(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": info,
+        "config": vars(args),
+        "api_calls": fake.calls,
+        "seconds": round(time.time() - started, 1),
+        "results": timings.summary()
+    }
+    out = args.out or os.path.join(BENCH_DIR, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'benchmark':<26}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}")
+    for name, stats in results["results"].items():
+        print(f"{name:<26}{stats['count']:>7}{stats['mean_ms']:>11.2f}{stats['p50_ms']:>11.2f}{stats['p95_ms']:>11.2f}{stats['max_ms']:>11.2f}")
+    print(f"\n!-- RESULTS WRITTEN TO {out} --!")
+    #the battle and moderation pools are left idle, exit without waiting on them
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
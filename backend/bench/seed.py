@@ -0,0 +1,197 @@
+#jfr, cwf, tjc
+#builds a large seeded database for the benchmarks.
+#the defaults are a busy season of Doodle Brawl: 100k fighters, 50k accounts and 1M matches, with drawings sized like real
+#WebP uploads. --scale shrinks (or grows) everything at once. The same --seed always builds the same database.
+#usage, from backend/:  python -m bench.seed --db bench/data/bench.db [--scale 0.1] [--seed 1]
+import os, json, math, time, uuid, random, hashlib, argparse
+from flask import Flask
+from sqlalchemy import text
+from components.dbmodel import db, User, Character, Match, MatchParticipant, ImageBlob
+from components.dbsetup import apply_sqlite_profile, setup_database
+from components.odds import BASE_RATING, ELO_K, ELO_K_NEW, ELO_PROVISIONAL, expected_score
+
+DEFAULT_CHARACTERS = 100_000
+DEFAULT_USERS = 50_000
+DEFAULT_MATCHES = 1_000_000
+DEFAULT_QUEUE = 200         #fighters still waiting on moderation
+DEFAULT_IMAGES = 2_000      #distinct drawings/portraits. Rows share them, the image store is content addressed anyway
+IMAGE_MEDIAN_BYTES = 40_000 #typical size of a WebP drawing from the canvas
+INSERT_CHUNK = 10_000       #rows per insert/commit
+
+ADJECTIVES = ["Mighty", "Sneaky", "Crayon", "Sketchy", "Doodle", "Grumpy", "Flying", "Iron", "Rubber", "Shadow", "Fuzzy", "Atomic"]
+NOUNS = ["Blob", "Knight", "Stickman", "Dragon", "Potato", "Wizard", "Robot", "Ninja", "Duck", "Cactus", "Goblin", "Comet"]
+PERSONALITIES = ["Brash", "Stoic", "Cheerful", "Sneaky", "Proud", "Reckless", "Calm", "Grumpy", "Eager", "Mysterious"]
+ALIGNMENTS = ["Good", "Evil", "Neutral"]
+
+#a flask app that only has the database, so seeding doesn't start the genclient or the arena
+def make_db_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(db_path)}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def insert_chunks(table, rows, label):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+        db.session.commit()
+    print(f"!-- SEEDED {len(rows)} {label} --!")
+
+#random bytes behind a WebP header, so the store sniffs them as image/webp. Sizes are log-normal around IMAGE_MEDIAN_BYTES.
+def make_images(rng, count):
+    rows = []
+    for _ in range(count):
+        size = int(min(250_000, max(8_000, rng.lognormvariate(math.log(IMAGE_MEDIAN_BYTES), 0.5))))
+        data = b"RIFF" + (size - 8).to_bytes(4, "little") + b"WEBPVP8 " + rng.randbytes(size - 16)
+        rows.append({"hash": hashlib.sha256(data).hexdigest(), "mime": "image/webp", "data": data, "size": size, "creation_time": time.time()})
+    return rows
+
+def make_stats(rng):
+    return {
+        "hp": max(50, min(200, int(rng.gauss(100, 25)))),
+        "agility": rng.randint(1, 100),
+        "power": rng.randint(1, 100)
+    }
+
+def seed(db_path, scale=1.0, seed_value=1):
+    rng = random.Random(seed_value)
+    counts = {
+        "characters": max(4, int(DEFAULT_CHARACTERS * scale)),
+        "users": max(2, int(DEFAULT_USERS * scale)),
+        "matches": int(DEFAULT_MATCHES * scale),
+        "queue": max(1, int(DEFAULT_QUEUE * scale)),
+        "images": max(2, int(DEFAULT_IMAGES * scale))
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix): os.remove(db_path + suffix)
+
+    started = time.time()
+    app = make_db_app(db_path)
+    with app.app_context():
+        apply_sqlite_profile(db.engine)
+        setup_database()
+
+        images = make_images(rng, counts["images"])
+        image_hashes = [row["hash"] for row in images]
+        insert_chunks(ImageBlob.__table__, images, "IMAGES")
+        del images
+
+        now = time.time()
+        user_ids = [str(1_000_000_000_000_000 + i) for i in range(counts["users"])]
+        insert_chunks(User.__table__, [{
+            "id": user_id,
+            "username": f"brawler{i}",
+            "portrait": None,
+            "portrait_hash": rng.choice(image_hashes),
+            "creation_time": now - rng.uniform(0, 365 * 86400),
+            "money": rng.randint(0, 5000),
+            "last_submission": 0.0,
+            "last_login_bonus": now - rng.uniform(0, 2 * 86400) #about half are due their daily bonus
+        } for i, user_id in enumerate(user_ids)], "USERS")
+
+        approved_count = counts["characters"] - counts["queue"]
+        char_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(counts["characters"])]
+        approved_ids = char_ids[:approved_count]
+
+        #play out the match history first, so every fighter's record and rating agree with it
+        wins, losses, ratings = {}, {}, {}
+        def k_factor(char_id):
+            return ELO_K_NEW if wins.get(char_id, 0) + losses.get(char_id, 0) < ELO_PROVISIONAL else ELO_K
+        match_rows, participant_rows = [], []
+        history_start = now - 365 * 86400
+        step = 365 * 86400 / max(1, counts["matches"])
+        names = {char_id: f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}" for i, char_id in enumerate(char_ids)}
+        for match_id in range(1, counts["matches"] + 1):
+            p1, p2 = rng.sample(approved_ids, 2)
+            winner, loser = (p1, p2) if rng.random() < 0.5 else (p2, p1)
+            expected = expected_score(ratings.get(winner, BASE_RATING), ratings.get(loser, BASE_RATING))
+            ratings[winner] = ratings.get(winner, BASE_RATING) + k_factor(winner) * (1 - expected)
+            ratings[loser] = ratings.get(loser, BASE_RATING) - k_factor(loser) * (1 - expected)
+            wins[winner] = wins.get(winner, 0) + 1
+            losses[loser] = losses.get(loser, 0) + 1
+            timestamp = history_start + match_id * step
+            match_rows.append({
+                "id": match_id,
+                "timestamp": timestamp,
+                "match_type": "1v1",
+                "summary": f"{names[winner]} defeats {names[loser]}!",
+                "winner_name": names[winner],
+                "winner_id": winner,
+                "match_data": {"teams": [[{"id": p1, "name": names[p1]}], [{"id": p2, "name": names[p2]}]]},
+                "is_title_bout": False,
+                "title_exchanged": None
+            })
+            for team, char_id in enumerate((p1, p2)):
+                participant_rows.append({"match_id": match_id, "character_id": char_id, "team": team, "is_winner": char_id == winner, "timestamp": timestamp})
+            if len(match_rows) >= INSERT_CHUNK:
+                db.session.execute(Match.__table__.insert(), match_rows)
+                db.session.execute(MatchParticipant.__table__.insert(), participant_rows)
+                db.session.commit()
+                match_rows, participant_rows = [], []
+        if match_rows:
+            db.session.execute(Match.__table__.insert(), match_rows)
+            db.session.execute(MatchParticipant.__table__.insert(), participant_rows)
+            db.session.commit()
+        print(f"!-- SEEDED {counts['matches']} MATCHES --!")
+
+        character_rows = []
+        for i, char_id in enumerate(char_ids):
+            approved = i < approved_count
+            char_wins, char_losses = wins.get(char_id, 0), losses.get(char_id, 0)
+            creator_id = rng.choice(user_ids)
+            character_rows.append({
+                "id": char_id,
+                "name": names[char_id],
+                "creation_time": now - rng.uniform(0, 365 * 86400) if approved else now - rng.uniform(0, 600),
+                "image_file": "",
+                "image_hash": rng.choice(image_hashes),
+                "creator_id": creator_id,
+                "description": "A fighter drawn for the benchmarks.",
+                "personality": rng.choice(PERSONALITIES),
+                "alignment": rng.choice(ALIGNMENTS),
+                "titles": [],
+                "manager_id": creator_id if rng.random() < 0.8 else rng.choice(user_ids),
+                "popularity": rng.randint(1, 100),
+                "status": "active",
+                "stats": make_stats(rng) if approved and char_wins + char_losses else {},
+                "wins": char_wins,
+                "losses": char_losses,
+                "wl_score": char_wins * 1.0 if char_losses == 0 else char_wins / char_losses,
+                "rating": ratings.get(char_id, BASE_RATING),
+                "is_approved": approved
+            })
+        insert_chunks(Character.__table__, character_rows, "CHARACTERS")
+
+        db.session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        db.session.close()
+        db.engine.dispose() #so the file can be copied without its WAL
+    elapsed = time.time() - started
+
+    info = {"scale": scale, "seed": seed_value, "counts": counts, "seconds": round(elapsed, 1), "created": time.time()}
+    with open(info_path(db_path), 'w') as f:
+        json.dump(info, f, indent=2)
+    print(f"!-- SEEDED {db_path} IN {elapsed:.1f}s --!")
+    return info
+
+#what a seeded database was built with, kept next to it
+def info_path(db_path):
+    return os.path.splitext(db_path)[0] + ".json"
+
+def load_info(db_path):
+    try:
+        with open(info_path(db_path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a seeded database for the benchmarks.")
+    parser.add_argument("--db", default="bench/data/bench.db", help="where to write the database")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every row count (1.0 = 100k fighters, 50k users, 1M matches)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, the same seed builds the same database")
+    args = parser.parse_args()
+    seed(args.db, args.scale, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#jfr, cwf, tjc
+#runs the real server, arena loop and all, on a scratch copy of a seeded database with FakeGenclient in place of Gemini.
+#this is what bench.load starts, but it can also be run by hand to poke at a big arena locally.
+#usage, from backend/:  python -m bench.serve [--port 5055] [--countdown 60] [--latency 0.5]
+import os, resource, argparse
+from bench.run import BENCH_DIR, ensure_seeded, import_server
+
+#thousands of sockets need thousands of file descriptors
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the server against a seeded database with a fake genclient.")
+    parser.add_argument("--db", default=os.path.join(BENCH_DIR, "data", "bench.db"), help="seeded database, built if it's missing")
+    parser.add_argument("--scale", type=float, default=0.1, help="size of the database to seed, see bench.seed")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the database and the fake client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--countdown", type=int, default=60, help="seconds of betting before each fight (the real server uses 180)")
+    parser.add_argument("--latency", type=float, default=0.5, help="average seconds per fake API call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="how much the fake latency varies, as a fraction of it")
+    parser.add_argument("--reject-rate", type=float, default=0.05, help="share of the queue the fake moderation rejects")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    ensure_seeded(args.db, args.scale, args.seed)
+    #VITE_SOCKET_URL pointing at localhost opens the debug routes, which bench.load uses to skip the fight animations
+    server, fake = import_server(args.db, args.latency, args.jitter, args.reject_rate, args.seed, env={
+        "VITE_SOCKET_URL": f"http://localhost:{args.port}"
+    })
+    server.BATTLE_TIMER = args.countdown
+    print("!-- STARTING BATTLE LOOP... --!")
+    server.socketio.start_background_task(server.server_loop)
+    server.socketio.run(server.app, host=args.host, port=args.port, use_reloader=False, log_output=False, allow_unsafe_werkzeug=True)
+
+if __name__ == '__main__':
+    main()
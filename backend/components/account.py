@@ -1,7 +1,9 @@
 #jfr, cwf, tjc
 
 from flask import Blueprint, request, jsonify
-from components.dbmodel import db, User, Character
+from components.dbmodel import db, User, Character, THUMB_SMALL, THUMB_MEDIUM, image_url, load_user_map, serialize_characters_display
+from components.imagestore import store_image
+from components.thumbnails import THUMBNAILS
 import secrets, time, re
 
 account_bp = Blueprint('account', __name__)
@@ -22,6 +24,9 @@ def create_account():
     portrait = data.get('portrait') #expecting a base64 string
     if not username or not portrait:
         return jsonify({"error": "Username and Portrait are required."}), 400
+    portrait_hash = store_image(portrait)
+    if not portrait_hash:
+        return jsonify({"error": "Portrait could not be read."}), 400
     new_id = None
     while True:
         test_id = "".join([str(secrets.randbelow(10)) for _ in range(16)])
@@ -31,13 +36,14 @@ def create_account():
     new_user = User(
         id=new_id,
         username=username,
-        portrait=portrait,
+        portrait_hash=portrait_hash,
         creation_time=time.time(),
         money=100
     )
     try:
         db.session.add(new_user)
         db.session.commit()
+        THUMBNAILS.request(portrait_hash)
         print(f"$-- NEW ACCOUNT CREATED: {username} with ID [{new_id}]")
         return jsonify({
             "status": "success",
@@ -67,17 +73,18 @@ def login_account():
 
         created_chars = Character.query.filter_by(creator_id=user.id).all()
         managed_chars = user.characters
+        users = load_user_map(created_chars + managed_chars) #one lookup for every creator/manager on the page
 
         return jsonify({
             "status": "success",
             "id": user.id,
             "username": user.username,
             "money": user.money,
-            "portrait": user.portrait,
+            "portrait_url": image_url(user.portrait_hash, THUMB_MEDIUM),
             "creation_time": user.creation_time,
             "bonus_awarded": bonus_awarded,
-            "created_characters": [c.to_dict_display() for c in created_chars],
-            "managed_characters": [c.to_dict() for c in managed_chars]
+            "created_characters": [c.to_dict_display(users, THUMB_SMALL) for c in created_chars],
+            "managed_characters": [c.to_dict(users) for c in managed_chars]
         })
     else:
         return jsonify({"error": "Invalid Account ID"}), 401
@@ -95,8 +102,8 @@ def get_public_profile(username):
     return jsonify({
         "status": "success",
         "username": user.username,
-        "portrait": user.portrait,
+        "portrait_url": image_url(user.portrait_hash, THUMB_MEDIUM),
         "creation_time": user.creation_time,
         "money": user.money,
-        "characters": [c.to_dict_display() for c in public_chars] 
+        "characters": serialize_characters_display(public_chars)
     })
\ No newline at end of file
@@ -0,0 +1,138 @@
+#jfr, cwf, tjc
+#arena state and who gets to run the server loop.
+#by default both live in this process, which is all a single worker needs.
+#with ARENA_STATE=sql they live in the database instead, so several workers (or machines on the same DATABASE_URL)
+#serve one arena. Every worker reads the state, but only the worker holding the lease runs the loop.
+import os, copy, socket, time, threading, uuid
+from sqlalchemy import update
+from components.dbmodel import db, ArenaValue, Lease
+
+LEASE_TTL = 15   #seconds a leader can go without renewing before another worker takes over
+LEASE_RENEW = 5  #how often the leader renews, and how often the others check if it's gone
+
+ARENA_DEFAULTS = {
+    'phase': "scheduled",   #what the arena is doing: "scheduled", "fighting" or "announcing"
+    'deadline': None,       #wall clock time the current phase ends at, None if it ends whenever the loop says so
+    'frozen': False,        #for freezing the timer
+    'frozen_left': None,    #seconds that were left on the phase when the timer was frozen
+    'card': None,           #[p1_id, p2_id] for the upcoming fight
+    'card_names': None,     #[p1_name, p2_name], so the timer doesn't have to load the fighters
+    'odds': {},             #{fighter_id: odds} the bet book opened the card with
+    'base_pool': 0,         #house money the betting pool started with
+}
+
+#########################
+#        STORES         #
+#########################
+
+#keeps the state in a dict. Only correct with one worker.
+class MemoryArenaStore:
+    shared = False
+
+    def __init__(self):
+        self.values = copy.deepcopy(ARENA_DEFAULTS)
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            return copy.deepcopy(self.values)
+
+    def save(self, **changes):
+        with self.lock:
+            self.values.update(copy.deepcopy(changes))
+
+#keeps the state in the ArenaValue table. Each field is its own row, so a debug freeze on one worker
+#can't overwrite a phase change the leader saved at the same time.
+#NOTE - save commits the session, only call it when there's nothing half done in it.
+class SQLArenaStore:
+    shared = True
+
+    def load(self):
+        state = copy.deepcopy(ARENA_DEFAULTS)
+        state.update({row.key: row.value for row in db.session.query(ArenaValue.key, ArenaValue.value).all()})
+        return state
+
+    def save(self, **changes):
+        for key, value in changes.items():
+            db.session.merge(ArenaValue(key=key, value=value, updated_time=time.time()))
+        db.session.commit()
+
+#########################
+#        LEASES         #
+#########################
+
+#raised when the leader finds another worker has taken the lease, before it writes anything more
+class LeaseLost(Exception):
+    pass
+
+#the only worker there is always leads
+class MemoryLease:
+    holder = "local"
+
+    def acquire(self):
+        return True
+
+    def hold(self):
+        return True
+
+    def release(self):
+        pass
+
+#a row in the Lease table. Taking it is a single conditional UPDATE, so two workers can't both win.
+class SQLLease:
+    def __init__(self, name, ttl=LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    #takes the lease if it's free or expired, or renews it if we already hold it.
+    #returns True while this worker holds the lease.
+    def acquire(self):
+        leases = Lease.__table__
+        now = time.time()
+        try:
+            result = db.session.execute(
+                update(leases)
+                .where(leases.c.name == self.name, (leases.c.holder == self.holder) | (leases.c.expires < now))
+                .values(holder=self.holder, expires=now + self.ttl)
+            )
+            held = result.rowcount == 1
+            if not held and db.session.get(Lease, self.name) is None:
+                #first worker ever, the row doesn't exist yet
+                db.session.add(Lease(name=self.name, holder=self.holder, expires=now + self.ttl))
+                held = True
+            db.session.commit()
+            return held
+        except Exception as e:
+            #another worker inserted the row first, or the DB is busy. Either way we don't hold it.
+            db.session.rollback()
+            print(f"!-- COULD NOT TAKE LEASE {self.name}: {e} --!")
+            return False
+
+    #renews the lease inside the caller's transaction without committing it, returns False if another worker has it.
+    #call this right before committing writes only the leader may make: the renewal lands in the same commit,
+    #so a leader whose lease ran out (ex. while it waited on a slow battle) can't write over the new one's work.
+    def hold(self):
+        leases = Lease.__table__
+        now = time.time()
+        result = db.session.execute(
+            update(leases)
+            .where(leases.c.name == self.name, (leases.c.holder == self.holder) | (leases.c.expires < now))
+            .values(holder=self.holder, expires=now + self.ttl)
+        )
+        return result.rowcount == 1
+
+    #lets another worker take over right away instead of waiting for the lease to expire
+    def release(self):
+        leases = Lease.__table__
+        db.session.execute(update(leases).where(leases.c.name == self.name, leases.c.holder == self.holder).values(expires=0.0))
+        db.session.commit()
+
+#picks the backends from the ARENA_STATE env variable ("memory" or "sql"), returns (store, lease)
+def make_arena_backend():
+    backend = os.getenv('ARENA_STATE', 'memory').lower()
+    if backend == "sql":
+        return SQLArenaStore(), SQLLease("server_loop")
+    if backend != "memory":
+        print(f"!-- UNKNOWN ARENA_STATE {backend}, USING MEMORY --!")
+    return MemoryArenaStore(), MemoryLease()
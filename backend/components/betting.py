@@ -0,0 +1,211 @@
+#jfr, cwf, tjc
+#the bet book for the upcoming match.
+#wagers are kept in memory, keyed by user, with a running stake total per fighter so every check is O(1).
+#each wager is also written to the Bet table in the same commit as the user's money, so a restart doesn't lose any stakes.
+#when several workers share the arena, the Bet table is the book and the in-memory copy is re-read before it's used.
+import threading
+from sqlalchemy import update, insert, delete, select, bindparam, func
+from components.dbmodel import db, Bet, User
+
+#adds money to many users with one executemany UPDATE, instead of loading each user.
+#amounts is {user_id: amount}. The caller commits.
+def credit_users(amounts):
+    if not amounts: return
+    users = User.__table__
+    db.session.execute(
+        update(users).where(users.c.id == bindparam('b_user_id')).values(money=users.c.money + bindparam('b_amount')),
+        [{'b_user_id': user_id, 'b_amount': amount} for user_id, amount in amounts.items()]
+    )
+
+class BetBook:
+    #shared is True when other workers take bets on the same card, see components/arenastate.py
+    def __init__(self, shared=False):
+        self.shared = shared
+        self.match_key = None   #"p1_id:p2_id" of the card that's open for betting
+        self.odds = {}          #{fighter_id: float_odds}
+        self.base_pool = 0      #the house money the pool started with
+        self.bets = {}          #{user_id: {'fighter_id': id, 'amount': int}}
+        self.staked = {}        #{fighter_id: total amount wagered on them}
+        self.total_staked = 0
+        self.lock = threading.Lock()
+
+    #the betting pool for this match
+    @property
+    def pool(self):
+        return self.base_pool + self.total_staked
+
+    #closes out the previous card before a new one is picked. Any stakes still on it are given back. Commits.
+    #this happens before the new fighters are loaded, so the commit doesn't expire them.
+    def close(self):
+        if Bet.query.first() is None:
+            return
+        self.refund()
+        db.session.commit()
+
+    #starts a fresh book for a new card
+    def open(self, fighter_ids, odds, base_pool):
+        with self.lock:
+            self._reset(fighter_ids, odds, base_pool)
+
+    #reopens the card saved in the Bet table, putting its wagers back into the book.
+    #bets keep the odds they were placed at, even if the fresh odds came out differently.
+    def resume(self, fighter_ids, odds, base_pool):
+        with self.lock:
+            self._reset(fighter_ids, odds, base_pool)
+            for row in Bet.query.filter_by(match_key=self.match_key).all():
+                self._add(row.user_id, row.fighter_id, row.amount)
+                if row.odds: self.odds[row.fighter_id] = row.odds
+            print(f"$-- RESTORED {len(self.bets)} BETS WORTH ${self.total_staked} --$")
+
+    def _reset(self, fighter_ids, odds, base_pool):
+        self.match_key = ":".join(fighter_ids)
+        self.odds = dict(odds)
+        self.base_pool = base_pool
+        self.bets = {}
+        self.staked = {}
+        self.total_staked = 0
+
+    #reloads the book from the arena state and the Bet table, for when other workers have been taking bets too.
+    #only the totals and user_id's own bet are loaded, that's all check() needs.
+    def refresh(self, state, user_id=None):
+        with self.lock:
+            self._refresh(state, user_id)
+
+    def _refresh(self, state, user_id=None):
+        self._reset(state.get('card') or [], state.get('odds') or {}, state.get('base_pool') or 0)
+        self._load_totals()
+        if user_id: self._load_bet(user_id)
+
+    def _load_totals(self):
+        rows = db.session.query(Bet.fighter_id, func.sum(Bet.amount)).filter_by(match_key=self.match_key).group_by(Bet.fighter_id).all()
+        self.staked = {fighter_id: total for fighter_id, total in rows}
+        self.total_staked = sum(self.staked.values())
+
+    #re-reads one user's bet on this card from the Bet table, a second tab or another worker may have just added to it
+    def _load_bet(self, user_id):
+        row = db.session.execute(
+            select(Bet.fighter_id, Bet.amount).where(Bet.user_id == user_id, Bet.match_key == self.match_key)
+        ).first()
+        if row: self.bets[user_id] = {'fighter_id': row.fighter_id, 'amount': row.amount}
+        else: self.bets.pop(user_id, None)
+
+    def _add(self, user_id, fighter_id, amount):
+        bet = self.bets.setdefault(user_id, {'fighter_id': fighter_id, 'amount': 0})
+        bet['amount'] += amount
+        self.staked[fighter_id] = self.staked.get(fighter_id, 0) + amount
+        self.total_staked += amount
+        return bet['amount']
+
+    def get(self, user_id):
+        return self.bets.get(user_id)
+
+    #liability is how much we must payout if this fighter wins.
+    def liability(self, fighter_id):
+        return self.staked.get(fighter_id, 0) * self.odds.get(fighter_id, 1.1)
+
+    #returns an error message if the bet isn't allowed, otherwise None
+    def check(self, user_id, fighter_id, amount):
+        existing_bet = self.bets.get(user_id)
+        #prevent "hedging" the bet
+        if existing_bet and existing_bet['fighter_id'] != fighter_id:
+            return 'You cannot bet on both fighters!'
+        odds = self.odds.get(fighter_id, 1.1)
+        current_fighter_liability = self.liability(fighter_id)
+        new_total_liability = current_fighter_liability + (amount * odds)
+        #bets must NOT make us exceed total liability
+        if new_total_liability > (self.pool + amount):
+            safe_divisor = max(0.1, odds - 1.0) #prevent division by zero
+            max_add = int((self.pool - current_fighter_liability) / safe_divisor)
+            return f'The prize pool is too small to cover that payout! Maximum additional wager: ${max(0, max_add)}'
+        return None
+
+    #takes the money from the user and records the bet, in one commit.
+    #state is the shared arena state, when other workers take bets too. The book is reloaded from it under the same
+    #lock as the check and the write, so nothing can slip in between.
+    #the money and the stake are changed with "x = x + amount" UPDATEs guarded on the balance and the fighter,
+    #so two bets from the same user at once can't overdraw them or land on both fighters.
+    #returns (total wagered by this user, None) or (None, error message)
+    def place(self, user, fighter_id, amount, state=None):
+        with self.lock:
+            if state is not None:
+                self._refresh(state)
+            if fighter_id not in self.odds:
+                return None, 'That fighter is not on the card!'
+            self._load_bet(user.id)
+            error = self.check(user.id, fighter_id, amount)
+            if error:
+                return None, error
+            users, bets = User.__table__, Bet.__table__
+            try:
+                paid = db.session.execute(
+                    update(users).where(users.c.id == user.id, users.c.money >= amount).values(money=users.c.money - amount)
+                ).rowcount
+                if not paid:
+                    db.session.rollback()
+                    return None, 'Insufficient funds!'
+                if self.bets.get(user.id):
+                    added = db.session.execute(
+                        update(bets).where(bets.c.user_id == user.id, bets.c.match_key == self.match_key, bets.c.fighter_id == fighter_id)
+                        .values(amount=bets.c.amount + amount, odds=self.odds.get(fighter_id, 1.1))
+                    ).rowcount
+                    if not added:
+                        db.session.rollback()
+                        return None, 'You cannot bet on both fighters!'
+                else:
+                    #a plain INSERT, so a first bet racing this one fails on the primary key instead of being overwritten
+                    db.session.execute(delete(bets).where(bets.c.user_id == user.id, bets.c.match_key != self.match_key))
+                    db.session.execute(insert(bets).values(
+                        user_id=user.id, match_key=self.match_key, fighter_id=fighter_id, amount=amount, odds=self.odds.get(fighter_id, 1.1)
+                    ))
+                if self.shared:
+                    #another worker may have taken a bet since check(). Writing first holds the DB write lock,
+                    #so the totals read back here include every bet that got in before ours.
+                    self._load_totals()
+                    if self.liability(fighter_id) > self.pool:
+                        db.session.rollback()
+                        return None, 'The prize pool is too small to cover that payout!'
+                    self.total_staked -= amount
+                    self.staked[fighter_id] -= amount
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"!-- ERROR SAVING BET: {e} --!")
+                return None, 'Your bet could not be placed, please try again.'
+            return self._add(user.id, fighter_id, amount), None
+
+    #empties the book and its rows. The caller commits, so this can share a transaction with the match result.
+    def clear(self):
+        with self.lock:
+            self.bets = {}
+            self.staked = {}
+            self.total_staked = 0
+            db.session.query(Bet).delete()
+
+    #pays out every winning bet and empties the book.
+    #the caller commits, so the payouts land in the same transaction as the match result.
+    #returns {user_id: payout} for the winners.
+    #the winning stakes are read from the Bet table, so bets taken by other workers are paid too.
+    def settle(self, winner_id):
+        with self.lock:
+            odds = self.odds.get(winner_id, 1.1)
+            winning_bets = db.session.query(Bet.user_id, Bet.amount).filter_by(match_key=self.match_key, fighter_id=winner_id).all()
+            payouts = {user_id: int(amount * odds) for user_id, amount in winning_bets}
+            credit_users(payouts)
+        self.clear()
+        return payouts
+
+    #gives every stake back, used when a match is called off or replaced. The caller commits.
+    #this reads the Bet table rather than the book, so stakes from before a restart are covered too.
+    def refund(self):
+        with self.lock:
+            credit_users(dict(db.session.query(Bet.user_id, Bet.amount).all()))
+        self.clear()
+
+    #########################
+    #      BOOT FUNCs       #
+    #########################
+
+    #the card saved in the Bet table from before a restart, as a list of fighter ids (or None)
+    def saved_card(self):
+        row = Bet.query.first()
+        return row.match_key.split(":") if row else None
@@ -0,0 +1,64 @@
+#jfr, cwf, tjc
+#the crowd, a handful of random user portraits.
+#users are picked by probing the primary key index at random ids (the first user at or after each probe), so a
+#sample costs CROWD_SIZE-ish single row lookups however many users there are. The sample is kept for CROWD_TTL
+#seconds and everyone asking in that window gets the same crowd.
+import os, time, random, threading
+from components.dbmodel import db, User, THUMB_SMALL, image_url
+
+CROWD_SIZE = 12
+CROWD_TTL = float(os.getenv('CROWD_TTL', 30))   #seconds before the crowd is re-sampled
+PROBES_PER_SEAT = 3                             #give up on filling a seat after this many probes, ex. on a tiny user table
+
+class Crowd:
+    def __init__(self, size=CROWD_SIZE, ttl=CROWD_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.snapshot = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    #the current crowd. Only one request re-samples when it expires, the rest keep getting the old one meanwhile.
+    def get(self):
+        if self.snapshot is None:
+            with self.lock:
+                if self.snapshot is None: self.refresh()
+        elif time.time() >= self.expires and self.lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self.lock.release()
+        return self.snapshot
+
+    def refresh(self):
+        self.snapshot = [{"username": row.username, "portrait_url": image_url(row.portrait_hash, THUMB_SMALL)} for row in self.sample()]
+        self.expires = time.time() + self.ttl
+
+    def sample(self):
+        #two index walks, min() and max() in one query would scan the table
+        users = db.session.query(User.id).filter(User.portrait_hash != None)
+        low = users.order_by(User.id).limit(1).scalar()
+        if low is None: return []
+        high = users.order_by(User.id.desc()).limit(1).scalar()
+        picked = {}
+        for _ in range(self.size * PROBES_PER_SEAT):
+            row = self.first_user_from(random_id(low, high))
+            if row: picked[row.id] = row
+            if len(picked) >= self.size: break
+        rows = list(picked.values())
+        random.shuffle(rows)
+        return rows
+
+    def first_user_from(self, probe):
+        return db.session.query(User.id, User.username, User.portrait_hash).filter(
+            User.id >= probe, User.portrait_hash != None
+        ).order_by(User.id).limit(1).first()
+
+#a random id between low and high. Account ids are all digits and the same length, so this is a random number
+#between them padded back out. Anything else falls back to a random id from the usual 16 digit space.
+def random_id(low, high):
+    if low.isdigit() and high.isdigit() and len(low) == len(high):
+        return str(random.randint(int(low), int(high))).zfill(len(low))
+    return "".join(str(random.randrange(10)) for _ in range(16))
+
+CROWD = Crowd()
@@ -10,13 +10,26 @@ import time
 
 db = SQLAlchemy()
 
+#thumbnail sizes (longest side, in pixels), see components/thumbnails.py.
+#each view links the smallest size that still looks sharp where it's shown.
+THUMB_SMALL = 128   #creator portraits, the crowd, account lists
+THUMB_MEDIUM = 256  #the roster and profiles
+THUMB_LARGE = 512   #the arena
+THUMB_SIZES = (THUMB_SMALL, THUMB_MEDIUM, THUMB_LARGE)
+
+#builds the public URL for an image in the image store, or for one of its thumbnails if a size is given
+def image_url(image_hash, size=None):
+    if not image_hash: return None
+    return f"/api/image/{image_hash}/{size}" if size else f"/api/image/{image_hash}"
+
 #user accounts use a Mullvad-style 16 digit number for account identification.
 #easy to track and easy to remember/copy
 class User(UserMixin, db.Model):
     id = db.Column(db.String(16), primary_key=True)                          #Unique 16-digit ID
     creation_time = db.Column(db.Float, default=time.time)                   #Time of user creation
-    portrait = db.Column(db.Text)                                            #User portrait, stored as a base64 text
-    username = db.Column(db.String(32))                                      #Username of account
+    portrait = db.Column(db.Text)                                            #legacy base64 portrait, empty once it's moved to the image store
+    portrait_hash = db.Column(db.String(64), nullable=True)                  #hash of the portrait in the image store
+    username = db.Column(db.String(32), index=True)                          #Username of account
     money = db.Column(db.Integer, default=100)                               #how much money the user has
     last_submission = db.Column(db.Float, default=0.0)                       #when did the user last submit a character, used for 5min cooldown
     last_login_bonus = db.Column(db.Float, default=0.0)                      #timer for tracking login bonus reward
@@ -33,16 +46,17 @@ class Character(db.Model):
     id = db.Column(db.String(36), primary_key=True)                          #UUID
     name = db.Column(db.String(64), nullable=False, unique=True)                          #name of this character
     creation_time = db.Column(db.Float, default=time.time)                   #time the character was created
-    image_file = db.Column(db.Text, nullable=False)                          #the drawing of the character.
+    image_file = db.Column(db.Text, nullable=False)                          #legacy base64 drawing, "" once it's moved to the image store
+    image_hash = db.Column(db.String(64), nullable=True)                     #hash of the drawing in the image store
     #who made this
-    creator_id = db.Column(db.String(16), nullable=True, default="Unknown")
+    creator_id = db.Column(db.String(16), nullable=True, default="Unknown", index=True)
 
     #bio
     description = db.Column(db.Text, default="Mysterious Challenger!")                              #description of character
     personality = db.Column(db.String(16), default="Unknown")                                       #how this character conducts themselves
     alignment = db.Column(db.String(20), default="Unknown")                                         #what titles do they hold
     titles = db.Column(JSON, default=list)                                                          #list of strings
-    manager_id = db.Column(db.String(16), db.ForeignKey('user.id'), nullable=True, default="None")  #who is their manager?
+    manager_id = db.Column(db.String(16), db.ForeignKey('user.id'), nullable=True, default="None", index=True)  #who is their manager?
     popularity = db.Column(db.Integer, default=1)                                                   #how popular is this character (based on generated stats, not influenced by humans yet)
     status = db.Column(db.String(16), default="active")                                             #what is the status of this character? active, retired, injurec
 
@@ -50,31 +64,41 @@ class Character(db.Model):
     stats = db.Column(JSON, default=dict)
     wins = db.Column(db.Integer, default=0)
     losses = db.Column(db.Integer, default=0)
+    wl_score = db.Column(db.Float, default=0.0)                               #w/l ratio, kept up to date so the roster can be read off an index
+    rating = db.Column(db.Float, default=1500.0)                              #Elo rating, see components/odds.py
 
     #flags
-    is_approved = db.Column(db.Boolean, default=False)
+    is_approved = db.Column(db.Boolean, default=False, index=True)
+
+    #recalculates wl_score. Call this whenever wins or losses change.
+    def update_rank(self):
+        wins, losses = self.wins or 0, self.losses or 0
+        self.wl_score = wins * 1.0 if losses == 0 else (wins * 1.0) / losses
 
     #return the username of who created this character
-    def get_creator_name(self):
+    #users is an optional {user_id: row} map from load_user_map, so lists of characters don't query once per fighter.
+    def get_creator_name(self, users=None):
         if self.creator_id and self.creator_id != "Unknown":
-            user = User.query.get(self.creator_id)
+            user = (users if users is not None else load_user_map([self])).get(self.creator_id)
             return user.username if user else "Unknown"
         return "Unknown"
     #return the portrait of the creator of this character
-    def get_creator_portrait(self):
+    def get_creator_portrait(self, users=None):
         if self.creator_id and self.creator_id != "Unknown":
-            user = User.query.get(self.creator_id)
-            return user.portrait if user else None
+            user = (users if users is not None else load_user_map([self])).get(self.creator_id)
+            return image_url(user.portrait_hash, THUMB_SMALL) if user else None
         return None
 
-    def get_manager_name(self):
+    def get_manager_name(self, users=None):
         if self.manager_id and self.manager_id != "None":
-            user = User.query.get(self.manager_id)
+            user = (users if users is not None else load_user_map([self])).get(self.manager_id)
             return user.username if user else "None"
         return "None"
     
     #general dict containing everything except for exact user/manager IDs
-    def to_dict(self):
+    #size is the thumbnail image_url links to, pick the one for the view (see THUMB_SIZES)
+    def to_dict(self, users=None, size=THUMB_MEDIUM):
+        if users is None: users = load_user_map([self])
         return {
             "id": self.id,
             "name": self.name,
@@ -82,12 +106,13 @@ class Character(db.Model):
             "stats": self.stats,
             "wins": self.wins,
             "losses": self.losses,
+            "rating": self.rating,
             "status": self.status,
             "description": self.description,
             "personality": self.personality,
-            "image_file": self.image_file,
-            "creator_name": self.get_creator_name(),
-            "manager_name": self.get_manager_name(),
+            "image_url": image_url(self.image_hash, size),
+            "creator_name": self.get_creator_name(users),
+            "manager_name": self.get_manager_name(users),
             "popularity": self.popularity,
             "alignment": self.alignment,
             "is_approved": self.is_approved,
@@ -96,7 +121,8 @@ class Character(db.Model):
     
     #dict used for displaying fighters. Doesn't include stats or IDs
     #this should be used for roster and arena views so we don't accidentally reveal character stats.
-    def to_dict_display(self):
+    def to_dict_display(self, users=None, size=THUMB_MEDIUM):
+        if users is None: users = load_user_map([self])
         return {
             "id": self.id,
             "name": self.name,
@@ -105,10 +131,10 @@ class Character(db.Model):
             "status": self.status,
             "is_approved": self.is_approved,
             "description": self.description,
-            "image_file": self.image_file,
-            "creator_name": self.get_creator_name(),
-            "creator_portrait": self.get_creator_portrait(),
-            "manager_name": self.get_manager_name(),
+            "image_url": image_url(self.image_hash, size),
+            "creator_name": self.get_creator_name(users),
+            "creator_portrait_url": self.get_creator_portrait(users),
+            "manager_name": self.get_manager_name(users),
             "popularity": self.popularity,
             "alignment": self.alignment,
             "titles": self.titles
@@ -123,10 +149,12 @@ class Character(db.Model):
             "stats": self.stats,
             "wins": self.wins,
             "losses": self.losses,
+            "rating": self.rating,
             "status": self.status,
             "description": self.description,
             "personality": self.personality,
             "image_file": self.image_file,
+            "image_hash": self.image_hash,
             "creator_id": self.creator_id,
             "manager_id": self.manager_id,
             "popularity": self.popularity,
@@ -135,10 +163,42 @@ class Character(db.Model):
             "titles": self.titles
         }
 
+#the roster ordering: approved fighters by w/l ratio, then wins, with id to break ties.
+ROSTER_ORDER = (Character.wl_score.desc(), Character.wins.desc(), Character.id)
+db.Index('ix_character_rank', Character.is_approved, *ROSTER_ORDER)
+
+#looks up every creator and manager of a list of characters with one IN (...) query.
+#only the columns the serializers need are loaded, never the full User rows.
+#returns {user_id: row} where row has .username and .portrait_hash
+def load_user_map(characters):
+    user_ids = {c.creator_id for c in characters} | {c.manager_id for c in characters}
+    user_ids -= {None, "Unknown", "None"}
+    if not user_ids: return {}
+    rows = db.session.query(User.id, User.username, User.portrait_hash).filter(User.id.in_(user_ids)).all()
+    return {row.id: row for row in rows}
+
+#bulk versions of to_dict/to_dict_display. Use these whenever serializing more than one character.
+def serialize_characters(characters, size=THUMB_MEDIUM):
+    users = load_user_map(characters)
+    return [c.to_dict(users, size) for c in characters]
+
+def serialize_characters_display(characters, size=THUMB_MEDIUM):
+    users = load_user_map(characters)
+    return [c.to_dict_display(users, size) for c in characters]
+
+#in-flight wagers on the upcoming match, mirrored from the bet book so they survive a restart
+class Bet(db.Model):
+    user_id = db.Column(db.String(16), primary_key=True)             #one bet per user per match
+    match_key = db.Column(db.String(80), nullable=False)             #"p1_id:p2_id" of the card the bet is on
+    fighter_id = db.Column(db.String(36), nullable=False)            #who they bet on
+    amount = db.Column(db.Integer, default=0)                        #total wagered
+    odds = db.Column(db.Float, default=1.1)                          #odds of that fighter when the bet was placed
+    placed_time = db.Column(db.Float, default=time.time)
+
 #Match history db
 class Match(db.Model):
     id = db.Column(db.Integer, primary_key=True)                #id of the match. this is just sequential
-    timestamp = db.Column(db.Float, default=time.time)          #timestamp of when the match happened
+    timestamp = db.Column(db.Float, default=time.time, index=True) #timestamp of when the match happened
     match_type = db.Column(db.String(16), default="1v1")        #what kind of match, usually just a 1v1
     summary = db.Column(db.Text)                                #the summary of the match
     winner_name = db.Column(db.String(64))                      
@@ -172,5 +232,61 @@ class Match(db.Model):
             "title_exchanged": self.title_exchanged
         }
 
+#who fought in each match, one row per fighter.
+#match_data keeps the teams as JSON for display, this table is what history lookups use.
+class MatchParticipant(db.Model):
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), primary_key=True)
+    character_id = db.Column(db.String(36), primary_key=True)
+    team = db.Column(db.Integer, default=0)                     #index of their team in match_data
+    is_winner = db.Column(db.Boolean, default=False)
+    timestamp = db.Column(db.Float)                             #copy of the match's timestamp, so a fighter's history is one index range
+
+    __table_args__ = (db.Index('ix_participant_fighter', 'character_id', 'timestamp', 'match_id'),)
+
+    def to_dict_display(self):
+        return {
+            "id": self.character_id,
+            "team": self.team,
+            "is_winner": self.is_winner
+        }
+
+#content-addressed image store.
+#every drawing and portrait is stored once here, keyed by the sha256 of its bytes.
+class ImageBlob(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)           #sha256 hex digest of the image bytes
+    mime = db.Column(db.String(32), default="image/webp")       #content type to serve the image as
+    data = db.Column(db.LargeBinary, nullable=False)            #the raw image bytes
+    size = db.Column(db.Integer, default=0)                     #length of data, in bytes
+    creation_time = db.Column(db.Float, default=time.time)      #when this image was first stored
+
+#resized copies of images in the store, made by components/thumbnails.py.
+#the thumbnail itself is an ImageBlob like any other image. Images already smaller than the size link to themselves.
+class Thumbnail(db.Model):
+    image_hash = db.Column(db.String(64), primary_key=True)     #hash of the original image
+    size = db.Column(db.Integer, primary_key=True)              #longest side, one of THUMB_SIZES
+    thumb_hash = db.Column(db.String(64), nullable=False)       #hash of the resized image in the store
+
+#shared arena state, one row per field. Only used when several workers serve the same arena (ARENA_STATE=sql)
+class ArenaValue(db.Model):
+    key = db.Column(db.String(32), primary_key=True)            #name of the field, see ARENA_DEFAULTS
+    value = db.Column(JSON)                                     #the field's value
+    updated_time = db.Column(db.Float, default=time.time)
+
+#time limited locks, used to make sure only one worker runs the server loop
+class Lease(db.Model):
+    name = db.Column(db.String(32), primary_key=True)           #what the lease is for
+    holder = db.Column(db.String(64), nullable=True)            #the worker holding it
+    expires = db.Column(db.Float, default=0.0)                  #when it's up for grabs if the holder doesn't renew it
 
+#moderation rejections. Keyed by character, so "was this fighter rejected" is a primary key lookup.
+#the drawing is referenced by its hash in the image store instead of being copied in.
+class Rejection(db.Model):
+    character_id = db.Column(db.String(36), primary_key=True)   #the rejected character
+    name = db.Column(db.String(64))                             #their name when they were rejected
+    reason = db.Column(db.Text, default="Unknown")              #why moderation rejected them
+    image_hash = db.Column(db.String(64), nullable=True)        #the rejected drawing in the image store
+    rejected_time = db.Column(db.Float, default=time.time, index=True)
 
+#filter for characters still waiting on moderation: not approved, and not rejected
+def awaiting_approval():
+    return db.and_(Character.is_approved == False, ~db.exists().where(Rejection.character_id == Character.id))
@@ -0,0 +1,244 @@
+#jfr, cwf, tjc
+#database startup: the SQLite performance profile and the schema migration runner.
+import os, json, time
+from sqlalchemy import event, text, select, update, bindparam
+from sqlalchemy.schema import CreateTable
+from components.dbmodel import db, Rejection, Match, MatchParticipant, Character, Lease
+from components.arenastate import SQLLease, LeaseLost
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+REJECTED_FILE = os.path.join(BASE_DIR, 'assets/Data', 'rejected.json')  #the old rejection ledger
+
+##################################
+#         SQLITE PROFILE         #
+##################################
+
+#applied to every new connection.
+#WAL lets the roster/login readers run while the match loop is writing, instead of queueing behind it.
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     #safe with WAL, only the last transactions can be lost on power failure
+    "PRAGMA mmap_size=268435456",    #256MB of the DB file memory mapped
+    "PRAGMA cache_size=-65536",      #64MB page cache per connection
+    "PRAGMA busy_timeout=5000",      #wait up to 5s for a lock instead of failing right away
+    "PRAGMA temp_store=MEMORY",
+]
+
+def apply_sqlite_profile(engine):
+    if engine.dialect.name != "sqlite": return
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+##################################
+#           MIGRATIONS           #
+##################################
+
+MIGRATION_LEASE_TTL = 600  #seconds a worker can spend on one migration before another may take over
+MIGRATION_WAIT = 1         #seconds between checks while another worker migrates
+
+#NOTE - never edit or reorder a migration that has shipped, add a new one to the end of MIGRATIONS instead.
+#every step must be safe to run against a database that already has the change, since create_all builds
+#brand new databases straight from the models.
+
+def column_exists(table, column):
+    rows = db.session.execute(text(f'PRAGMA table_info("{table}")')).all()
+    return any(row[1] == column for row in rows)
+
+def add_column(table, column, ddl):
+    if not column_exists(table, column):
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+def create_index(name, table, columns):
+    db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})'))
+
+def migrate_character_status():
+    add_column("character", "status", "VARCHAR(16) DEFAULT 'active'")
+
+def migrate_user_timers():
+    add_column("user", "last_login_bonus", "FLOAT DEFAULT 0.0")
+    add_column("user", "last_submission", "FLOAT DEFAULT 0.0")
+
+def migrate_backfill_managers():
+    db.session.execute(text("UPDATE character SET manager_id = creator_id WHERE manager_id = 'None' OR manager_id IS NULL"))
+
+def migrate_image_hashes():
+    add_column("character", "image_hash", "VARCHAR(64)")
+    add_column("user", "portrait_hash", "VARCHAR(64)")
+
+def migrate_backfill_image_store():
+    from components.imagestore import convert_legacy_images
+    convert_legacy_images()
+
+def migrate_wl_score():
+    add_column("character", "wl_score", "FLOAT DEFAULT 0.0")
+    db.session.execute(text("UPDATE character SET wl_score = CASE WHEN losses = 0 THEN wins * 1.0 ELSE wins * 1.0 / losses END"))
+
+def migrate_hot_path_indexes():
+    create_index("ix_character_is_approved", "character", "is_approved")
+    create_index("ix_character_rank", "character", "is_approved, wl_score DESC, wins DESC, id")
+    create_index("ix_character_creator_id", "character", "creator_id")
+    create_index("ix_character_manager_id", "character", "manager_id")
+    create_index("ix_user_username", "user", "username")
+    create_index("ix_match_timestamp", "match", "timestamp")
+
+#databases that ran migration 5 before it cleared the legacy strings still have them
+def migrate_raw_images():
+    from components.imagestore import convert_legacy_images
+    convert_legacy_images()
+
+#moves the old rejected.json ledger into the Rejection table. The file is left where it is.
+def migrate_rejection_ledger():
+    if not os.path.exists(REJECTED_FILE): return
+    from components.imagestore import store_image
+    with open(REJECTED_FILE, 'r') as f:
+        rejected_data = json.load(f)
+    for char_id, entry in rejected_data.items():
+        db.session.merge(Rejection(
+            character_id=char_id,
+            name=entry.get('name'),
+            reason=entry.get('reason', 'Unknown'),
+            image_hash=entry.get('image_hash') or store_image(entry.get('image')),
+            rejected_time=os.path.getmtime(REJECTED_FILE)
+        ))
+    print(f"!-- IMPORTED {len(rejected_data)} REJECTIONS FROM {REJECTED_FILE} --!")
+
+#fills MatchParticipant from the teams in match_data, a chunk of matches per commit.
+#matches that already have participants are skipped, so it's safe to run again.
+def migrate_match_participants(chunk_size=500):
+    matches = Match.__table__
+    participants = MatchParticipant.__table__
+    last_id, count = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(matches.c.id, matches.c.timestamp, matches.c.winner_id, matches.c.match_data)
+            .where(matches.c.id > last_id, ~select(participants.c.match_id).where(participants.c.match_id == matches.c.id).exists())
+            .order_by(matches.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows: break
+        new_rows = []
+        for match_id, timestamp, winner_id, match_data in rows:
+            teams = (match_data or {}).get('teams', [])
+            for team_index, team in enumerate(teams):
+                for fighter in team:
+                    if not fighter.get('id'): continue
+                    new_rows.append({
+                        'match_id': match_id,
+                        'character_id': fighter['id'],
+                        'team': team_index,
+                        'is_winner': fighter['id'] == winner_id,
+                        'timestamp': timestamp
+                    })
+        if new_rows:
+            db.session.execute(participants.insert().prefix_with("OR IGNORE"), new_rows)
+        db.session.commit()
+        count += len(new_rows)
+        last_id = rows[-1][0]
+    if count:
+        print(f"!-- BACKFILLED {count} MATCH PARTICIPANTS --!")
+
+#adds Elo ratings, and works out everyone's current rating by replaying the match history in order
+def migrate_ratings():
+    from components.odds import BASE_RATING, ELO_K, ELO_K_NEW, ELO_PROVISIONAL, expected_score
+    add_column("character", "rating", f"FLOAT DEFAULT {BASE_RATING}")
+    participants = MatchParticipant.__table__
+    rows = db.session.execute(
+        select(participants.c.match_id, participants.c.character_id, participants.c.is_winner)
+        .order_by(participants.c.timestamp, participants.c.match_id)
+    )
+    ratings, fights = {}, {}
+    def k_factor(char_id):
+        return ELO_K_NEW if fights.get(char_id, 0) < ELO_PROVISIONAL else ELO_K
+    def apply(match_rows):
+        winners = [r.character_id for r in match_rows if r.is_winner]
+        losers = [r.character_id for r in match_rows if not r.is_winner]
+        if len(winners) != 1 or len(losers) != 1: return
+        winner, loser = winners[0], losers[0]
+        expected = expected_score(ratings.get(winner, BASE_RATING), ratings.get(loser, BASE_RATING))
+        ratings[winner] = ratings.get(winner, BASE_RATING) + k_factor(winner) * (1 - expected)
+        ratings[loser] = ratings.get(loser, BASE_RATING) - k_factor(loser) * (1 - expected)
+        for char_id in (winner, loser): fights[char_id] = fights.get(char_id, 0) + 1
+    current, match_rows = None, []
+    for row in rows:
+        if row.match_id != current:
+            apply(match_rows)
+            current, match_rows = row.match_id, []
+        match_rows.append(row)
+    apply(match_rows)
+    characters = Character.__table__
+    db.session.execute(update(characters).values(rating=BASE_RATING))
+    if ratings:
+        db.session.execute(
+            update(characters).where(characters.c.id == bindparam('b_id')).values(rating=bindparam('b_rating')),
+            [{'b_id': char_id, 'b_rating': rating} for char_id, rating in ratings.items()]
+        )
+    print(f"!-- RATED {len(ratings)} FIGHTERS FROM MATCH HISTORY --!")
+
+#(version, description, function)
+MIGRATIONS = [
+    (1, "character status column", migrate_character_status),
+    (2, "user login bonus and submission timers", migrate_user_timers),
+    (3, "backfill manager ids", migrate_backfill_managers),
+    (4, "image store hash columns", migrate_image_hashes),
+    (5, "backfill image store", migrate_backfill_image_store),
+    (6, "character wl_score column", migrate_wl_score),
+    (7, "hot path indexes", migrate_hot_path_indexes),
+    (8, "raw image bytes", migrate_raw_images),
+    (9, "rejection ledger", migrate_rejection_ledger),
+    (10, "match participants", migrate_match_participants),
+    (11, "elo ratings", migrate_ratings),
+]
+
+#creates the tables and runs the migrations. Every worker does this on startup, so they take turns with the
+#"migrations" lease: only the holder runs create_all and the migrations, and it re-reads the schema version before
+#each one, since whoever held the lease before has probably applied them already.
+def setup_database():
+    #the lease's own table has to exist before anyone can take it, IF NOT EXISTS makes that safe to race
+    db.session.execute(CreateTable(Lease.__table__, if_not_exists=True))
+    db.session.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_time FLOAT)"))
+    db.session.commit()
+    lease = SQLLease("migrations", ttl=MIGRATION_LEASE_TTL)
+    waiting = False
+    while True:
+        if not lease.acquire():
+            if not waiting: print("!-- WAITING FOR ANOTHER WORKER TO FINISH MIGRATING --!")
+            waiting = True
+            time.sleep(MIGRATION_WAIT)
+            continue
+        try:
+            db.create_all()
+            run_migrations(lease)
+            return
+        except LeaseLost:
+            print("!-- MIGRATION LEASE LOST, ANOTHER WORKER TOOK OVER --!")
+        finally:
+            lease.release()
+
+def schema_version():
+    return db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+#applies every migration newer than the database's schema version, each in its own transaction.
+def run_migrations(lease):
+    for version, description, migration in MIGRATIONS:
+        if version <= schema_version(): continue
+        try:
+            migration()
+            db.session.execute(
+                text("INSERT INTO schema_version (version, description, applied_time) VALUES (:version, :description, :applied)"),
+                {"version": version, "description": description, "applied": time.time()}
+            )
+            #the version only lands if we still hold the lease, so a worker that stalled past the ttl can't record it twice
+            if not lease.hold(): raise LeaseLost()
+            db.session.commit()
+            print(f"!-- APPLIED MIGRATION {version}: {description.upper()} --!")
+        except LeaseLost:
+            db.session.rollback()
+            raise
+        except Exception as e:
+            db.session.rollback()
+            print(f"!-- MIGRATION {version} FAILED: {e} --!")
+            raise
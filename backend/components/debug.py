@@ -5,6 +5,11 @@ import os
 from flask import Blueprint, request, jsonify, current_app
 from sqlalchemy.orm.attributes import flag_modified
 from components.dbmodel import db, User, Character, Match
+from components.imagestore import store_image
+from components.matchmaking import MATCH_POOL
+from components.querystats import QUERY_STATS
+from components.rostercache import ROSTER_CACHE
+from components.thumbnails import THUMBNAILS
 
 ##################################
 #         DEBUG HANDLERS         #
@@ -53,7 +58,11 @@ def debug_update_character(char_id):
         if 'titles' in data:
             char.titles = data['titles']
             flag_modified(char, "titles")
+        char.update_rank()
+        MATCH_POOL.changed()
         db.session.commit()
+        MATCH_POOL.update(char)
+        ROSTER_CACHE.bump("character edited")
         print(f"!-- DEBUG: UPDATED CHARACTER {char.name} --!")
         return jsonify({"status": "success", "message": f"Updated {char.name}"})
     except Exception as e:
@@ -72,7 +81,8 @@ def debug_get_users():
         "creation_time": u.creation_time,
         "last_submission": u.last_submission,
         "last_login_bonus": u.last_login_bonus,
-        "portrait": u.portrait
+        "portrait": u.portrait,
+        "portrait_hash": u.portrait_hash
     } for u in users])
 
 #grabs all the info on a user based on their ID
@@ -87,8 +97,14 @@ def debug_update_user(user_id):
         if 'money' in data: user.money = int(data['money'])
         if 'creation_time' in data: user.creation_time = float(data['creation_time'])
         if 'last_submission' in data: user.last_submission = float(data['last_submission'])
-        if 'portrait' in data: user.portrait = data['portrait']
+        if 'portrait' in data and data['portrait']:
+            portrait_hash = store_image(data['portrait'])
+            if not portrait_hash: return jsonify({"error": "Portrait could not be read."}), 400
+            user.portrait = None
+            user.portrait_hash = portrait_hash
         db.session.commit()
+        ROSTER_CACHE.bump("user edited") #creator and manager names show on the roster
+        THUMBNAILS.request(user.portrait_hash)
         print(f"!-- DEBUG: UPDATED USER {user.username} --!")
         return jsonify({"status": "success", "message": f"Updated {user.username}"})
     except Exception as e:
@@ -127,6 +143,32 @@ def debug_update_match(match_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+#query accounting: the routes, socket events and loop ticks running the most queries (or spending the most DB time),
+#and the latest slow statements with where they were run from. ?sort=queries|db_time|calls&limit=20
+@debug_bp.route('/queries', methods=['GET'])
+def debug_get_queries():
+    if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        "since": QUERY_STATS.since,
+        "slow_query_ms": QUERY_STATS.slow_seconds * 1000,
+        "top": QUERY_STATS.top(request.args.get('sort', 'queries'), limit),
+        "slow": QUERY_STATS.slow_statements(request.args.get('slow_limit', 50, type=int))
+    })
+
+#starts the query accounting over, ex. before trying out a fix
+@debug_bp.route('/queries/reset', methods=['POST'])
+def debug_reset_queries():
+    if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
+    QUERY_STATS.reset()
+    return jsonify({"status": "success"})
+
+#hit/miss counters and size of the roster page cache
+@debug_bp.route('/roster_cache', methods=['GET'])
+def debug_roster_cache():
+    if not is_admin_authorized(): return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(ROSTER_CACHE.stats())
+
 #deletes a row from a table, given the table and identifier
 @debug_bp.route('/<table_type>/<item_id>', methods=['DELETE'])
 def debug_delete_item(table_type, item_id):
@@ -138,7 +180,10 @@ def debug_delete_item(table_type, item_id):
         else: return jsonify({"error": "Invalid table type"}), 400
         if not item: return jsonify({"error": "Item not found"}), 404
         db.session.delete(item)
+        if table_type == 'character': MATCH_POOL.changed()
         db.session.commit()
+        if table_type == 'character': MATCH_POOL.remove(item_id)
+        if table_type in ('character', 'user'): ROSTER_CACHE.bump(f"{table_type} deleted")
         print(f"!-- DEBUG: DELETED {table_type.upper()} {item_id} --!")
         return jsonify({"status": "success", "message": f"Deleted {table_type} {item_id}"})
     except Exception as e:
@@ -1,9 +1,12 @@
 #jfr, cwf, tjc
 
-import json, random, base64, os, gzip, io
+import json, random, base64, os, gzip, time, hashlib, threading
+from collections                                             import OrderedDict
 from google                                                  import genai
 from google.genai                                            import types
 from tenacity import Retrying, RetryError, stop_after_attempt, wait_fixed
+from components.simulator                                    import simulate_match
+from components.metrics                                      import GEMINI_SECONDS, GEMINI_RETRIES
 
 ##################################
 #           GEMINI API           #
@@ -11,6 +14,8 @@ from tenacity import Retrying, RetryError, stop_after_attempt, wait_fixed
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  #current directory
 DATA_DIR = os.path.join(BASE_DIR, 'assets/Data')                                         #file ref where data is stored
 OUTPUT_FILE = os.path.join(DATA_DIR, 'last_gen.json')                                    #last generated response for debugging.
+IMAGE_CACHE_BYTES = int(os.getenv('IMAGE_CACHE_BYTES', 64 * 1024 * 1024))                #how many bytes of decoded drawings to keep around
+BATTLE_ENGINE = os.getenv('BATTLE_ENGINE', 'gemini').lower()                             #"gemini", or "local" to always use the simulator
 
 APPROVAL_SYSTEM_PROMPT="""
 You are a Content Safety Moderator for a "Doodle Brawl" game. 
@@ -139,10 +144,72 @@ def get_image_part_from_base64(base64_string):
     except Exception as e:
         print(f"!-- ERROR DECODING IMAGE: {e} --!")
         return None
-        
+
+#LRU cache of decoded image parts. Established fighters show up match after match, so their drawing is only decoded once.
+#entries are keyed by (character id, image hash), so a redrawn fighter never gets their old image back.
+#the cache is bounded by the total size of the decoded images, the least recently used ones are dropped first.
+class ImagePartCache:
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.parts = OrderedDict()  #{(char_id, image_hash): (part, size)}, least recently used first
+        self.keys = {}              #{char_id: key}, the one image we have for each character
+        self.size = 0               #bytes of image data currently cached
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    #returns the Gemini part for a character's drawing. load builds the part, and is only called if it isn't cached.
+    def get_part(self, char_id, image_hash, load):
+        key = (char_id, image_hash)
+        with self.lock:
+            entry = self.parts.get(key)
+            if entry:
+                self.parts.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        #decode outside the lock, so a slow image doesn't hold up the other worker
+        part = load()
+        if part is None: return None
+        size = len(part.inline_data.data)
+        with self.lock:
+            self._drop(self.keys.get(char_id)) #the character's image changed
+            if size <= self.max_bytes:
+                self.parts[key] = (part, size)
+                self.keys[char_id] = key
+                self.size += size
+                while self.size > self.max_bytes:
+                    self._drop(next(iter(self.parts)))
+                    self.evictions += 1
+        return part
+
+    def _drop(self, key):
+        entry = self.parts.pop(key, None)
+        if not entry: return
+        self.size -= entry[1]
+        if self.keys.get(key[0]) == key:
+            del self.keys[key[0]]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.parts),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
 class Genclient():
     def __init__(self, api_key):
         self.client = genai.Client(api_key=api_key)
+        self.image_cache = ImagePartCache()     #decoded drawings, see ImagePartCache
+        self.battle_engine = BATTLE_ENGINE      #see components/simulator.py
         self.battle_generation_config = types.GenerateContentConfig(
             temperature=1,                         #boilerplate
             top_p=0.95,                            #boilerplate(?)
@@ -160,19 +227,39 @@ class Genclient():
             system_instruction=APPROVAL_SYSTEM_PROMPT
         )
 
+    #the drawing of a character snapshot (see imagestore.character_snapshot) as a Gemini part, from the image cache.
+    #snapshots carry the raw bytes from the image store. Legacy base64 strings are still decoded for rows that haven't been converted.
+    def get_image_part(self, char_obj):
+        image_bytes = getattr(char_obj, 'image_bytes', None)
+        image_hash = getattr(char_obj, 'image_hash', None)
+        if image_bytes:
+            load = lambda: types.Part.from_bytes(data=image_bytes, mime_type=char_obj.image_mime or "image/webp")
+        elif char_obj.image_file:
+            load = lambda: get_image_part_from_base64(char_obj.image_file)
+            if not image_hash: image_hash = hashlib.sha256(char_obj.image_file.encode()).hexdigest()
+        else:
+            return None
+        return self.image_cache.get_part(char_obj.id, image_hash, load)
+
+    #latency and retries of a Gemini call, for /metrics. outcome is "ok", "error" or "fallback" (the simulator took over)
+    def record_call(self, call, started, attempt_number, outcome):
+        GEMINI_SECONDS.observe(time.perf_counter() - started, call=call, outcome=outcome)
+        if attempt_number > 1: GEMINI_RETRIES.inc(attempt_number - 1, call=call)
+
     #submit a queue of character images for approval.
     def submit_for_approval(self, queue):
         if not queue:
             print("!-- QUEUE EMPTY, NOTHING FOR APPROVAL PROCESS --!")
             return {}
         print(f"!-- SUBMITTING {len(queue)} IMAGES FOR APPROVAL --!")
+        started, attempt_number = time.perf_counter(), 0
         #create request content, interleaving ID and image (base64)
         request_content = ["Analyze these images based on the ID provided above them:"]
         for char_id, char_obj in queue.items():
             #add ID
             request_content.append(f"ID: {char_id}")
             #add image
-            img_part = get_image_part_from_base64(char_obj.image_file)
+            img_part = self.get_image_part(char_obj)
             if img_part:
                 request_content.append(img_part)
             else:
@@ -180,25 +267,31 @@ class Genclient():
         try:
             for attempt in Retrying(stop=stop_after_attempt(5), wait=wait_fixed(5)):
                 with attempt:
+                    attempt_number = attempt.retry_state.attempt_number
                     response = self.client.models.generate_content(
                         model='gemini-2.0-flash',
                         contents=request_content,
                         config=self.approval_generation_config
                     )
                     result = json.loads(response.text)
+            self.record_call("submit_for_approval", started, attempt_number, "ok")
             return result.get('results', {})
         except RetryError:
             print("!-- ERROR DURING APPROVAL PROCESS - RETRYING --!")
-            pass
+            self.record_call("submit_for_approval", started, attempt_number, "error")
         except Exception as e:
             print(f"!-- ERROR DURING APPROVAL PROCESS: {e} --!")
+            self.record_call("submit_for_approval", started, attempt_number, "error")
             return {}
 
     #run the match by setting up the api submission content
+    #if Gemini can't be reached the fight is played out by the local simulator instead, so the match still happens.
     def run_match(self, matchup):
         p1, p2 = matchup
         favorability = random.randint(1,100) #add some randomness to outcome
         temperature = random.randint(1,100)  #add some randomness to outcome
+        if self.battle_engine == "local":
+            return self.simulate_match(matchup, favorability)
         print(f"!-- RUNNING BATTLE: {p1.name} vs {p2.name} WITH FAVORABILITY, TEMPERATURE: {favorability}, {temperature} --!")
         #battle information to be sent to gemini API
         request_content = [
@@ -216,7 +309,7 @@ class Genclient():
             Alignment: {p1.alignment}
             Titles Held: {p1.titles}
             """,
-            get_image_part_from_base64(p1.image_file), #fighter 1 drawing
+            self.get_image_part(p1), #fighter 1 drawing
             
             f"""
             FIGHTER 2:
@@ -230,11 +323,13 @@ class Genclient():
             Alignment: {p2.alignment}
             Titles Held: {p2.titles}
             """,
-            get_image_part_from_base64(p2.image_file)  #fighter 2 drawing
+            self.get_image_part(p2)  #fighter 2 drawing
         ]
+        started, attempt_number = time.perf_counter(), 0
         try:
             for attempt in Retrying(stop=stop_after_attempt(5), wait=wait_fixed(5)):
                 with attempt:
+                    attempt_number = attempt.retry_state.attempt_number
                     response = self.client.models.generate_content(
                         model='gemini-2.0-flash', #NOTE - This model should suffice
                         contents=request_content,
@@ -243,10 +338,18 @@ class Genclient():
                     result = json.loads(response.text)
                     with open(OUTPUT_FILE, 'w') as file:
                         json.dump(result, file, indent=2)
+                    self.record_call("run_match", started, attempt_number, "ok")
                     return result
         except RetryError:
-            print("!-- ERROR DURING GENERATION PROCESS - RETRYING --!")
-            pass
+            print("!-- ERROR DURING GENERATION PROCESS, FALLING BACK TO THE SIMULATOR --!")
         except Exception as e:
-            print(f"!-- ERROR OCCURRED: {e} --!")
-            pass
+            print(f"!-- ERROR OCCURRED: {e}, FALLING BACK TO THE SIMULATOR --!")
+        self.record_call("run_match", started, attempt_number, "fallback")
+        return self.simulate_match(matchup, favorability)
+
+    #plays the fight out locally. The seed is kept in the result, so the fight can be replayed.
+    def simulate_match(self, matchup, favorability):
+        p1, p2 = matchup
+        seed = random.getrandbits(32)
+        print(f"!-- SIMULATING BATTLE: {p1.name} vs {p2.name} WITH FAVORABILITY {favorability}, SEED {seed} --!")
+        return simulate_match(p1, p2, seed=seed, favorability=favorability)
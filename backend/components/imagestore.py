@@ -0,0 +1,105 @@
+#jfr, cwf, tjc
+#content-addressed image store.
+#drawings and portraits are decoded once when they arrive, stored by the sha256 of their bytes,
+#and then served from /api/image/<hash> so browsers can cache them instead of getting base64 in every payload.
+#the blobs are raw image bytes. The old Base64 -> Gzip -> Base64(WebP) strings are only ever decoded on the way in.
+import base64, gzip, hashlib
+from types import SimpleNamespace
+from sqlalchemy import select, update
+from components.dbmodel import db, ImageBlob, Character, User
+
+#sniff the content type from the first few bytes of an image
+def guess_mime(image_bytes):
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP": return "image/webp"
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n": return "image/png"
+    if image_bytes[:3] == b"\xff\xd8\xff": return "image/jpeg"
+    if image_bytes[:4] == b"GIF8": return "image/gif"
+    return "application/octet-stream"
+
+#turns an image string from the frontend into raw bytes.
+#the frontend sends Base64 -> Gzip -> Base64(WebP), but plain base64 images are accepted as well.
+def decode_image(encoded):
+    if not encoded: return None
+    if "base64," in encoded: encoded = encoded.split("base64,")[1]
+    try:
+        outer_bytes = base64.b64decode(encoded)
+        try:
+            inner_base64 = gzip.decompress(outer_bytes)
+        except gzip.BadGzipFile:
+            #wasn't gzipped, treat as raw image bytes
+            return outer_bytes
+        return base64.b64decode(inner_base64)
+    except Exception as e:
+        print(f"!-- ERROR DECODING IMAGE: {e} --!")
+        return None
+
+#stores raw image bytes and returns their hash. storing the same image twice is a no-op.
+def store_bytes(image_bytes):
+    if not image_bytes: return None
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    if not image_exists(image_hash):
+        db.session.add(ImageBlob(
+            hash=image_hash,
+            mime=guess_mime(image_bytes),
+            data=image_bytes,
+            size=len(image_bytes)
+        ))
+    return image_hash
+
+#decodes and stores an image string from the frontend, returns the hash (or None if it couldn't be decoded)
+#NOTE - this only adds to the session, the caller is responsible for committing.
+def store_image(encoded):
+    return store_bytes(decode_image(encoded))
+
+def get_image(image_hash):
+    return db.session.get(ImageBlob, image_hash)
+
+#checks for an image without loading its bytes
+def image_exists(image_hash):
+    return db.session.query(ImageBlob.hash).filter_by(hash=image_hash).first() is not None
+
+#a plain copy of a character with the raw bytes of their drawing attached.
+#this is what gets handed to the genclient, since its worker threads can't use the DB session.
+def character_snapshot(char):
+    blob = get_image(char.image_hash) if char.image_hash else None
+    return SimpleNamespace(
+        **char.to_dict_debug(),
+        image_bytes=blob.data if blob else None,
+        image_mime=blob.mime if blob else None
+    )
+
+IMAGE_MIGRATION_CHUNK = 200 #rows converted per commit
+
+#moves every legacy base64 image out of the character and user tables and into the image store as raw bytes.
+#each table is walked in id order a chunk at a time, with a commit after every chunk, so the whole table is never in memory.
+#converted rows have their string cleared, so a run that gets interrupted just picks up where it left off.
+def convert_legacy_images(chunk_size=IMAGE_MIGRATION_CHUNK):
+    count = convert_legacy_column(Character.__table__, 'image_file', 'image_hash', "", chunk_size)
+    count += convert_legacy_column(User.__table__, 'portrait', 'portrait_hash', None, chunk_size)
+    if count:
+        print(f"!-- MOVED {count} IMAGES INTO THE IMAGE STORE --!")
+    return count
+
+#converts one table. cleared is what the legacy column is set to once its image is in the store.
+def convert_legacy_column(table, legacy_column, hash_column, cleared, chunk_size):
+    legacy, hashes = table.c[legacy_column], table.c[hash_column]
+    last_id, count = "", 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, legacy, hashes)
+            .where(table.c.id > last_id, legacy != None, legacy != "")
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows: break
+        for row_id, encoded, image_hash in rows:
+            if not image_hash or not image_exists(image_hash):
+                image_hash = store_image(encoded)
+            if not image_hash:
+                print(f"!-- COULD NOT CONVERT IMAGE FOR {row_id}, LEAVING IT AS IS --!")
+                continue
+            db.session.execute(update(table).where(table.c.id == row_id).values({hash_column: image_hash, legacy_column: cleared}))
+            count += 1
+        db.session.commit()
+        last_id = rows[-1][0]
+    return count
@@ -0,0 +1,132 @@
+#jfr, cwf, tjc
+#in-memory matchmaking index.
+#eligible fighters are split into a "fresh meat" pool (no fights yet) and an established pool.
+#each pool is an array with a position map, so adding, removing and random picks are all O(1)
+#no matter how big the roster gets.
+#with ARENA_STATE=sql other workers approve and edit fighters too. Whoever changes the fighters writes a new
+#"pool version" to the ArenaValue table, and the leader only rebuilds when it finds a version it didn't write.
+import os, json, time, uuid, random, threading
+from sqlalchemy import update, type_coerce, String
+from components.dbmodel import db, Character, ArenaValue
+
+INACTIVE_STATUSES = ("retired", "injured") #fighters with these statuses are kept out of matchmaking
+VERSION_KEY = "pool_version"
+
+#an array of ids that removes by swapping the last element into the hole
+class SwapPool:
+    def __init__(self):
+        self.items = []
+        self.positions = {}  #{id: index in items}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def add(self, item_id):
+        if item_id in self.positions: return
+        self.positions[item_id] = len(self.items)
+        self.items.append(item_id)
+
+    def remove(self, item_id):
+        index = self.positions.pop(item_id, None)
+        if index is None: return
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.positions[last] = index
+
+    def sample(self, count):
+        return [self.items[i] for i in random.sample(range(len(self.items)), count)]
+
+class MatchmakingPool:
+    #shared is True when other workers change fighters too, see components/arenastate.py
+    def __init__(self, shared=False):
+        self.shared = shared
+        self.fresh = SwapPool()        #approved fighters with 0 total fights
+        self.established = SwapPool()  #everyone else who can fight
+        self.version = None            #the shared pool version this copy is up to date with
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.fresh) + len(self.established)
+
+    #reloads both pools from the DB. Only ids and fight counts are read.
+    def rebuild(self):
+        version = self.shared_version() #read first, so a change made during the rebuild still shows up next sync
+        rows = db.session.query(Character.id, Character.wins, Character.losses, Character.status).filter(
+            Character.is_approved == True
+        ).all()
+        with self.lock:
+            self.fresh = SwapPool()
+            self.established = SwapPool()
+            for row in rows:
+                self._place(row.id, row.wins, row.losses, row.status)
+            self.version = version
+        print(f"!-- MATCHMAKING POOL BUILT: {len(self.fresh)} NEW, {len(self.established)} ESTABLISHED --!")
+
+    #rebuilds if another worker changed the fighters since this copy was built, otherwise it's one row read
+    def sync(self):
+        if self.shared and self.shared_version() != self.version:
+            self.rebuild()
+
+    def shared_version(self):
+        if not self.shared: return None
+        return db.session.query(ArenaValue.value).filter_by(key=VERSION_KEY).scalar()
+
+    #tells the other workers this one changed the fighters. Call next to update() or remove(), the caller commits.
+    #if nobody else changed them since our last look, this copy is still current and stays in sync with the new version.
+    def changed(self):
+        if not self.shared: return
+        version = uuid.uuid4().hex
+        values = ArenaValue.__table__
+        #value is a JSON column, so it's compared as the JSON text it's stored as
+        current = db.session.execute(
+            update(values).where(values.c.key == VERSION_KEY, type_coerce(values.c.value, String) == json.dumps(self.version))
+            .values(value=version, updated_time=time.time())
+        ).rowcount
+        if not current:
+            #no row yet is only up to date if this copy has never seen one either
+            current = self.version is None and self.shared_version() is None
+            db.session.merge(ArenaValue(key=VERSION_KEY, value=version, updated_time=time.time()))
+        self.version = version if current else None
+
+    def _place(self, char_id, wins, losses, status):
+        self.fresh.remove(char_id)
+        self.established.remove(char_id)
+        if status in INACTIVE_STATUSES:
+            return
+        if (wins or 0) + (losses or 0) == 0:
+            self.fresh.add(char_id)
+        else:
+            self.established.add(char_id)
+
+    #puts a character in the right pool (or takes them out). Call after approval, fights, and edits.
+    def update(self, char):
+        with self.lock:
+            if not char.is_approved:
+                self.fresh.remove(char.id)
+                self.established.remove(char.id)
+            else:
+                self._place(char.id, char.wins, char.losses, char.status)
+
+    def remove(self, char_id):
+        with self.lock:
+            self.fresh.remove(char_id)
+            self.established.remove(char_id)
+
+    #picks the ids for the next match, prioritizing new fighters. Returns None if there aren't two fighters.
+    def pick_pair(self):
+        with self.lock:
+            if len(self.fresh) >= 2:
+                print(f"!-- PRIORITY MATCH: FOUND {len(self.fresh)} NEW FIGHTERS --!")
+                return self.fresh.sample(2)
+            if len(self.fresh) == 1 and len(self.established) >= 1:
+                print("!-- PRIORITY MATCH: 1 NEW FIGHTER FOUND --!")
+                return self.fresh.items[:1] + self.established.sample(1)
+            if len(self.established) >= 2:
+                return self.established.sample(2)
+            return None
+
+MATCH_POOL = MatchmakingPool(shared=os.getenv('ARENA_STATE', 'memory').lower() == "sql")
@@ -0,0 +1,208 @@
+#jfr, cwf, tjc
+#operational metrics, served in the Prometheus text format on /metrics.
+#counters and histograms are kept in memory by this module (no client library needed). Recording one is a bisect and a few
+#additions under a lock, and DB time is two perf_counter calls per query, so all of this stays on in production.
+#NOTE - every metric is defined at the bottom of this file, so the full list is in one place.
+import time, bisect, threading
+from functools import wraps
+from contextlib import contextmanager
+from flask import request
+from sqlalchemy import event
+from components.querystats import QUERY_STATS
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+REGISTRY = []
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_number(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.series = {}  #{label values: value}
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            series = {key: self.copy_value(value) for key, value in self.series.items()}
+        for key, value in sorted(series.items()):
+            lines.extend(self.render_series(key, value))
+        return lines
+
+    def copy_value(self, value):
+        return value
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render_series(self, key, value):
+        return [f"{self.name}{format_labels(self.label_names, key)} {format_number(value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+        key = self.key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    #times the block in seconds
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def copy_value(self, value):
+        return [list(value[0]), value[1]]
+
+    def render_series(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            bound_label = 'le="' + format_number(bound) + '"'
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, bound_label)} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {total!r}")
+        lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+##################################
+#         OPERATION TIMING       #
+##################################
+
+#DB time and query counts are added up per thread while an operation (a request, a socket event, a loop tick) runs.
+#flask-socketio runs every request and event on its own thread, so nothing is shared between operations.
+#the totals also go to QUERY_STATS, see components/querystats.py
+_operation = threading.local()
+
+def install_db_timing(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        active = getattr(_operation, 'active', False)
+        if active:
+            _operation.db_seconds += elapsed
+            _operation.queries += 1
+        QUERY_STATS.note_query(statement, elapsed, f"{_operation.kind} {_operation.name}" if active else None)
+
+def start_operation(kind, name):
+    _operation.active = True
+    _operation.kind = kind
+    _operation.name = name
+    _operation.queries = 0
+    _operation.db_seconds = 0.0
+    _operation.started = time.perf_counter()
+
+#(queries, DB seconds) of the operation running on this thread so far
+def operation_queries():
+    if not getattr(_operation, 'active', False): return 0, 0.0
+    return _operation.queries, _operation.db_seconds
+
+#records the operation's total time, DB time and query count
+def finish_operation():
+    if not getattr(_operation, 'active', False): return
+    _operation.active = False
+    kind, name = _operation.kind, _operation.name
+    OPERATION_SECONDS.observe(time.perf_counter() - _operation.started, kind=kind, name=name)
+    DB_SECONDS.observe(_operation.db_seconds, kind=kind, name=name)
+    DB_QUERIES.observe(_operation.queries, kind=kind, name=name)
+    QUERY_STATS.note_operation(kind, name, _operation.queries, _operation.db_seconds)
+
+#kind is "http", "socket" or "loop"
+@contextmanager
+def track_operation(kind, name):
+    start_operation(kind, name)
+    try:
+        yield
+    finally:
+        finish_operation()
+
+#times every HTTP request by its route (the rule, not the URL, so ids don't blow up the label count).
+#in debug mode responses also carry their query count and DB time, in X-Query-Count and X-Query-Time-Ms.
+def init_app(app):
+    @app.before_request
+    def start_request_timer():
+        start_operation("http", request.url_rule.rule if request.url_rule else "unmatched")
+
+    @app.after_request
+    def add_query_headers(response):
+        if app.debug:
+            queries, db_seconds = operation_queries()
+            response.headers['X-Query-Count'] = str(queries)
+            response.headers['X-Query-Time-Ms'] = f"{db_seconds * 1000:.2f}"
+        return response
+
+    @app.teardown_request
+    def stop_request_timer(exc):
+        finish_operation()
+
+#decorator for socket event handlers, goes under @socketio.on
+def socket_event(name):
+    def decorator(handler):
+        @wraps(handler)
+        def timed_handler(*args, **kwargs):
+            with track_operation("socket", name):
+                return handler(*args, **kwargs)
+        return timed_handler
+    return decorator
+
+##################################
+#            METRICS             #
+##################################
+
+OPERATION_SECONDS = Histogram("doodlebrawl_operation_seconds", "Time spent handling HTTP routes, socket events and arena loop ticks.", ["kind", "name"])
+DB_SECONDS = Histogram("doodlebrawl_db_seconds", "Time spent in database queries per HTTP route, socket event and arena loop tick.", ["kind", "name"])
+DB_QUERIES = Histogram("doodlebrawl_db_queries", "SQL statements run per HTTP route, socket event and arena loop tick.", ["kind", "name"],
+                       buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+GEMINI_SECONDS = Histogram("doodlebrawl_gemini_seconds", "Latency of genclient calls, including retries.", ["call", "outcome"])
+MODERATION_BATCH_SECONDS = Histogram("doodlebrawl_moderation_batch_seconds", "Time from submitting a moderation batch to collecting its result.", ["outcome"])
+GEMINI_RETRIES = Counter("doodlebrawl_gemini_retries_total", "Gemini requests that failed and were retried.", ["call"])
+EMIT_SECONDS = Histogram("doodlebrawl_emit_seconds", "Time to fan a socket broadcast out to its clients.", ["event"])
+MATCH_CYCLE_SECONDS = Histogram("doodlebrawl_match_cycle_seconds", "Time spent in each stage of the match cycle.", ["stage"])
+LOOP_DRIFT_SECONDS = Histogram("doodlebrawl_loop_drift_seconds", "How late each arena loop tick started, against the intended 1s cadence.",
+                               buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
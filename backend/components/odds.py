@@ -0,0 +1,126 @@
+#jfr, cwf, tjc
+#fighter ratings and betting odds.
+#every fighter has an Elo rating that moves after each match, so beating a strong opponent counts for more than beating a rookie.
+#odds are priced from the ratings and a Monte Carlo of the two fighters' stats, run as numpy arrays so thousands of bouts take about 10ms.
+import numpy as np
+from components.simulator import read_stat, MAX_TURNS, COMBO_DODGE_AGILITY, POWER_MOVE_POWER, ACROBATIC_AGILITY
+
+BASE_RATING = 1500.0
+ELO_K_NEW = 40           #how far a rating moves per match while a fighter has fewer than ELO_PROVISIONAL fights
+ELO_K = 24               #and after that
+ELO_PROVISIONAL = 10
+ODDS_SAMPLES = 4096      #simulated bouts per pricing
+STATS_WEIGHT = 0.5       #how much the stat simulation counts against the ratings, when both fighters have stats
+MIN_ODDS = 1.1           #no fighter pays out less than this
+
+#########################
+#        RATINGS        #
+#########################
+
+#chance that a fighter rated rating_a beats one rated rating_b
+def expected_score(rating_a, rating_b):
+    return 1.0 / (1.0 + 10 ** ((rating_b - rating_a) / 400.0))
+
+def k_factor(char):
+    return ELO_K_NEW if (char.wins or 0) + (char.losses or 0) < ELO_PROVISIONAL else ELO_K
+
+#moves both ratings after a match. Call before the win/loss counts are bumped. The caller commits.
+def update_ratings(winner, loser):
+    winner_rating = winner.rating if winner.rating is not None else BASE_RATING
+    loser_rating = loser.rating if loser.rating is not None else BASE_RATING
+    expected = expected_score(winner_rating, loser_rating)
+    winner.rating = winner_rating + k_factor(winner) * (1 - expected)
+    loser.rating = loser_rating - k_factor(loser) * (1 - expected)
+
+#########################
+#         ODDS          #
+#########################
+
+#(hp, agility, power) from a fighter's stats JSON, or None if they haven't been generated yet
+def combat_stats(char):
+    stats = char.stats or {}
+    if not stats: return None
+    return read_stat(stats, "hp", 100), read_stat(stats, "agility", 50), read_stat(stats, "power", 50)
+
+#one side of every simulated bout, as arrays over the bouts. Precomputes what each move hits for.
+class Side:
+    def __init__(self, stats, samples):
+        hp, agility, power = (np.array(column, dtype=np.float32) for column in zip(*stats))
+        self.max_hp = np.repeat(hp, samples)
+        self.hp = self.max_hp.copy()
+        agility, power = np.repeat(agility, samples), np.repeat(power, samples)
+        self.can_combo = agility > COMBO_DODGE_AGILITY #combos and dodges
+        self.can_power = power > POWER_MOVE_POWER
+        self.can_acrobatic = agility > ACROBATIC_AGILITY
+        self.moves = 2 + self.can_power.astype(np.float32) + self.can_acrobatic #ATTACK, ATTACK, then POWER and ACROBATIC
+        self.attack = 4 + power / 10
+        self.power_move = self.attack * 1.8
+        self.acrobatic = self.attack * 1.2 + agility / 20
+
+    #drops the bouts that are over
+    def keep(self, bouts):
+        for name, value in vars(self).items():
+            setattr(self, name, value[bouts])
+
+#chance fighter 1 wins on stats alone, from ODDS_SAMPLES bouts played with the simulator's rules (combos, dodges,
+#every move including RECOVER and ULTIMATE, and the turn cap going to whoever has more of their hp left).
+#the bouts are played side by side as numpy arrays, a turn at a time. Half of them are opened by each fighter,
+#since nobody is guaranteed the first swing under Gemini, so the same two stat lines always price at 50/50.
+def stat_win_probability(stats1, stats2, samples=ODDS_SAMPLES, rng=None):
+    rng = rng or np.random.default_rng()
+    half = samples // 2
+    opener, other = Side((stats1, stats2), half), Side((stats2, stats1), half) #fighter 1 opens the first half
+    bouts = np.arange(half * 2)              #which bout each array slot belongs to, finished bouts are dropped
+    opener_won = np.zeros(half * 2, dtype=bool)
+    for turn in range(MAX_TURNS):
+        if not len(bouts): break
+        actor, target = (opener, other) if turn % 2 == 0 else (other, opener)
+        knocked_out = play_moves(rng, actor, target, np.ones(len(bouts), dtype=bool))
+        if actor.can_combo.any():
+            combo = ~knocked_out & actor.can_combo & (rng.random(len(bouts), dtype=np.float32) < 0.2)
+            knocked_out |= play_moves(rng, actor, target, combo)
+        if knocked_out.any():
+            opener_won[bouts[knocked_out]] = actor is opener
+            opener.keep(~knocked_out)
+            other.keep(~knocked_out)
+            bouts = bouts[~knocked_out]
+    #bouts that hit the turn cap go to whoever has more of their hp left, the opener on a tie like the simulator
+    opener_won[bouts] = opener.hp / opener.max_hp >= other.hp / other.max_hp
+    fighter1_won = np.concatenate((opener_won[:half], ~opener_won[half:]))
+    return float(fighter1_won.mean())
+
+#one move for every bout in moving, same odds and damage as simulator.play_move with no favorability edge.
+#updates both sides' hp and returns which bouts the target was knocked out in.
+def play_moves(rng, actor, target, moving):
+    rolls = rng.random((6, len(moving)), dtype=np.float32)
+    ultimate = (target.hp <= target.max_hp * 0.25) & (rolls[0] < 0.15)
+    recover = ~ultimate & (actor.hp <= actor.max_hp * 0.3) & (rolls[1] < 0.25)
+    pick = np.floor(rolls[2] * actor.moves)
+    damage = np.where(actor.can_power & (pick == 2), actor.power_move, actor.attack)
+    damage = np.where(actor.can_acrobatic & (pick == actor.moves - 1), actor.acrobatic, damage)
+    damage = np.where(ultimate, damage * 3, damage)
+    damage = np.maximum(1, np.floor(damage * (0.8 + 0.4 * rolls[3])))
+    healed = np.maximum(1, np.floor(actor.max_hp * (0.08 + 0.07 * rolls[4])))
+    healing = moving & recover
+    hitting = moving & ~recover & ~(target.can_combo & (rolls[5] < 0.2)) #dodged
+    actor.hp = np.where(healing, np.minimum(actor.max_hp, actor.hp + healed), actor.hp)
+    target.hp = np.where(hitting, np.maximum(0, target.hp - damage), target.hp)
+    return hitting & (target.hp <= 0)
+
+#chance p1 beats p2, from their ratings and (when both have them) their stats
+def win_probability(p1, p2, samples=ODDS_SAMPLES, rng=None):
+    rating1 = p1.rating if p1.rating is not None else BASE_RATING
+    rating2 = p2.rating if p2.rating is not None else BASE_RATING
+    probability = expected_score(rating1, rating2)
+    stats1, stats2 = combat_stats(p1), combat_stats(p2)
+    if stats1 and stats2:
+        probability = (1 - STATS_WEIGHT) * probability + STATS_WEIGHT * stat_win_probability(stats1, stats2, samples, rng)
+    return min(0.98, max(0.02, probability))
+
+#decimal odds for both fighters, {p1_id: odds, p2_id: odds}. Fair odds (1 / chance of winning), never under MIN_ODDS.
+def price_match(p1, p2, samples=ODDS_SAMPLES, rng=None):
+    probability = win_probability(p1, p2, samples, rng)
+    return {
+        p1.id: max(MIN_ODDS, round(1 / probability, 2)),
+        p2.id: max(MIN_ODDS, round(1 / (1 - probability), 2))
+    }
@@ -1,35 +1,235 @@
 #jfr, cwf, tjc
 #to be used for publicly accessible API routes.
 #the fighter roster is a good example.
-import random
-from sqlalchemy import case
-from flask import Blueprint, request, jsonify
-from components.dbmodel import db, User, Character
+from sqlalchemy import or_, and_, func, case
+from sqlalchemy.orm import aliased
+from flask import Blueprint, request, jsonify, make_response, redirect
+from components.dbmodel import db, Character, Match, MatchParticipant, ROSTER_ORDER, THUMB_SIZES, image_url, serialize_characters_display
+from components.imagestore import get_image, image_exists
+from components.rostercache import ROSTER_CACHE
+from components.crowd import CROWD
+from components.thumbnails import THUMBNAILS
 
 public_bp = Blueprint('public', __name__)
 
 #grabs roster data using a "display" dictioniary, excluding certain information.
+#fighters are read off the ix_character_rank index. Sending a cursor (from next_cursor) instead of a page
+#uses keyset pagination, so deep pages cost the same as the first one.
+#pages come out of ROSTER_CACHE, so between fights they're served without touching the database.
+#GET /api/roster?cursor= (or ?page=) carries an ETag, so browsers can revalidate and get a 304 back.
+@public_bp.route('/roster', methods=['GET'])
+def return_roster_page():
+    query, error = roster_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    body, etag = roster_page(**query)
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        response = make_response(body)
+        response.mimetype = "application/json"
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  #always revalidate, the roster changes after every fight
+    return response
+
 @public_bp.route('/roster', methods=['POST'])
 def return_top_fighters():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object."}), 400
+    query, error = roster_query(data)
+    if error:
+        return jsonify({"error": error}), 400
+    body, _ = roster_page(**query)
+    response = make_response(body)
+    response.mimetype = "application/json"
+    return response
+
+#reads the cursor or page out of query args or a JSON body.
+#returns (roster_page kwargs, None) or (None, error message). An empty cursor is the first page.
+def roster_query(data):
+    if 'cursor' in data:
+        cursor = data.get('cursor')
+        if not isinstance(cursor, str) or (cursor and decode_roster_cursor(cursor) is None):
+            return None, "Invalid cursor."
+        return {"cursor": cursor}, None
     page = data.get('page', 1)
+    if isinstance(page, str) and page.isdigit():
+        page = int(page)
+    if not isinstance(page, int) or isinstance(page, bool) or page < 1:
+        return None, "Page must be a positive whole number."
+    return {"page": page}, None
+
+#(JSON body, etag) of a roster page, by cursor or by page number
+def roster_page(cursor=None, page=None):
+    if page is not None:
+        return ROSTER_CACHE.get_page(("page", page), lambda: build_roster_page(page=page))
+    return ROSTER_CACHE.get_page(("cursor", cursor or ""), lambda: build_roster_page(cursor=cursor))
+
+#both kinds of page come back as {"fighters": [...], "next_cursor": ...}
+def build_roster_page(cursor=None, page=None):
     per_page = 10
-    wl_ratio = case(
-        (Character.losses == 0, Character.wins * 1.0),
-        else_=(Character.wins * 1.0) / Character.losses
-    )
-    #sorts descending by w/l ratio then by wins
-    pagination = Character.query.filter_by(is_approved=True).order_by(wl_ratio.desc(), Character.wins.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    query = Character.query.filter_by(is_approved=True).order_by(*ROSTER_ORDER)
+
+    if page is None:
+        after = decode_roster_cursor(cursor)
+        if after:
+            score, wins, char_id = after
+            #the leading wl_score <= score is what lets SQLite seek into ix_character_rank, the OR alone can't use a range
+            query = query.filter(Character.wl_score <= score, or_(
+                Character.wl_score < score,
+                and_(Character.wl_score == score, Character.wins < wins),
+                and_(Character.wl_score == score, Character.wins == wins, Character.id > char_id)
+            ))
+        fighters = query.limit(per_page).all()
+    else:
+        fighters = query.paginate(page=page, per_page=per_page, error_out=False).items
+
+    next_cursor = encode_roster_cursor(fighters[-1]) if len(fighters) == per_page else None
+    return {"fighters": serialize_characters_display(fighters), "next_cursor": next_cursor}
+
+#roster cursors are "wl_score:wins:id" of the last fighter on the previous page
+def encode_roster_cursor(char):
+    return f"{char.wl_score!r}:{char.wins}:{char.id}"
+
+def decode_roster_cursor(cursor):
+    try:
+        score, wins, char_id = cursor.split(":", 2)
+        return float(score), int(wins), char_id
+    except (AttributeError, ValueError):
+        return None
+
+#match history pages default to this many matches, and can ask for up to HISTORY_MAX_LIMIT
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_LIMIT = 50
+
+#the global match feed, newest first.
+#read off ix_match_timestamp with keyset pagination, pass next_cursor back as ?cursor= for the next page.
+@public_bp.route('/matches')
+def return_match_feed():
+    limit = history_limit()
+    query = Match.query.order_by(Match.timestamp.desc(), Match.id.desc())
+    after = decode_match_cursor(request.args.get('cursor'))
+    if after:
+        timestamp, match_id = after
+        query = query.filter(or_(
+            Match.timestamp < timestamp,
+            and_(Match.timestamp == timestamp, Match.id < match_id)
+        ))
+    matches = query.limit(limit).all()
+    next_cursor = encode_match_cursor(matches[-1].timestamp, matches[-1].id) if len(matches) == limit else None
+    return jsonify({"matches": [match_history_entry(m) for m in matches], "next_cursor": next_cursor})
+
+#one fighter's match history, newest first. Read off the ix_participant_fighter index.
+#?opponent=<id> narrows it down to their head to head matches against that fighter, with the record between them.
+@public_bp.route('/fighter/<char_id>/matches')
+def return_fighter_matches(char_id):
+    limit = history_limit()
+    query = db.session.query(MatchParticipant.is_winner, Match).join(
+        Match, Match.id == MatchParticipant.match_id
+    ).filter(MatchParticipant.character_id == char_id)
 
-    return jsonify([c.to_dict_display() for c in pagination.items])
+    opponent_id = request.args.get('opponent')
+    if opponent_id:
+        opponent = aliased(MatchParticipant)
+        query = query.join(opponent, and_(opponent.match_id == MatchParticipant.match_id, opponent.character_id == opponent_id))
+
+    #the record only needs the participant rows, so it's counted before the page is cut out
+    record = None
+    if opponent_id:
+        total, wins = query.with_entities(func.count(), func.sum(case((MatchParticipant.is_winner, 1), else_=0))).one()
+        record = {"wins": int(wins or 0), "losses": total - int(wins or 0)}
+
+    after = decode_match_cursor(request.args.get('cursor'))
+    if after:
+        timestamp, match_id = after
+        query = query.filter(or_(
+            MatchParticipant.timestamp < timestamp,
+            and_(MatchParticipant.timestamp == timestamp, MatchParticipant.match_id < match_id)
+        ))
+    rows = query.order_by(MatchParticipant.timestamp.desc(), MatchParticipant.match_id.desc()).limit(limit).all()
+
+    matches = []
+    for is_winner, match in rows:
+        entry = match_history_entry(match)
+        entry["is_winner"] = is_winner
+        matches.append(entry)
+    next_cursor = encode_match_cursor(rows[-1][1].timestamp, rows[-1][1].id) if len(rows) == limit else None
+    response = {"matches": matches, "next_cursor": next_cursor}
+    if record is not None: response["record"] = record
+    return jsonify(response)
+
+#a match for the history endpoints, with the fighters' ids and names from when it was fought
+def match_history_entry(match):
+    entry = match.to_dict_display()
+    entry["teams"] = (match.match_data or {}).get("teams", [])
+    return entry
+
+def history_limit():
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    return max(1, min(limit, HISTORY_MAX_LIMIT))
+
+#match cursors are "timestamp:id" of the last match on the previous page
+def encode_match_cursor(timestamp, match_id):
+    return f"{timestamp!r}:{match_id}"
+
+def decode_match_cursor(cursor):
+    try:
+        timestamp, match_id = cursor.split(":", 1)
+        return float(timestamp), int(match_id)
+    except (AttributeError, ValueError):
+        return None
 
 #grabs a "crowd" made up of random user portraits (unusued for now)
+#the sample is shared and re-drawn every CROWD_TTL seconds, see components/crowd.py
 @public_bp.route('/crowd')
 def return_crowd():
     try:
-        users_with_portraits = User.query.filter(User.portrait != None).all()
-        selected_users = random.sample(users_with_portraits, min(len(users_with_portraits), 12))
-        return jsonify([{"username": u.username, "portrait": u.portrait} for u in selected_users])
+        return jsonify(CROWD.get())
     except Exception as e:
         print(f"!-- ERROR FETCHING CROWD: {e} --!")
-        return jsonify([])
\ No newline at end of file
+        return jsonify([])
+
+#serves an image from the image store.
+#images are addressed by the hash of their content, so they never change and can be cached forever.
+@public_bp.route('/image/<image_hash>')
+def return_image(image_hash):
+    #the hash is the etag. A revalidating browser only needs to know the image exists, not its bytes
+    if image_hash in request.if_none_match:
+        if not image_exists(image_hash):
+            return jsonify({"error": "Image not found"}), 404
+        return image_response(None, image_hash)
+    blob = get_image(image_hash)
+    if not blob:
+        return jsonify({"error": "Image not found"}), 404
+    return image_response(blob, image_hash)
+
+#serves a thumbnail of an image, size is one of THUMB_SIZES.
+#a thumbnail that hasn't been made yet gets queued, and the browser is sent to the original in the meantime.
+@public_bp.route('/image/<image_hash>/<int:size>')
+def return_thumbnail(image_hash, size):
+    if size not in THUMB_SIZES:
+        return jsonify({"error": "Unknown thumbnail size"}), 404
+    etag = f"{image_hash}-{size}"
+    if etag in request.if_none_match and THUMBNAILS.exists(image_hash, size):
+        return image_response(None, etag)
+    blob = THUMBNAILS.get(image_hash, size)
+    if not blob:
+        if not image_exists(image_hash):
+            return jsonify({"error": "Image not found"}), 404
+        THUMBNAILS.request(image_hash)
+        return redirect(image_url(image_hash)) #not cached, so the next visit picks the thumbnail up
+    return image_response(blob, etag)
+
+#an image response cached forever, or a 304 when there's no blob
+def image_response(blob, etag):
+    if blob is None:
+        response = make_response("", 304)
+    else:
+        response = make_response(blob.data)
+        response.mimetype = blob.mime
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,83 @@
+#jfr, cwf, tjc
+#SQL query accounting, for finding N+1s and slow statements.
+#the engine hooks in components/metrics.py count every query and its time per HTTP route, socket event and loop tick,
+#and hand the totals to QUERY_STATS when the operation ends. Statements slower than SLOW_QUERY_MS are kept in a ring buffer
+#with the line of our code that ran them. /api/debug/queries shows both.
+import os, sys, time, threading
+from collections import deque
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))              #statements slower than this go in the slow log
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 200))    #how many slow statements are kept
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKIPPED_FILES = ("metrics.py", "querystats.py")
+
+#the innermost frame of our own code (not sqlalchemy or flask) that led to the current query, as "file:line in function"
+def find_call_site():
+    frame = sys._getframe(1)
+    while frame:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND_DIR) and not filename.endswith(SKIPPED_FILES) and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, BACKEND_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+class QueryStats:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_size=SLOW_QUERY_LOG_SIZE):
+        self.slow_seconds = slow_ms / 1000
+        self.lock = threading.Lock()
+        self.operations = {}                      #{(kind, name): [calls, queries, db seconds, most queries in one call]}
+        self.slow = deque(maxlen=log_size)
+        self.since = time.time()
+
+    #called for every query, only slow ones cost anything
+    def note_query(self, statement, seconds, operation):
+        if seconds < self.slow_seconds: return
+        entry = {
+            "statement": " ".join(statement.split())[:2000],
+            "ms": round(seconds * 1000, 2),
+            "operation": operation,
+            "call_site": find_call_site(),
+            "time": time.time()
+        }
+        with self.lock:
+            self.slow.append(entry)
+
+    def note_operation(self, kind, name, queries, db_seconds):
+        key = (kind, name)
+        with self.lock:
+            totals = self.operations.get(key)
+            if totals is None:
+                totals = self.operations[key] = [0, 0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += queries
+            totals[2] += db_seconds
+            totals[3] = max(totals[3], queries)
+
+    #operations sorted by "queries" (average per call, where N+1s show up), "db_time" (total) or "calls"
+    def top(self, sort="queries", limit=20):
+        with self.lock:
+            rows = [{
+                "kind": kind,
+                "name": name,
+                "calls": calls,
+                "queries": queries,
+                "avg_queries": round(queries / calls, 2),
+                "max_queries": most,
+                "db_ms": round(db_seconds * 1000, 2),
+                "avg_db_ms": round(db_seconds * 1000 / calls, 3)
+            } for (kind, name), (calls, queries, db_seconds, most) in self.operations.items()]
+        sort_key = {"queries": "avg_queries", "db_time": "db_ms", "calls": "calls"}.get(sort, "avg_queries")
+        rows.sort(key=lambda row: row[sort_key], reverse=True)
+        return rows[:limit]
+
+    def slow_statements(self, limit=50):
+        with self.lock:
+            return list(self.slow)[-limit:][::-1] #newest first
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.slow.clear()
+            self.since = time.time()
+
+QUERY_STATS = QueryStats()
@@ -0,0 +1,90 @@
+#jfr, cwf, tjc
+#cache for roster pages.
+#the ranking only changes when a fight finishes, a fighter is approved or an admin edits someone, so every page is built
+#once per "roster version" and then served from memory (already serialized, with an ETag) until the version is bumped.
+#with ARENA_STATE=sql the version lives in the ArenaValue table, so a bump on any worker reaches the others
+#within ROSTER_VERSION_CHECK seconds. Each worker still only reads it that often, never per request.
+import os, json, time, uuid, hashlib, threading
+from collections import OrderedDict
+from components.dbmodel import db, ArenaValue
+
+ROSTER_CACHE_BYTES = int(os.getenv('ROSTER_CACHE_BYTES', 4 * 1024 * 1024))    #how many bytes of serialized pages to keep
+ROSTER_VERSION_CHECK = float(os.getenv('ROSTER_VERSION_CHECK', 2))            #seconds between shared version checks
+VERSION_KEY = "roster_version"
+
+class RosterCache:
+    def __init__(self, max_bytes=ROSTER_CACHE_BYTES, shared=False):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.pages = OrderedDict()  #{page key: (body, etag)}, least recently used first
+        self.size = 0
+        self.version = uuid.uuid4().hex
+        self.checked = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    #picks up a bump from another worker
+    def current_version(self):
+        if self.shared and time.time() - self.checked >= ROSTER_VERSION_CHECK:
+            row = db.session.get(ArenaValue, VERSION_KEY)
+            self.checked = time.time()
+            if row and row.value and row.value != self.version:
+                self._reset(row.value)
+        return self.version
+
+    #returns (JSON body, etag) for a page. build() makes the page's data on a miss.
+    def get_page(self, key, build):
+        version = self.current_version()
+        with self.lock:
+            cached = self.pages.get(key)
+            if cached:
+                self.pages.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        body = json.dumps(build(), separators=(",", ":")).encode()
+        cached = (body, hashlib.sha1(body).hexdigest())
+        with self.lock:
+            #a bump while the page was being built means it may already be out of date
+            if self.version == version and len(body) <= self.max_bytes:
+                self.pages[key] = cached
+                self.size += len(body)
+                while self.size > self.max_bytes:
+                    _, (old_body, _) = self.pages.popitem(last=False)
+                    self.size -= len(old_body)
+                    self.evictions += 1
+        return cached
+
+    def _reset(self, version):
+        with self.lock:
+            self.version = version
+            self.pages.clear()
+            self.size = 0
+
+    #throws every page away. Call after committing anything that changes what the roster shows.
+    #NOTE - in shared mode this commits the session.
+    def bump(self, reason):
+        self._reset(uuid.uuid4().hex)
+        if self.shared:
+            db.session.merge(ArenaValue(key=VERSION_KEY, value=self.version, updated_time=time.time()))
+            db.session.commit()
+            self.checked = time.time()
+        print(f"!-- ROSTER CACHE CLEARED: {reason} --!")
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "pages": len(self.pages),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+ROSTER_CACHE = RosterCache(shared=os.getenv('ARENA_STATE', 'memory').lower() == "sql")
@@ -1,21 +1,56 @@
 #jfr, cwf, tjc
 
-import os, json, time, random
+import os, time, random, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.sql.expression import func
-from components.dbmodel import db, Character, Match
+from components.dbmodel import db, Character, Match, MatchParticipant, ImageBlob, Rejection, awaiting_approval
+from components.matchmaking import MATCH_POOL
+from components.rostercache import ROSTER_CACHE
+from components.thumbnails import THUMBNAILS
+from components.metrics import MODERATION_BATCH_SECONDS
+from components.imagestore import character_snapshot
 
 ##################################
 #          DATA HANDLERS         #
 ##################################
 
-#data paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DATA_DIR = os.path.join(BASE_DIR, 'assets/Data')
-REJECTED_FILE = os.path.join(DATA_DIR, 'rejected.json')
+#approval queue triggers
+APPROVAL_BATCH_SIZE = 3    #submit the queue once this many fighters are waiting
+APPROVAL_MAX_WAIT = 120    #or once the oldest waiting fighter has been there this many seconds
+APPROVAL_RECOUNT = 60      #how often (seconds) the pending counter is checked against the DB
+
+#moderation batches
+MODERATION_BATCH_COUNT = int(os.getenv('MODERATION_BATCH_COUNT', 8))                  #most images sent in one request
+MODERATION_BATCH_BYTES = int(os.getenv('MODERATION_BATCH_BYTES', 4 * 1024 * 1024))    #most image bytes sent in one request
+MODERATION_WORKERS = int(os.getenv('MODERATION_WORKERS', 3))                          #how many requests can run at once
+
+#splits [(id, image size)] into lists of ids, each within both limits. An image over the byte limit goes in a batch by itself.
+def make_batches(rows, max_count, max_bytes):
+    batches, batch, batch_bytes = [], [], 0
+    for char_id, size in rows:
+        size = size or 0
+        if batch and (len(batch) >= max_count or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(char_id)
+        batch_bytes += size
+    if batch: batches.append(batch)
+    return batches
 
 class ServerData:
     def __init__(self, genclient):
         self.genclient = genclient 
+        #pending approval tracking, bumped by submissions so the game loop never has to load the queue to check it
+        self.pending_count = 0     #unapproved characters in the DB
+        self.pending_since = None  #when the oldest of those started waiting (or the last approval pass, if it left some behind)
+        self.leftover_count = 0    #how many were left unapproved by the last pass, so they don't retrigger it every tick
+        self.last_recount = 0
+        self.pending_lock = threading.Lock()
+        #moderation pipeline, see submit_queue_for_approval
+        self.moderation_pool = ThreadPoolExecutor(max_workers=MODERATION_WORKERS, thread_name_prefix="moderation")
+        self.moderation_batches = {}        #{future: (character ids, time submitted)} for batches the workers have
+        self.moderation_backlog = deque()   #lists of character ids waiting for a worker
 
     #########################
     #      FETCH FUNCs      #
@@ -29,45 +64,26 @@ class ServerData:
         return Character.query.filter_by(is_approved=True).all()
     
     def get_queue(self):
-        #returns all unapproved characters
-        return Character.query.filter_by(is_approved=False).all()
-        if os.path.exists(REJECTED_FILE):
-            try:
-                with open(REJECTED_FILE, 'r') as f:
-                    rejected_data = json.load(f)
-                # Ignore them if they are in the rejected ledger
-                queue = [c for c in queue if str(c.id) not in rejected_data]
-            except Exception as e:
-                print(f"!-- ERROR READING REJECTED LIST: {e} --!")
-        return queue
+        #returns all unapproved characters that haven't been rejected
+        return Character.query.filter(awaiting_approval()).all()
 
+    def count_queue(self):
+        #COUNT(*) over the is_approved index and the rejection primary key, no rows or images are loaded
+        return db.session.query(func.count(Character.id)).filter(awaiting_approval()).scalar()
+
+    #picks two fighters for the next match from the matchmaking pool, new fighters first
     def get_candidates_for_match(self):
-        #find fresh meat (fighters with 0 total fights)
-        fresh_meat = Character.query.filter_by(is_approved=True).filter(
-            (Character.wins + Character.losses) == 0
-        ).all()
-
-        if len(fresh_meat) >= 2:
-            print(f"!-- PRIORITY MATCH: FOUND {len(fresh_meat)} NEW FIGHTERS --!")
-            return random.sample(fresh_meat, 2)
-        
-        elif len(fresh_meat) == 1:
-            print("!-- PRIORITY MATCH: 1 NEW FIGHTER FOUND --!")
-            p1 = fresh_meat[0]
-            #select two random characters
-            p2 = Character.query.filter_by(is_approved=True).filter(
-                Character.id != p1.id
-            ).order_by(func.random()).first()
-            
-            if p2:
-                return [p1, p2]
-        
-        #fully random if theres no fresh meat
-        count = Character.query.filter_by(is_approved=True).count()
-        if count < 2:
-            return None
-            
-        return Character.query.filter_by(is_approved=True).order_by(func.random()).limit(2).all()
+        for _ in range(3):
+            ids = MATCH_POOL.pick_pair()
+            if not ids:
+                return None
+            fighters = [self.get_character(char_id) for char_id in ids]
+            if all(fighters):
+                return fighters
+            #the pool was out of date, drop whoever's missing and try again
+            for char_id, fighter in zip(ids, fighters):
+                if not fighter: MATCH_POOL.remove(char_id)
+        return None
 
     #########################
     #      SAVING FUNCs     #
@@ -80,30 +96,122 @@ class ServerData:
             print(f"!-- DB COMMIT ERROR: {e} --!")
             db.session.rollback()
 
+    #########################
+    #   APPROVAL TRIGGERS   #
+    #########################
+
+    #called whenever a new character is submitted
+    def note_submission(self):
+        with self.pending_lock:
+            self.pending_count += 1
+            if self.pending_since is None:
+                self.pending_since = time.time()
+
+    #resets the pending counter from the DB. Used on startup and as a periodic fallback.
+    #after_pass is set once an approval pass finishes, so anything it left behind waits for the age trigger.
+    def sync_pending(self, after_pass=False):
+        count = self.count_queue()
+        with self.pending_lock:
+            self.pending_count = count
+            if after_pass:
+                self.leftover_count = count
+                self.pending_since = time.time() if count else None
+            elif count == 0:
+                self.pending_since = None
+            elif self.pending_since is None:
+                self.pending_since = time.time()
+            self.leftover_count = min(self.leftover_count, count)
+            self.last_recount = time.time()
+
+    #should the queue be sent off for approval? Cheap enough to call every tick.
+    def approval_due(self):
+        if self.moderation_running(): return False #one pass at a time
+        now = time.time()
+        if now - self.last_recount >= APPROVAL_RECOUNT:
+            self.sync_pending()
+        with self.pending_lock:
+            if self.pending_count - self.leftover_count >= APPROVAL_BATCH_SIZE:
+                return True
+            return self.pending_count > 0 and now - self.pending_since >= APPROVAL_MAX_WAIT
+
     #########################
     #    GenClient FUNCs    #
     #########################
 
+    #moderation runs as a pipeline: the queue is split into batches that are checked by the genclient on worker threads,
+    #and each batch's results are committed on its own as soon as it comes back (see collect_moderation).
+    #the loop never waits on the API, and a bad batch only holds up the fighters in it.
     def submit_queue_for_approval(self):
-        queue = self.get_queue() #unapproved characters
-        if len(queue) < 2:
+        #only ids and image sizes are loaded here, the drawings are loaded a batch at a time as workers free up
+        rows = db.session.query(
+            Character.id, func.coalesce(ImageBlob.size, func.length(Character.image_file), 0)
+        ).outerjoin(ImageBlob, ImageBlob.hash == Character.image_hash).filter(
+            awaiting_approval()
+        ).order_by(Character.creation_time).all()
+        if not rows:
+            self.sync_pending(after_pass=True)
             return
 
-        print(f"!-- SUBMITTING {len(queue)} IMAGES FOR APPROVAL --!")
-        
-        # Convert list of objs to dict {id: obj} for the genclient
-        queue_dict = {c.id: c for c in queue}
-        results = self.genclient.submit_for_approval(queue_dict)
-        if not results:
-            return
+        batches = make_batches(rows, MODERATION_BATCH_COUNT, MODERATION_BATCH_BYTES)
+        print(f"!-- SUBMITTING {len(rows)} IMAGES FOR APPROVAL IN {len(batches)} BATCHES --!")
+        self.moderation_backlog.extend(batches)
+        self.feed_moderation()
+
+    #is an approval pass still running?
+    def moderation_running(self):
+        return bool(self.moderation_batches or self.moderation_backlog)
+
+    #hands batches from the backlog to the workers, up to MODERATION_WORKERS at a time
+    def feed_moderation(self):
+        while self.moderation_backlog and len(self.moderation_batches) < MODERATION_WORKERS:
+            batch_ids = self.moderation_backlog.popleft()
+            #the workers get snapshots with the drawings' bytes attached, never DB objects
+            queue_dict = {}
+            for char_id in batch_ids:
+                character = self.get_character(char_id)
+                if character and not character.is_approved and not self.is_rejected(char_id):
+                    queue_dict[char_id] = character_snapshot(character)
+            if not queue_dict: continue
+            future = self.moderation_pool.submit(self.genclient.submit_for_approval, queue_dict)
+            self.moderation_batches[future] = (list(queue_dict), time.monotonic())
+
+    #applies every batch that has come back, each in its own commit. Called by the game loop every tick.
+    def collect_moderation(self):
+        if not self.moderation_running(): return
+        for future in [f for f in self.moderation_batches if f.done()]:
+            batch_ids, started = self.moderation_batches.pop(future)
+            latency = time.monotonic() - started #submitted to collected, so it includes the wait for a worker
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"!-- ERROR IN MODERATION BATCH: {e} --!")
+                results = None
+            MODERATION_BATCH_SECONDS.observe(latency, outcome="ok" if results else "failed")
+            if not results:
+                print(f"!-- MODERATION BATCH OF {len(batch_ids)} FAILED --!")
+                if len(batch_ids) > 1:
+                    #split it, so one bad image can't keep failing the whole batch
+                    half = len(batch_ids) // 2
+                    self.moderation_backlog.extend([batch_ids[:half], batch_ids[half:]])
+                continue
+            self.apply_moderation(results, batch_ids)
+        self.feed_moderation()
+        if not self.moderation_running():
+            self.sync_pending(after_pass=True) #anything left behind waits for the max wait instead of the next tick
 
-        ids_processed = []
+    #approves or rejects the fighters of one batch and commits.
+    #only ids that were in the batch are touched, in case the model answers for ids it wasn't asked about.
+    def apply_moderation(self, results, batch_ids):
+        approved = []
         for char_id, decision in results.items():
-            character = Character.query.get(char_id)
+            if char_id not in batch_ids: continue
+            character = self.get_character(char_id)
             if not character: continue
 
             if decision.get('approved'):
                 character.is_approved = True
+                MATCH_POOL.update(character)
+                approved.append(character.image_hash)
                 print(f"$-- APPROVED: {char_id} --$")
             else:
                 # Rejected
@@ -111,8 +219,11 @@ class ServerData:
                 print(f"!-- REJECTED: {char_id} - Reason: {reason} --!")
                 self.log_rejection(char_id, character, reason)
                 character.description = f"REJECTED BY MODERATION: {reason}"
-            ids_processed.append(char_id)
+        if approved: MATCH_POOL.changed()
         self.commit()
+        if approved:
+            ROSTER_CACHE.bump("fighters approved")
+            THUMBNAILS.request(*approved) #usually made on submission already, this catches older fighters
 
     #########################
     #     Logging FUNCs     #
@@ -137,30 +248,31 @@ class ServerData:
         )
 
         db.session.add(new_match)
+        db.session.flush() #assigns new_match.id
+        for team_index, team in enumerate(teams):
+            for fighter in team:
+                db.session.add(MatchParticipant(
+                    match_id=new_match.id,
+                    character_id=fighter.id,
+                    team=team_index,
+                    is_winner=(fighter.id == winner.id),
+                    timestamp=new_match.timestamp
+                ))
         self.commit()
 
+    #records a rejection in the Rejection table. The caller commits, so it lands with the rest of the batch.
     def log_rejection(self, char_id, char_obj, reason):
-        rejected_data = {}
-        if os.path.exists(REJECTED_FILE):
-            try:
-                with open(REJECTED_FILE, 'r') as f:
-                    rejected_data = json.load(f)
-            except:
-                rejected_data = {}
-        
-        rejected_data[char_id] = {
-            "id": char_id,
-            "name": char_obj.name,
-            "reason": reason,
-            "image": char_obj.image_file 
-        }
-        
-        try:
-            with open(REJECTED_FILE, 'w') as f:
-                json.dump(rejected_data, f, indent=2)
-            print(f"!-- LOGGED REJECTION FOR {char_id} --!")
-        except Exception as e:
-            print(f"!-- ERROR SAVING REJECTION: {e} --!")
+        db.session.merge(Rejection(
+            character_id=char_id,
+            name=char_obj.name,
+            reason=reason,
+            image_hash=char_obj.image_hash,
+            rejected_time=time.time()
+        ))
+        print(f"!-- LOGGED REJECTION FOR {char_id} --!")
+
+    def is_rejected(self, char_id):
+        return db.session.get(Rejection, char_id) is not None
 
     #########################
     #     DEBUG FUNCs       #
@@ -0,0 +1,152 @@
+#jfr, cwf, tjc
+#local combat engine.
+#plays a fight out with the same rules the battle prompt gives Gemini (hp/agility/power, combos and dodges, the move list)
+#and returns the same JSON structure, so it can stand in when the API is down or be picked with BATTLE_ENGINE=local.
+#the same seed always gives the same fight.
+import random
+
+MAX_TURNS = 60           #a fight still going after this many turns goes to whoever has more of their hp left
+COMBO_DODGE_AGILITY = 60 #agility over this gives a 20% chance to combo or dodge
+POWER_MOVE_POWER = 70    #POWER moves need power over this
+ACROBATIC_AGILITY = 70   #ACROBATIC moves need agility over this
+
+PERSONALITIES = ["Brash", "Stoic", "Cheerful", "Sneaky", "Proud", "Reckless", "Calm", "Grumpy", "Eager", "Mysterious"]
+ALIGNMENTS = ["good", "evil", "neutral"]
+
+#wording for each move, {actor} and {target} are filled in
+MOVE_TEXT = {
+    "ATTACK": "{actor} throws a <span class='action-red'>strike</span> at {target}!",
+    "POWER": "{actor} winds up and lands a <span class='action-purple'>crushing blow</span> on {target}!",
+    "ACROBATIC": "{actor} <span class='action-orange'>flips</span> over {target} and strikes from behind!",
+    "ULTIMATE": "{actor} unleashes their <span class='action-rainbow'>ULTIMATE</span> on {target}!",
+    "RECOVER": "{actor} steps back to <span class='action-green'>recover</span>.",
+    "DODGE": "{target} <span class='action-blue'>dodges</span> {actor}'s attack!",
+}
+
+#a fighter's stat, whatever case the generator used for the key
+def read_stat(stats, name, default):
+    for key, value in (stats or {}).items():
+        if key.lower() == name:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return default
+    return default
+
+#stats for a fighter with no fights yet, like the prompt's "new fighter" rules
+def generate_stats(rng):
+    return {
+        "hp": max(50, min(200, int(rng.gauss(100, 25)))),
+        "agility": rng.randint(1, 100),
+        "power": rng.randint(1, 100),
+        "personality": rng.choice(PERSONALITIES),
+        "alignment": rng.choice(ALIGNMENTS),
+        "popularity": rng.randint(1, 10)
+    }
+
+class SimFighter:
+    def __init__(self, char, stats, edge):
+        self.id = char.id
+        self.name = char.name
+        self.max_hp = read_stat(stats, "hp", 100)
+        self.hp = self.max_hp
+        self.agility = read_stat(stats, "agility", 50)
+        self.power = read_stat(stats, "power", 50)
+        self.edge = edge #damage multiplier from favorability
+
+    def can_combo_or_dodge(self):
+        return self.agility > COMBO_DODGE_AGILITY
+
+#picks the actor's move for this turn
+def choose_move(rng, actor, target):
+    if target.hp <= target.max_hp * 0.25 and rng.random() < 0.15:
+        return "ULTIMATE"
+    if actor.hp <= actor.max_hp * 0.3 and rng.random() < 0.25:
+        return "RECOVER"
+    options = ["ATTACK", "ATTACK"]
+    if actor.power > POWER_MOVE_POWER: options.append("POWER")
+    if actor.agility > ACROBATIC_AGILITY: options.append("ACROBATIC")
+    return rng.choice(options)
+
+def move_damage(rng, move, actor):
+    base = 4 + actor.power / 10
+    if move == "POWER": base *= 1.8
+    elif move == "ACROBATIC": base = base * 1.2 + actor.agility / 20
+    elif move == "ULTIMATE": base *= 3
+    return max(1, int(base * actor.edge * rng.uniform(0.8, 1.2)))
+
+#plays out one move, appending its log entries. Returns True if the target was knocked out.
+def play_move(rng, log, actor, target):
+    move = choose_move(rng, actor, target)
+    if move == "RECOVER":
+        healed = max(1, int(actor.max_hp * rng.uniform(0.08, 0.15)))
+        actor.hp = min(actor.max_hp, actor.hp + healed)
+        log.append(log_entry(actor, target, move, 0, actor.hp))
+        return False
+    if target.can_combo_or_dodge() and rng.random() < 0.2:
+        log.append(log_entry(actor, target, "DODGE", 0, target.hp))
+        return False
+    damage = move_damage(rng, move, actor)
+    target.hp = max(0, target.hp - damage)
+    log.append(log_entry(actor, target, move, damage, target.hp))
+    return target.hp == 0
+
+def log_entry(actor, target, action, damage, remaining_hp):
+    return {
+        "actor": actor.name,
+        "action": action,
+        "damage": damage,
+        "description": MOVE_TEXT[action].format(actor=actor.name, target=target.name),
+        "remaining_hp": remaining_hp
+    }
+
+#fights p1 against p2. p1/p2 are characters or snapshots of them.
+#favorability works like it does in the prompt, 1 favors fighter 1 heavily, 100 favors fighter 2, 50 is even.
+#returns the same structure as Genclient.run_match.
+def simulate_match(p1, p2, seed=None, favorability=50):
+    rng = random.Random(seed)
+    new_stats, updated_stats = {}, {}
+    fighters = []
+    lean = (50 - favorability) / 55  #about -0.9 to 0.9, positive favors fighter 1. The extremes all but decide the fight
+    for char, edge in ((p1, 1 + lean), (p2, 1 - lean)):
+        stats = char.stats
+        if (char.wins or 0) + (char.losses or 0) == 0 and not stats:
+            stats = generate_stats(rng)
+            new_stats[char.id] = dict(stats)
+        fighters.append(SimFighter(char, stats, edge))
+    f1, f2 = fighters
+
+    log = []
+    turn = 0
+    knocked_out = None
+    while knocked_out is None and turn < MAX_TURNS:
+        actor, target = (f1, f2) if turn % 2 == 0 else (f2, f1)
+        moves = 2 if actor.can_combo_or_dodge() and rng.random() < 0.2 else 1
+        for _ in range(moves):
+            if play_move(rng, log, actor, target):
+                knocked_out = target
+                break
+        turn += 1
+
+    if knocked_out is not None:
+        winner = f1 if knocked_out is f2 else f2
+    else:
+        winner = f1 if f1.hp / f1.max_hp >= f2.hp / f2.max_hp else f2
+    loser = f2 if winner is f1 else f1
+
+    #established fighters drift in popularity like the prompt asks, new ones get theirs in new_stats
+    for char in (p1, p2):
+        if char.id in new_stats: continue
+        shift = rng.randint(1, 2) if char.id == winner.id else -rng.randint(1, 2)
+        updated_stats[char.id] = {"popularity": max(1, min(100, (char.popularity or 1) + shift))}
+
+    return {
+        "new_stats": new_stats,
+        "updated_stats": updated_stats,
+        "introduction": f"Ladies and gentlemen, {f1.name} and {f2.name} step into the ring!",
+        "battle_log": log,
+        "winner_id": winner.id,
+        "summary": f"{winner.name} defeats {loser.name} after {len(log)} exchanges, with {winner.hp} HP left!",
+        "seed": seed,
+        "engine": "local"
+    }
@@ -0,0 +1,81 @@
+#jfr, cwf, tjc
+#thumbnails for drawings and portraits.
+#every view shows images far smaller than they were drawn, so each stored image also gets a resized WebP copy at
+#every size in THUMB_SIZES. Pillow makes them in a small worker pool, off the request, and they're stored in the
+#image store next to the originals and linked from the Thumbnail table. /api/image/<hash>/<size> serves them.
+import os, io, threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from components.dbmodel import db, ImageBlob, Thumbnail, THUMB_SIZES
+from components.imagestore import get_image, store_bytes
+
+THUMB_WORKERS = int(os.getenv('THUMB_WORKERS', 2))  #threads resizing images, Pillow lets go of the GIL while it works
+THUMB_QUALITY = 80
+
+#resizes image bytes so the longest side is size, as WebP bytes.
+#returns None when the image is already that small (or isn't something Pillow can read), the original is used then.
+def make_thumbnail(image_bytes, size):
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if max(image.size) <= size: return None
+            image.thumbnail((size, size), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"): image = image.convert("RGBA")
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=THUMB_QUALITY)
+            return output.getvalue()
+    except Exception as e:
+        print(f"!-- ERROR MAKING THUMBNAIL: {e} --!")
+        return None
+
+class ThumbnailMaker:
+    def __init__(self, workers=THUMB_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.app = None
+        self.pending = set()  #image hashes queued or being worked on
+        self.lock = threading.Lock()
+
+    #the workers need the app to open their own database sessions
+    def init_app(self, app):
+        self.app = app
+
+    #queues thumbnails for images. Images that already have them cost one query in the worker.
+    #NOTE - the worker reads the original from the database, so only call this after it has been committed.
+    def request(self, *image_hashes):
+        for image_hash in image_hashes:
+            if not image_hash: continue
+            with self.lock:
+                if image_hash in self.pending: continue
+                self.pending.add(image_hash)
+            self.pool.submit(self.make_all, image_hash)
+
+    def make_all(self, image_hash):
+        try:
+            with self.app.app_context():
+                done = {row.size for row in db.session.query(Thumbnail.size).filter_by(image_hash=image_hash)}
+                missing = [size for size in THUMB_SIZES if size not in done]
+                if not missing: return
+                blob = get_image(image_hash)
+                if not blob: return
+                for size in missing:
+                    thumbnail = make_thumbnail(blob.data, size)
+                    thumb_hash = store_bytes(thumbnail) if thumbnail else image_hash
+                    db.session.merge(Thumbnail(image_hash=image_hash, size=size, thumb_hash=thumb_hash))
+                db.session.commit()
+                print(f"!-- MADE {len(missing)} THUMBNAILS FOR {image_hash[:12]} --!")
+        except Exception as e:
+            print(f"!-- ERROR STORING THUMBNAILS FOR {image_hash[:12]}: {e} --!")
+        finally:
+            with self.lock:
+                self.pending.discard(image_hash)
+
+    #checks for a thumbnail without loading its bytes
+    def exists(self, image_hash, size):
+        return db.session.query(Thumbnail.size).filter_by(image_hash=image_hash, size=size).first() is not None
+
+    #the thumbnail's blob, or None if it hasn't been made yet
+    def get(self, image_hash, size):
+        return db.session.query(ImageBlob).join(Thumbnail, Thumbnail.thumb_hash == ImageBlob.hash).filter(
+            Thumbnail.image_hash == image_hash, Thumbnail.size == size
+        ).first()
+
+THUMBNAILS = ThumbnailMaker()
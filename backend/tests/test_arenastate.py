@@ -0,0 +1,55 @@
+#jfr, cwf, tjc
+#the arena lease: one leader at a time, and a leader that lost the lease can't write over the new one.
+#run from backend/:  python -m pytest tests
+import time
+import pytest
+from flask import Flask
+from components.dbmodel import db, ArenaValue
+from components.arenastate import SQLLease, MemoryLease
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'arena.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+def test_memory_lease_always_leads():
+    lease = MemoryLease()
+    assert lease.acquire() and lease.hold()
+
+def test_one_leader_at_a_time(app):
+    first, second = SQLLease("server_loop"), SQLLease("server_loop")
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire() #renewing
+
+def test_takeover_after_expiry(app):
+    first, second = SQLLease("server_loop", ttl=0.2), SQLLease("server_loop", ttl=0.2)
+    assert first.acquire()
+    time.sleep(0.3) #first stalls past its ttl, ex. waiting on a slow battle
+    assert second.acquire()
+    assert not first.acquire()
+
+#the old leader's writes are dropped, not committed over the new leader's
+def test_lost_lease_fences_writes(app):
+    first, second = SQLLease("server_loop", ttl=0.2), SQLLease("server_loop", ttl=0.2)
+    assert first.acquire()
+    time.sleep(0.3)
+    assert second.acquire()
+    db.session.add(ArenaValue(key="phase", value="stale"))
+    assert not first.hold()
+    db.session.rollback()
+    assert db.session.get(ArenaValue, "phase") is None
+
+def test_hold_renews_in_the_same_commit(app):
+    lease = SQLLease("server_loop", ttl=0.2)
+    assert lease.acquire()
+    time.sleep(0.1)
+    db.session.add(ArenaValue(key="phase", value="fighting"))
+    assert lease.hold()
+    db.session.commit()
+    time.sleep(0.15) #past the first ttl, but not the renewed one
+    assert not SQLLease("server_loop", ttl=0.2).acquire()
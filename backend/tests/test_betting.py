@@ -0,0 +1,46 @@
+#jfr, cwf, tjc
+#bets taken by several workers on one card: no hedging and no overdrawing, whichever worker a bet lands on.
+#run from backend/:  python -m pytest tests
+import pytest
+from flask import Flask
+from components.dbmodel import db, Bet, User
+from components.betting import BetBook
+
+STATE = {'card': ["a", "b"], 'odds': {"a": 2.0, "b": 2.0}, 'base_pool': 1000}
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'bets.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id="1" * 16, username="bettor", money=100))
+        db.session.commit()
+        yield app
+
+def place(book, amount, fighter_id="a"):
+    return book.place(db.session.get(User, "1" * 16), fighter_id, amount, STATE)
+
+def test_bets_add_up(app):
+    first, second = BetBook(shared=True), BetBook(shared=True)
+    assert place(first, 30) == (30, None)
+    assert place(second, 20) == (50, None)
+    assert db.session.get(Bet, "1" * 16).amount == 50
+    assert db.session.get(User, "1" * 16).money == 50
+
+#the second worker never saw the first bet in its book, it has to find it in the Bet table
+def test_no_hedging_across_workers(app):
+    first, second = BetBook(shared=True), BetBook(shared=True)
+    assert place(first, 30) == (30, None)
+    total, error = place(second, 30, fighter_id="b")
+    assert total is None and "both fighters" in error
+    assert db.session.get(User, "1" * 16).money == 70
+
+def test_no_overdraw(app):
+    book = BetBook(shared=True)
+    assert place(book, 80) == (80, None)
+    total, error = place(book, 30)
+    assert total is None and error == 'Insufficient funds!'
+    assert db.session.get(User, "1" * 16).money == 20
+    assert db.session.get(Bet, "1" * 16).amount == 80
@@ -0,0 +1,61 @@
+#jfr, cwf, tjc
+#the shared matchmaking pool: the leader only rebuilds when another worker changed the fighters.
+#run from backend/:  python -m pytest tests
+import pytest
+from flask import Flask
+from components.dbmodel import db
+from components.matchmaking import MatchmakingPool
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'pool.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    counts = []
+    original = MatchmakingPool.rebuild
+    def counted(pool):
+        counts.append(pool)
+        original(pool)
+    monkeypatch.setattr(MatchmakingPool, "rebuild", counted)
+    return counts
+
+def change(pool):
+    pool.changed()
+    db.session.commit()
+
+def test_own_changes_dont_rebuild(app, rebuilds):
+    leader = MatchmakingPool(shared=True)
+    leader.rebuild()
+    change(leader)
+    change(leader)
+    leader.sync()
+    assert len(rebuilds) == 1
+
+def test_other_workers_changes_rebuild(app, rebuilds):
+    leader, other = MatchmakingPool(shared=True), MatchmakingPool(shared=True)
+    leader.rebuild()
+    change(other)
+    leader.sync()
+    leader.sync()
+    assert rebuilds.count(leader) == 2
+
+#the leader's own change right after another worker's mustn't hide the other one
+def test_interleaved_changes_rebuild(app, rebuilds):
+    leader, other = MatchmakingPool(shared=True), MatchmakingPool(shared=True)
+    leader.rebuild()
+    change(other)
+    change(leader)
+    leader.sync()
+    assert rebuilds.count(leader) == 2
+
+def test_memory_pool_never_rebuilds(app, rebuilds):
+    pool = MatchmakingPool()
+    change(pool)
+    pool.sync()
+    assert not rebuilds
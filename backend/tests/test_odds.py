@@ -0,0 +1,27 @@
+#jfr, cwf, tjc
+#betting odds have to be fair, or one side of every card is free money.
+#run from backend/:  python -m pytest tests
+from types import SimpleNamespace
+import numpy as np
+from components.odds import stat_win_probability, price_match
+from components.simulator import simulate_match
+
+def fighter(fighter_id, hp, agility, power):
+    return SimpleNamespace(id=fighter_id, name=fighter_id, stats={"hp": hp, "agility": agility, "power": power},
+                           wins=1, losses=1, popularity=5, rating=1500.0)
+
+def test_mirror_match_is_even():
+    for stats in ((100, 50, 50), (150, 80, 80), (60, 20, 90)):
+        assert abs(stat_win_probability(stats, stats, samples=16384, rng=np.random.default_rng(1)) - 0.5) < 0.02
+
+def test_mirror_match_odds_are_even():
+    odds = price_match(fighter("a", 100, 50, 50), fighter("b", 100, 50, 50), samples=16384, rng=np.random.default_rng(2))
+    assert abs(odds["a"] - 2) < 0.1 and abs(odds["b"] - 2) < 0.1
+
+#the simulation should agree with the local engine, with each fighter opening half the bouts
+def test_matches_simulator():
+    p1, p2 = fighter("a", 120, 80, 40), fighter("b", 90, 40, 85)
+    wins = sum(simulate_match(p1, p2, seed=seed)["winner_id"] == "a" for seed in range(1000))
+    wins += sum(simulate_match(p2, p1, seed=seed)["winner_id"] == "a" for seed in range(1000, 2000))
+    priced = stat_win_probability((120, 80, 40), (90, 40, 85), samples=16384, rng=np.random.default_rng(3))
+    assert abs(priced - wins / 2000) < 0.04
@@ -9,6 +9,7 @@ import ArenaMini from './components/ArenaMini';
 import Account from './components/Account';
 import Debug from './components/Debug';
 
+const THROBBER = <img className="throbber" src="./RatJohnson.gif"></img>;
 
 function App() {
   const [timer, setTimer] = useState(null);
@@ -28,6 +29,10 @@ function App() {
   const [myBet, setMyBet] = useState(null);
   const [payoutWon, setPayoutWon] = useState(0);
   const [selectedProfile, setSelectedProfile] = useState(null);
+  const serverPayout = useRef(null); //payout confirmed by the server for the last match, if we won
+  const arenaState = useRef(null); //last phase/deadline sent by the server, the countdown runs locally from it
+  const clockOffset = useRef(0); //server clock minus our clock, in seconds
+  const accountId = useRef(null); //logged in account, rejoined on every reconnect so payouts keep reaching us
 
   const handleResult = (data) => {
     //takes data from a fight and places it in the correct places
@@ -77,7 +82,10 @@ function App() {
       setSummaryState(data.summary);
       setBattleState(data); 
       setMyBet(currentBet => {
-          if ((currentBet && data.winner === currentBet.fighterName) || (currentBet && data.winner_id === currentBet.fighterId)) {
+          if (serverPayout.current) {
+              setPayoutWon(serverPayout.current);
+              serverPayout.current = null;
+          } else if ((currentBet && data.winner === currentBet.fighterName) || (currentBet && data.winner_id === currentBet.fighterId)) {
               setPayoutWon(currentBet.payout);
           } else {
             setPayoutWon(-1);
@@ -117,6 +125,8 @@ function App() {
       const data = await response.json();
       if (data.status === 'success') {
         setUser(data);
+        accountId.current = data.id;
+        socket.emit('join_account', { user_id: data.id }); //so the server can send us our payouts
         console.log("Logged in as", data.username);
       } else {
         console.log("Saved ID invalid, clearing.");
@@ -135,6 +145,7 @@ function App() {
 
   const handleLogout = () => {
     localStorage.removeItem("doodle_brawl_id");
+    accountId.current = null;
     setUser(null);
   }
 
@@ -156,10 +167,11 @@ function App() {
   useEffect(() => {
     //register listeners
     socket.on('match_scheduled', handleSchedule);
-    socket.on('timer_update', handleTimerUpdate);
+    socket.on('arena_state', handleArenaState);
     socket.on('match_result', handleResult);
     socket.on('character_added', handleCharacterAdded);
     socket.on('pool_update', (data) => {setCurrentPool(data.pool)});
+    socket.on('bet_payout', (data) => {serverPayout.current = data.payout});
 
     // Get initial fighter info from scheduled battle
     fetch(`${API_URL}/api/card`)
@@ -175,15 +187,21 @@ function App() {
       .catch(err => {
         console.log(err);
       });
+    syncArenaState();
+
+    // Count down locally from the last deadline the server sent
+    const countdown = setInterval(renderTimer, 250);
 
 
     // De-register listeners for cleanup
     return () => {
       socket.off('match_scheduled', handleSchedule);
-      socket.off('timer_update', handleTimerUpdate);
+      socket.off('arena_state', handleArenaState);
       socket.off('match_result', handleResult);
       socket.off('character_added', handleCharacterAdded);
       socket.off('pool_update');
+      socket.off('bet_payout');
+      clearInterval(countdown);
     }
   }, []);
 
@@ -203,24 +221,44 @@ function App() {
     setPayoutWon(0);
   }
 
-  const handleTimerUpdate = (data) => {
-    //console.log("TIMER UPDATE ------")
-    if (data.time_left > 0) {
-      setTimer(data.time_left);
-    } 
-    else if (data.time_left == 0) {
-      setTimer(<img className="throbber" src="./RatJohnson.gif"></img>);
+  const handleArenaState = (data) => {
+    //the server only sends this when the phase changes, is skipped or frozen
+    clockOffset.current = data.server_time - Date.now() / 1000;
+    arenaState.current = data;
+    renderTimer();
+  }
+
+  //asks the server for the current phase, used on load and after reconnecting
+  const syncArenaState = () => {
+    fetch(`${API_URL}/api/arena`)
+      .then(response => response.json())
+      .then(handleArenaState)
+      .catch(err => console.log(err));
+  }
+
+  const renderTimer = () => {
+    const state = arenaState.current;
+    if (!state) return;
+    if (state.phase === 'announcing') {
+      setTimer("Scheduling...");
+      return;
     }
-    else {
-      setTimer("Scheduling...")
+    if (state.phase === 'fighting') {
+      setTimer(THROBBER);
+      return;
     }
-    //console.log(data);
+    const now = Date.now() / 1000 + clockOffset.current;
+    const timeLeft = state.frozen ? state.time_left : state.deadline - now;
+    setTimer(timeLeft > 0 ? Math.ceil(timeLeft) : THROBBER);
   }
 
   // Enables connected/disconnected status events
   useEffect(() => {
     function onConnect() {
       setConnectionStatus("Connected!");
+      syncArenaState();
+      //a new connection isn't in our account's room anymore, so bet payouts would go missing
+      if (accountId.current) socket.emit('join_account', { user_id: accountId.current });
       console.log("Connected to socket.");
     }
 
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import DoodleCanvas from '../components/DoodleCanvas';
 import { API_URL } from '../socket';
-import { decompressBase64Image } from '../socket';
+import { imageURL } from '../socket';
 import './Account.css';
 
 export default function Account({user, onLogin, onLogout}) {
@@ -13,12 +13,11 @@ export default function Account({user, onLogin, onLogout}) {
   const [expandedFighter, setExpandedFighter] = useState(null);
   const [error, setError] = useState("");
 
-  function ImageViewer({compressedBase64}) {
-    // Decodes base64 image from server
-    const base64 = decompressBase64Image(compressedBase64);
+  function ImageViewer({imageUrl}) {
+    // Displays an image served by the backend image store
     return (
       <img
-        src={`data:image/webp;base64,${base64}`}
+        src={imageURL(imageUrl)}
         alt="Fighter Image"
       />
     );
@@ -29,8 +28,8 @@ export default function Account({user, onLogin, onLogout}) {
   if (user) {
     const joinDate = new Date(user.creation_time * 1000).toLocaleDateString();
     
-    //decompress the user portrait for display
-    const portraitSrc = user.portrait ? `data:image/webp;base64,${decompressBase64Image(user.portrait)}` : null;
+    //the user portrait is served by the image store
+    const portraitSrc = imageURL(user.portrait_url);
 
     return (
       <div className="account-container dashboard">
@@ -60,7 +59,7 @@ export default function Account({user, onLogin, onLogout}) {
                       <b className="character-list-name">{item.name}</b>
                     </div>
                   </div>
-                  {item.is_approved ? <img src={`data:image/webp;base64,${decompressBase64Image(item.image_file)}`} alt="Fighter picture" className="character-list-image"/> : <p className="unapproved">Not yet approved</p>}
+                  {item.is_approved ? <img src={imageURL(item.image_url)} alt="Fighter picture" className="character-list-image"/> : <p className="unapproved">Not yet approved</p>}
                 </div>
               </>
             ))}
@@ -77,7 +76,7 @@ export default function Account({user, onLogin, onLogout}) {
                   className={`managed-card ${expandedFighter === fighter.id ? 'expanded' : ''}`}
                   onClick={() => setExpandedFighter(expandedFighter === fighter.id ? null : fighter.id)}
                 >
-                   <img src={`data:image/webp;base64,${decompressBase64Image(fighter.image_file)}`} alt={fighter.name} />
+                   <img src={imageURL(fighter.image_url)} alt={fighter.name} />
                    <div className="managed-info">
                      <h4>{fighter.name}</h4>
                      <p className={`status-badge ${fighter.status}`}>{fighter.status}</p>
@@ -1,7 +1,7 @@
 import { useState, useRef } from 'react';
 import './ArenaMini.css';
 import '../text_decor.css';
-import { decompressBase64Image } from '../socket';
+import { imageURL } from '../socket';
 
 export default function ArenaMini({ battleState, timer, lastWinner}) {
   //const [battleState, setBattleState] = useState(defaultBattleState);
@@ -9,16 +9,15 @@ export default function ArenaMini({ battleState, timer, lastWinner}) {
   //const [timer, setTimer] = useState(null);
   const timeouts = useRef([]);
   
-  function ImageViewer({ compressedBase64, isWinner, isLoser }) {
+  function ImageViewer({ imageUrl, isWinner, isLoser }) {
     let className = '';
-    const base64 = decompressBase64Image(compressedBase64);
 
     if (isWinner) className = 'winner-img-mini';
     if (isLoser) className = 'loser-img-mini';
     return (
       <img
         className="thumbnail-img"
-        src={`data:image/webp;base64,${base64}`}
+        src={imageURL(imageUrl)}
         alt="Fighter Image"
       />
     );
@@ -41,7 +40,7 @@ export default function ArenaMini({ battleState, timer, lastWinner}) {
           <p className='fighter-name-mini-left fighter-1'>{battleState.fighters[0].name}</p>
           <div className='fighter-img-mini'>
             {battleState && 
-            <ImageViewer compressedBase64={battleState.fighters[0].image_file} 
+            <ImageViewer imageUrl={battleState.fighters[0].image_url} 
               isWinner={lastWinner && lastWinner === battleState.fighters[0].name}
               isLoser={lastWinner && lastWinner !== battleState.fighters[0].name}
             />} 
@@ -57,7 +56,7 @@ export default function ArenaMini({ battleState, timer, lastWinner}) {
           <p className='fighter-name-mini-right fighter-2'>{battleState.fighters[1].name}</p>
           <div className='fighter-img-mini'>
             {battleState && 
-            <ImageViewer compressedBase64={battleState.fighters[1].image_file} 
+            <ImageViewer imageUrl={battleState.fighters[1].image_url} 
               isWinner={lastWinner && lastWinner === battleState.fighters[1].name}
               isLoser={lastWinner && lastWinner !== battleState.fighters[1].name}
             />} 
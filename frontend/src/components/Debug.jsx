@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import './Debug.css'
-import { API_URL, decompressBase64Image } from '../socket';
+import { API_URL, decompressBase64Image, imageURL } from '../socket';
 
 export default function Debug({user}) {
   const [editorTab, setEditorTab] = useState('characters');
@@ -115,7 +115,9 @@ export default function Debug({user}) {
     await fetch(`${API_URL}/api/debug/${endpoint}`, { method: 'POST', headers: { 'X-User-ID': user?.id || '' }});
   };
 
-  const getPreviewSource = (base64Str) => { /* [Keep exactly the same] */ 
+  const getPreviewSource = (imageHash, base64Str) => {
+    // images in the image store are served by hash, only unconverted rows still have a legacy string
+    if (imageHash) return imageURL(`/api/image/${imageHash}`);
     if (!base64Str) return null;
     try { return `data:image/webp;base64,${decompressBase64Image(base64Str)}`; } catch (e) { return null; }
   };
@@ -189,7 +191,7 @@ export default function Debug({user}) {
                 )}
                 {showPreview && editorTab !== 'matches' && (
                   <div className="preview-box">
-                    <img src={getPreviewSource(editorTab === 'characters' ? formData.image_file : formData.portrait)} alt="Preview" onError={(e) => {e.target.style.display='none'; setMessage("Error rendering image. Corrupt Base64.");}} />
+                    <img src={getPreviewSource(...(editorTab === 'characters' ? [formData.image_hash, formData.image_file] : [formData.portrait_hash, formData.portrait]))} alt="Preview" onError={(e) => {e.target.style.display='none'; setMessage("Error rendering image. Corrupt Base64.");}} />
                   </div>
                 )}
               </div>
@@ -1,12 +1,11 @@
 import { useState, useEffect, memo } from 'react';
-import { API_URL, decompressBase64Image } from '../socket';
+import { API_URL, imageURL } from '../socket';
 import './ProfileCard.css';
 
-const ImageViewer = memo(function ImageViewer({ compressedBase64, titles }) {
-  const base64 = decompressBase64Image(compressedBase64);
+const ImageViewer = memo(function ImageViewer({ imageUrl, titles }) {
   return (
     <div className="image-wrapper-tiny">
-      <img className="fighter-wrap-tiny" src={`data:image/webp;base64,${base64}`} alt="Fighter Image" />
+      <img className="fighter-wrap-tiny" src={imageURL(imageUrl)} alt="Fighter Image" />
       {titles && titles.map((title, index) => (
         <img key={index} className="champ-badge-tiny" src="./champ.png" alt="Champion Badge" title={title} style={{ top: `${-2 + (index * 8)}px`, left: `${-15 + (index * 5)}px`, zIndex: 2 - index }} />
       ))}
@@ -58,8 +57,8 @@ export default function ProfileCard({ username, onClose }) {
         <button className="close-btn" onClick={onClose}>X</button>
         
         <div className="profile-header">
-          {profileData.portrait ? (
-             <img className="profile-portrait" src={`data:image/webp;base64,${decompressBase64Image(profileData.portrait)}`} alt="Portrait" />
+          {profileData.portrait_url ? (
+             <img className="profile-portrait" src={imageURL(profileData.portrait_url)} alt="Portrait" />
           ) : (
              <div className="profile-portrait placeholder">?</div>
           )}
@@ -75,7 +74,7 @@ export default function ProfileCard({ username, onClose }) {
           {profileData.characters.length > 0 ? (
             profileData.characters.map(c => (
               <div key={c.id} className="mini-fighter-card">
-                 <ImageViewer compressedBase64={c.image_file} titles={c.titles}/>
+                 <ImageViewer imageUrl={c.image_url} titles={c.titles}/>
                  <div className="mini-fighter-info">
                    <strong>{c.name}</strong>
                    <p className="mini-stats">W: {c.wins} | L: {c.losses}</p>
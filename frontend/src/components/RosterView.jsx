@@ -1,7 +1,7 @@
 /* This component shows the top few fighters, including their stats and images. */
 
 import { useState, useEffect } from 'react';
-import { API_URL, decompressBase64Image } from '../socket.js';
+import { API_URL, imageURL } from '../socket.js';
 import './RosterView.css'
 
 export default function RosterView() {
@@ -10,14 +10,14 @@ export default function RosterView() {
   const [rosterData, setRosterData] = useState({});
   const [charPerPage, setCharPerPage] = useState(10);
   const [page, setPage] = useState(1); // Page number for fetch
+  const [cursors, setCursors] = useState([""]); // cursors[n] fetches page n+1, the server hands us the next one
 
-  function ImageViewer({ compressedBase64, titles }) {
-    const base64 = decompressBase64Image(compressedBase64);
+  function ImageViewer({ imageUrl, titles }) {
     return (
       <div className="roster-image-wrapper">
         <img
           className="roster-fighter-img"
-          src={`data:image/webp;base64,${base64}`}
+          src={imageURL(imageUrl)}
           alt="Fighter Image"
         />
         {/* Map through all titles to stack overlapping belts */}
@@ -56,27 +56,26 @@ export default function RosterView() {
   const fetchRoster = async (pageNum) => {
     // Fetch data from server
     // pageNum specifies which page of data to return (1st, 2nd, 3rd, etc.)
+    // Pages are fetched by cursor, so we can only go one page past the furthest one we've seen
+    if (pageNum > cursors.length || (pageNum > 1 && !cursors[pageNum - 1])) return false;
     // Set fetch status
-    // Attempt POST to server
+    // Attempt GET to server, the browser revalidates cached pages with their ETag
     try {
-      const response = await fetch(`${API_URL}/api/roster`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          page: pageNum,
-        })
-      });
+      const response = await fetch(`${API_URL}/api/roster?cursor=${encodeURIComponent(cursors[pageNum - 1])}`);
 
       // Process data upon success
       const data = await response.json();
       console.log("Got Fresh Fighter Data");
-      if (data.length == 0) {
+      if (data.fighters.length == 0) {
         console.log("No fighters to display.")
         return false;
       } 
-      processRosterData(data);
+      processRosterData(data.fighters);
+      setCursors(prev => {
+        const next = prev.slice(0, pageNum);
+        next.push(data.next_cursor);
+        return next;
+      });
       setPage(pageNum);
       return true;
 
@@ -97,7 +96,6 @@ export default function RosterView() {
   const getPrevPage = () => {
     if (page === 1) return;
     const pageNum = page - 1;
-    setPage(pageNum);
     fetchRoster(pageNum);
   }
 
@@ -137,7 +135,7 @@ export default function RosterView() {
                   <p>Created by: {(item.creator_name) ? (item.creator_name) : "???" }</p>
                 </div>
               </div>
-              {rosterData && <ImageViewer compressedBase64={item.image_file} titles={item.titles} />}
+              {rosterData && <ImageViewer imageUrl={item.image_url} titles={item.titles} />}
             </div>
             {index < rosterData.length - 1 && <hr />}
           </>
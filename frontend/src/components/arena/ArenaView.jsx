@@ -1,5 +1,5 @@
 import { useState, memo } from 'react';
-import { decompressBase64Image } from '../../socket';
+import { imageURL } from '../../socket';
 import Betting from './Betting';
 import Commentator from './Commentator';
 import Payout from './Payout';
@@ -11,7 +11,7 @@ import '../../text_decor.css';
 const CreatorPortrait = memo(function CreatorPortrait({ fighter, align, onProfileClick }) {
   console.log(fighter.creator_name);
   //unknown has no portrait
-  if (!fighter.creator_name || fighter.creator_name === "Unknown" || !fighter.creator_portrait) return null;
+  if (!fighter.creator_name || fighter.creator_name === "Unknown" || !fighter.creator_portrait_url) return null;
 
   return (
     <div 
@@ -23,7 +23,7 @@ const CreatorPortrait = memo(function CreatorPortrait({ fighter, align, onProfil
         <strong>{fighter.creator_name}</strong>
       </div>
       <img 
-        src={`data:image/webp;base64,${decompressBase64Image(fighter.creator_portrait)}`} 
+        src={imageURL(fighter.creator_portrait_url)} 
         alt={`${fighter.creator_name}'s portrait`} 
         className="creator-portrait-img"
       />
@@ -31,11 +31,10 @@ const CreatorPortrait = memo(function CreatorPortrait({ fighter, align, onProfil
   );
 });
 
-const ImageViewer = memo(function ImageViewer({ compressedBase64, titles }) {
-  const base64 = decompressBase64Image(compressedBase64);
+const ImageViewer = memo(function ImageViewer({ imageUrl, titles }) {
   return (
     <div className="image-wrapper">
-      <img className="fighter-wrap" src={`data:image/webp;base64,${base64}`} alt="Fighter Image" />
+      <img className="fighter-wrap" src={imageURL(imageUrl)} alt="Fighter Image" />
       {titles && titles.map((title, index) => (
         <img key={index} className="champ-badge" src="./champ.png" alt="Champion Badge" title={title} style={{ top: `${3 + (index * 8)}px`, left: `${-18 + (index * 5)}px`, zIndex: 2 - index }} />
       ))}
@@ -105,7 +104,7 @@ export default function ArenaView({ battleState, timer, logState, lastWinner, su
               key={p0Acting && !lastWinner ? latestLog.description : 'idle-1'}
               style={{ position: 'relative' }}
             >
-              {battleState && <ImageViewer compressedBase64={battleState.fighters[0].image_file} titles={battleState.fighters[0].titles} />} 
+              {battleState && <ImageViewer imageUrl={battleState.fighters[0].image_url} titles={battleState.fighters[0].titles} />} 
             </div>
 
             <div className='stats-footer'>
@@ -128,7 +127,7 @@ export default function ArenaView({ battleState, timer, logState, lastWinner, su
               key={p1Acting && !lastWinner ? latestLog.description : 'idle-2'}
               style={{ position: 'relative' }}
             >
-              {battleState && <ImageViewer compressedBase64={battleState.fighters[1].image_file} titles={battleState.fighters[1].titles} />} 
+              {battleState && <ImageViewer imageUrl={battleState.fighters[1].image_url} titles={battleState.fighters[1].titles} />} 
             </div>
 
             <div className='stats-footer'>
@@ -1,8 +1,8 @@
 // Initializes socket connection
 
 import { io } from 'socket.io-client';
-import { gzip, ungzip } from 'pako'; // gzip compression library
-import { fromByteArray, toByteArray } from 'base64-js';
+import { ungzip } from 'pako'; // gzip compression library, only needed for legacy images
+import { toByteArray } from 'base64-js';
 
 // EDIT THIS TO CHANGE BETWEEN SERVER DEPLOYMENT AND LOCAL DEV ENVIRONMENT
 const API_URL = import.meta.env.VITE_SOCKET_URL || "http://localhost:5000";
@@ -16,22 +16,17 @@ const socket = io(
 );
 
 function encodeImageURL(dataURL) {
-    // Takes an image file URL as input, encodes it to base64, compresses it, then converts that into base64 again.
-    // Returns a stringified image ready to be sent to the backend
+    // Takes an image file URL as input and returns the base64 of the image itself, ready to be sent to the backend.
     //
-    // NOTE: The data URL contains the actual base64 representation of the image used in display.
-    // Using fromByteArray, the gzip'd image is converted into base64 again, this time so it can be transmitted easily over JSON.
+    // NOTE: The image is already compressed WebP, so it isn't gzipped anymore. The backend stores the raw bytes,
+    // and still accepts the old gzip'd format from clients that haven't updated.
 
-    // Remove the "data:image/png;base64," prefix from the dataURL to get just the Base64 string
-    const base64String = dataURL.split(',')[1];
-
-    const compressed = gzip(base64String);  // Run compression
-    const result = fromByteArray(compressed); // Stringify to base64 (again) for json transmission
-    return result;
+    // Remove the "data:image/webp;base64," prefix from the dataURL to get just the Base64 string
+    return dataURL.split(',')[1];
 }
 
 function decompressBase64Image(compressedBase64String) {
-    // Takes a base64 encoded string of a gzip-compressed base64 image (presumably from a json sent by the backend) and decompresses it.
+    // Takes a base64 encoded string of a gzip-compressed base64 image (the legacy format rows used before the image store) and decompresses it.
     // Returns an uncompressed base64 string
     // .
     // NOTE: This reverses encodeImageURL.
@@ -40,4 +35,10 @@ function decompressBase64Image(compressedBase64String) {
     return result;
 }
 
-export { socket, API_URL, encodeImageURL, decompressBase64Image };
+function imageURL(path) {
+    // Takes an image path from the backend (like /api/image/<hash>) and points it at the API server.
+    // Images are served as plain files so the browser can cache them.
+    return path ? `${API_URL}${path}` : null;
+}
+
+export { socket, API_URL, encodeImageURL, decompressBase64Image, imageURL };